@@ -18,16 +18,18 @@ const { Link: AntLink, Paragraph, Title } = Typography;
 const { defaultAlgorithm, darkAlgorithm } = theme;
 
 interface Message {
-    type: 'answer' | 'question' | 'full';
+    type: 'answer' | 'answer_chunk' | 'links' | 'queue_position' | 'error' | 'question' | 'full';
     reporter: 'output_message' | 'user';
     message: string;
     links: string[];
+    position?: number;
 }
 
 const ChatApp: React.FC = () => {
     const [ws, setWs] = useState<WebSocket | null>(null);
     const [input, setInput] = useState<string>('');
     const [messages, setMessages] = useState<Message[]>([]);
+    const [queuePosition, setQueuePosition] = useState<number | null>(null);
     const [isDarkMode, setIsDarkMode] = useState(false);
 
     // Toggle light/dark theme
@@ -41,17 +43,23 @@ const ChatApp: React.FC = () => {
             const message_curr: Message = JSON.parse(event.data);
 
             if (message_curr.reporter === 'output_message') {
+                // Queue updates are shown as a status line, not as a chat message
+                if (message_curr.type === 'queue_position') {
+                    setQueuePosition(message_curr.position ?? null);
+                    return;
+                }
+                setQueuePosition(null);
                 setMessages((messages_prev) => {
                     if (messages_prev.length === 0) return [message_curr];
                     const last = messages_prev[messages_prev.length - 1];
 
-                    // If last message is question or 'full', append new
-                    if (last.type === 'question' || last.type === 'full') {
+                    // If last message is question or a complete answer, append new
+                    if (last.type === 'question' || last.type === 'full' || last.type === 'answer') {
                         return [...messages_prev, message_curr];
                     }
 
-                    // If incoming message is 'full', replace last message
-                    if (message_curr.type === 'full') {
+                    // If incoming message is a complete answer, replace the streamed one
+                    if (message_curr.type === 'full' || message_curr.type === 'answer') {
                         return [...messages_prev.slice(0, -1), message_curr];
                     }
 
@@ -61,6 +69,7 @@ const ChatApp: React.FC = () => {
                         {
                             ...last,
                             message: last.message + message_curr.message,
+                            links: message_curr.links ?? last.links,
                         },
                     ];
                 });
@@ -231,6 +240,11 @@ const ChatApp: React.FC = () => {
                             );
                         })}
                     </AntList>
+                    {queuePosition !== null && (
+                        <Paragraph type="secondary" style={{ margin: 0 }}>
+                            Queued, position {queuePosition}
+                        </Paragraph>
+                    )}
                 </Content>
 
                 {/* Footer with TextArea & Circular Arrow Button */}
@@ -1,21 +1,47 @@
+import io
+import os
+import json
 import nltk
 import logging
 import asyncio
+import snapshot
+import ingest
 from indexer import Indexer
-from pydantic import BaseModel
+from typing import Optional
+from pydantic import BaseModel, Field
 from storage import MinimaStore
-from async_queue import AsyncQueue
-from fastapi import FastAPI, APIRouter
+from fastapi import FastAPI, APIRouter, Query as QueryParam, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from contextlib import asynccontextmanager
-from fastapi_utilities import repeat_every
-from async_loop import index_loop, crawl_loop
+from governor import ResourceGovernor
+from index_worker import IndexWorker
+from reindex import ReindexCoordinator
+from tracing import tracer
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 indexer = Indexer()
 router = APIRouter()
-async_queue = AsyncQueue()
+tracer.service_name = os.environ.get("SERVICE_NAME", "indexer")
+index_worker = IndexWorker(indexer)
+governor = ResourceGovernor(
+    cpu_share=indexer.config.INDEX_CPU_SHARE,
+    p95_target_ms=indexer.config.QUERY_P95_TARGET_MS,
+    queue_threshold=indexer.config.QUERY_QUEUE_THRESHOLD,
+    max_pause_seconds=indexer.config.INDEX_MAX_PAUSE_SECONDS,
+    idle_seconds=indexer.config.INDEX_IDLE_SECONDS,
+)
+reindex_coordinator = ReindexCoordinator(
+    index_worker,
+    governor,
+    root=indexer.config.CONTAINER_PATH,
+    interval_seconds=indexer.config.REINDEX_INTERVAL_SECONDS,
+    min_interval_seconds=indexer.config.REINDEX_MIN_INTERVAL_SECONDS,
+    max_interval_seconds=indexer.config.REINDEX_MAX_INTERVAL_SECONDS,
+)
 MinimaStore.create_db_and_tables()
 
 def init_loader_dependencies():
@@ -32,22 +58,93 @@ class Query(BaseModel):
     query: str
 
 
+class ReindexRequest(BaseModel):
+    path: Optional[str] = None
+    force: bool = False
+
+
+class SearchOptions(BaseModel):
+    k: int = Field(default=4, ge=1, le=100)
+    score_threshold: Optional[float] = None
+    path_prefix: Optional[str] = None
+    file_types: Optional[list[str]] = None
+    modified_after: Optional[int] = None
+    modified_before: Optional[int] = None
+    debug: bool = False
+
+
+class SearchQuery(SearchOptions):
+    query: str
+
+
+class BatchQuery(SearchOptions):
+    queries: list[str] = Field(min_length=1)
+    stream: Optional[bool] = None
+
+
 @router.post(
     "/query", 
     response_description='Query local data storage',
 )
-async def query(request: Query):
+async def query(request: SearchQuery):
     logger.info(f"Received query: {query}")
     try:
-        result = indexer.find(request.query)
+        with tracer.collect() as spans, governor.track_query():
+            result = await run_in_threadpool(indexer.find, **request.model_dump(exclude={"debug"}))
         logger.info(f"Found {len(result)} results for query: {query}")
         logger.info(f"Results: {result}")
+        if request.debug:
+            return {"result": result, "spans": [span.to_dict() for span in spans]}
         return {"result": result}
     except Exception as e:
         logger.error(f"Error in processing query: {e}")
         return {"error": str(e)}
 
 
+@router.post(
+    "/query/batch",
+    response_description='Query local data storage with many queries at once',
+)
+async def query_batch(request: BatchQuery):
+    logger.info(f"Received batch of {len(request.queries)} queries")
+    batch_size = indexer.config.BATCH_QUERY_SIZE
+    batches = [
+        (offset, request.queries[offset:offset + batch_size])
+        for offset in range(0, len(request.queries), batch_size)
+    ]
+    options = request.model_dump(exclude={"queries", "stream", "debug"})
+    stream = request.stream
+    if stream is None:
+        stream = len(request.queries) > indexer.config.BATCH_STREAM_THRESHOLD
+
+    if not stream:
+        try:
+            results = []
+            with tracer.collect() as spans, governor.track_query():
+                for _, queries in batches:
+                    results.extend(await run_in_threadpool(indexer.find_batch, queries, **options))
+            if request.debug:
+                return {"results": results, "spans": [span.to_dict() for span in spans]}
+            return {"results": results}
+        except Exception as e:
+            logger.error(f"Error in processing batch query: {e}")
+            return {"error": str(e)}
+
+    async def stream_results():
+        for offset, queries in batches:
+            try:
+                with governor.track_query():
+                    results = await run_in_threadpool(indexer.find_batch, queries, **options)
+                for index, result in enumerate(results, start=offset):
+                    yield json.dumps(jsonable_encoder({"index": index, "result": result})) + "\n"
+            except Exception as e:
+                logger.error(f"Error in processing batch query: {e}")
+                for index in range(offset, offset + len(queries)):
+                    yield json.dumps({"index": index, "error": str(e)}) + "\n"
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+
 @router.post(
     "/embedding", 
     response_description='Get embedding for a query',
@@ -55,7 +152,8 @@ async def query(request: Query):
 async def embedding(request: Query):
     logger.info(f"Received embedding request: {request}")
     try:
-        result = indexer.embed(request.query)
+        with governor.track_query():
+            result = await run_in_threadpool(indexer.embed, request.query)
         logger.info(f"Found {len(result)} results for query: {request.query}")
         return {"result": result}
     except Exception as e:
@@ -63,19 +161,127 @@ async def embedding(request: Query):
         return {"error": str(e)}    
 
 
+@router.get(
+    "/snapshot",
+    response_description='Export the index as a gzip-compressed snapshot stream',
+)
+async def export_snapshot(quantize: str = QueryParam(default="float32", pattern="^(float32|float16|int8)$")):
+    logger.info(f"Exporting snapshot with {quantize} vectors")
+    return StreamingResponse(
+        snapshot.iter_snapshot(indexer, quantize),
+        media_type="application/gzip",
+        headers={"Content-Disposition": 'attachment; filename="minima.snapshot.gz"'}
+    )
+
+
+@router.post(
+    "/snapshot",
+    response_description='Import a snapshot produced by GET /snapshot',
+)
+async def import_snapshot(request: Request):
+    logger.info("Importing snapshot")
+    upload = io.BufferedReader(snapshot.AsyncStreamReader(request.stream(), asyncio.get_running_loop()))
+    try:
+        return {"result": await run_in_threadpool(snapshot.import_snapshot, indexer, upload)}
+    except Exception as e:
+        logger.error(f"Error in importing snapshot: {e}")
+        return {"error": str(e)}
+
+
+@router.post(
+    "/ingest",
+    response_description='Push documents as NDJSON or multipart, upserted or deleted by external ID',
+)
+async def ingest_documents(request: Request):
+    logger.info("Ingesting pushed documents")
+    summary = {"upserted": 0, "unchanged": 0, "deleted": 0, "superseded": 0, "failed": 0, "errors": []}
+    batch: list[ingest.IngestItem] = []
+    positions: list[str] = []
+
+    def record(position: str, status: str, error: Optional[str] = None):
+        summary[status] += 1
+        if error is not None and len(summary["errors"]) < 100:
+            summary["errors"].append({"position": position, "error": error})
+
+    async def commit():
+        try:
+            results = await index_worker.call("ingest", batch)
+        except Exception as e:
+            logger.error(f"Error in ingesting batch: {e}")
+            results = [{"status": "failed", "error": str(e)}] * len(batch)
+        for position, result in zip(positions, results):
+            record(position, result["status"], result.get("error"))
+        batch.clear()
+        positions.clear()
+
+    try:
+        async for position, item in ingest.iter_items(request, indexer.config.INGEST_MAX_DOCUMENT_BYTES):
+            if isinstance(item, Exception):
+                record(position, "failed", str(item))
+                continue
+            batch.append(item)
+            positions.append(position)
+            if len(batch) >= indexer.config.INGEST_BATCH_SIZE:
+                await commit()
+        if batch:
+            await commit()
+    except Exception as e:
+        logger.error(f"Error in reading ingest request: {e}")
+        return {"error": str(e), "result": summary}
+    return {"result": summary}
+
+
+@router.post(
+    "/reindex",
+    response_description='Start reindexing the documents folder or one of its subfolders',
+)
+async def start_reindex(request: ReindexRequest):
+    logger.info(f"Reindex requested for {request.path or 'all files'}")
+    try:
+        scope = indexer.container_path(request.path) if request.path else None
+        return {"result": reindex_coordinator.start(scope, force=request.force).progress()}
+    except (ValueError, RuntimeError) as e:
+        logger.error(f"Unable to start reindexing: {e}")
+        return {"error": str(e)}
+
+
+@router.get(
+    "/reindex",
+    response_description='Progress of the current reindex and the latest finished ones',
+)
+async def reindex_status():
+    return {"result": reindex_coordinator.status()}
+
+
+@router.delete(
+    "/reindex",
+    response_description='Cancel the current reindex',
+)
+async def cancel_reindex():
+    run = reindex_coordinator.cancel()
+    if run is None:
+        return {"error": "No reindex is running"}
+    return {"result": run.progress()}
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    tasks = [
-        asyncio.create_task(crawl_loop(async_queue)),
-        asyncio.create_task(index_loop(async_queue, indexer))
-    ]
-    await schedule_reindexing()
+    schedule = asyncio.create_task(reindex_coordinator.schedule_loop())
     try:
         yield
     finally:
-        for task in tasks:
-            task.cancel()
-        await asyncio.gather(*tasks, return_exceptions=True)
+        schedule.cancel()
+        await asyncio.gather(schedule, return_exceptions=True)
+        await reindex_coordinator.shutdown()
+        index_worker.shutdown()
+
+
+async def trace_requests(request: Request, call_next):
+    with tracer.remote_context(request.headers), \
+            tracer.span(f"{request.method} {request.url.path}") as span:
+        response = await call_next(request)
+        span.set(status_code=response.status_code)
+        return response
 
 
 def create_app() -> FastAPI:
@@ -85,22 +291,7 @@ def create_app() -> FastAPI:
         lifespan=lifespan
     )
     app.include_router(router)
+    app.middleware("http")(trace_requests)
     return app
 
-async def trigger_re_indexer():
-    logger.info("Reindexing triggered")
-    try:
-        await asyncio.gather(
-            crawl_loop(async_queue),
-            index_loop(async_queue, indexer)
-        )
-        logger.info("reindexing finished")
-    except Exception as e:
-        logger.error(f"error in scheduled reindexing {e}")
-
-
-@repeat_every(seconds=60*20)
-async def schedule_reindexing():
-    await trigger_re_indexer()
-
 app = create_app()
\ No newline at end of file
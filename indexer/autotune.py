@@ -0,0 +1,150 @@
+import os
+import json
+import time
+import torch
+import logging
+import platform
+import statistics
+from dataclasses import dataclass, asdict
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class TuningResult:
+    torch_threads: int
+    batch_size: int
+    items_per_second: float
+    batch_latency_ms: float
+
+
+def configure_threading(interop_threads: int = 1) -> None:
+    """
+    Settings that only take effect before torch or the tokenizers run any
+    parallel work, so they are applied once at startup instead of tuned.
+    """
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+    try:
+        torch.set_num_interop_threads(interop_threads)
+    except RuntimeError:
+        logger.info("Torch inter-op threads already initialized, keeping the current value")
+
+
+def _available_cores() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _cpu_model() -> str:
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+def _thread_candidates(limit: int) -> List[int]:
+    candidates = {limit}
+    threads = 1
+    while threads < limit:
+        candidates.add(threads)
+        threads *= 2
+    return sorted(candidates)
+
+
+def autotune(
+        name: str,
+        workload: Callable[[int], None],
+        device: str,
+        cache_path: Optional[str],
+        batch_sizes: List[int],
+        max_latency_ms: float,
+        budget_seconds: float = 60.0,
+        repeats: int = 2,
+) -> TuningResult:
+    """
+    Pick the torch thread count and batch size with the best throughput.
+
+    `workload(batch_size)` must process one batch of that many items on the
+    real model. Every thread count up to the current torch budget (or only
+    the current one on an accelerator) is timed with growing batch sizes;
+    a batch size whose latency exceeds `max_latency_ms` ends that series,
+    and exploring stops once `budget_seconds` are spent. The fastest
+    combination within the latency bound wins, is applied with
+    `torch.set_num_threads` and stored in `cache_path` under a key made of
+    the model, the CPU and the core count, so later boots on the same
+    hardware skip the benchmark.
+    """
+    max_threads = torch.get_num_threads()
+    key = f"{name}|{device}|{_cpu_model()}|{_available_cores()} cores|{max_threads} threads|torch {torch.__version__}"
+    cached = _load(cache_path)
+    if key in cached:
+        result = TuningResult(**cached[key])
+        torch.set_num_threads(result.torch_threads)
+        logger.info(f"Using stored tuning for {name}: {result}")
+        return result
+
+    thread_counts = _thread_candidates(max_threads) if device == "cpu" else [max_threads]
+    started = time.monotonic()
+    measurements: List[TuningResult] = []
+    workload(batch_sizes[0])
+    for threads in thread_counts:
+        torch.set_num_threads(threads)
+        for batch_size in batch_sizes:
+            timings = []
+            for _ in range(repeats):
+                batch_started = time.perf_counter()
+                workload(batch_size)
+                timings.append(time.perf_counter() - batch_started)
+            latency = statistics.median(timings)
+            result = TuningResult(threads, batch_size, batch_size / latency, latency * 1000)
+            measurements.append(result)
+            logger.info(
+                f"Tuning {name}: threads={threads} batch={batch_size} "
+                f"throughput={result.items_per_second:.1f}/s latency={result.batch_latency_ms:.0f}ms"
+            )
+            if result.batch_latency_ms > max_latency_ms or time.monotonic() - started > budget_seconds:
+                break
+        if time.monotonic() - started > budget_seconds:
+            logger.info(f"Tuning {name} stopped after its {budget_seconds:.0f}s budget")
+            break
+
+    within_bound = [m for m in measurements if m.batch_latency_ms <= max_latency_ms]
+    if within_bound:
+        best = max(within_bound, key=lambda m: m.items_per_second)
+    else:
+        best = min(measurements, key=lambda m: m.batch_latency_ms)
+    torch.set_num_threads(best.torch_threads)
+    logger.info(f"Tuned {name} in {time.monotonic() - started:.1f}s: {best}")
+    cached[key] = asdict(best)
+    _store(cache_path, cached)
+    return best
+
+
+def _load(cache_path: Optional[str]) -> dict:
+    if not cache_path or not os.path.exists(cache_path):
+        return {}
+    try:
+        with open(cache_path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable tuning file {cache_path}: {e}")
+        return {}
+
+
+def _store(cache_path: Optional[str], cached: dict) -> None:
+    if not cache_path:
+        return
+    try:
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        tmp_path = cache_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(cached, f, indent=2)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logger.warning(f"Unable to store tuning in {cache_path}: {e}")
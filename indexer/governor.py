@@ -0,0 +1,118 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Iterator
+
+logger = logging.getLogger(__name__)
+
+
+class ResourceGovernor:
+    """
+    Paces background indexing so that interactive queries keep their latency.
+
+    Query handlers report through `track_query`, which records latency and
+    the number of queries in flight. Before every indexing task the index
+    loop awaits `pause`: the pause doubles while the query p95 is above
+    target or too many queries are queued, halves when queries are healthy
+    again and drops to zero once no query has been seen for `idle_seconds`.
+
+    On top of that, `record_work` enforces a hard CPU share: after a task
+    that ran for t seconds, indexing rests for t * (1 - share) / share.
+    """
+
+    def __init__(
+            self,
+            cpu_share: float = 0.5,
+            p95_target_ms: float = 300.0,
+            queue_threshold: int = 4,
+            min_pause_seconds: float = 0.05,
+            max_pause_seconds: float = 5.0,
+            idle_seconds: float = 30.0,
+            window: int = 200,
+    ) -> None:
+        self.cpu_share = min(max(cpu_share, 0.05), 1.0)
+        self.p95_target_ms = p95_target_ms
+        self.queue_threshold = queue_threshold
+        self.min_pause_seconds = min_pause_seconds
+        self.max_pause_seconds = max_pause_seconds
+        self.idle_seconds = idle_seconds
+        self._latencies: deque = deque(maxlen=window)
+        self._in_flight = 0
+        self._last_query = 0.0
+        self._pause = 0.0
+        self._rest = 0.0
+        self._throttled = False
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def track_query(self) -> Iterator[None]:
+        started = time.monotonic()
+        with self._lock:
+            self._in_flight += 1
+        try:
+            yield
+        finally:
+            finished = time.monotonic()
+            with self._lock:
+                self._in_flight -= 1
+                self._last_query = finished
+                self._latencies.append(finished - started)
+
+    def p95_ms(self) -> float:
+        with self._lock:
+            samples = sorted(self._latencies)
+        if not samples:
+            return 0.0
+        return samples[min(len(samples) - 1, int(0.95 * len(samples)))] * 1000
+
+    def stats(self) -> dict:
+        return {
+            "p95_ms": self.p95_ms(),
+            "queries_in_flight": self._in_flight,
+            "pause_seconds": self._pause,
+            "throttled": self._throttled,
+            "cpu_share": self.cpu_share,
+        }
+
+    def _next_pause(self) -> float:
+        if time.monotonic() - self._last_query > self.idle_seconds:
+            with self._lock:
+                self._latencies.clear()
+            return 0.0
+        if self.p95_ms() > self.p95_target_ms or self._in_flight >= self.queue_threshold:
+            return min(max(self._pause * 2, self.min_pause_seconds), self.max_pause_seconds)
+        pause = self._pause / 2
+        return pause if pause >= self.min_pause_seconds else 0.0
+
+    async def pause(self) -> None:
+        """Wait before the next indexing task"""
+        self._pause = self._next_pause()
+        throttled = self._pause > 0
+        if throttled != self._throttled:
+            self._throttled = throttled
+            if throttled:
+                logger.info(f"Throttling indexing, query p95={self.p95_ms():.0f}ms in flight={self._in_flight}")
+            else:
+                logger.info("Indexing at full speed")
+        delay = self._pause + self._rest
+        self._rest = 0.0
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def record_work(self, seconds: float) -> None:
+        """Account for an indexing task that took `seconds` of wall time"""
+        self._rest = seconds * (1 - self.cpu_share) / self.cpu_share
+
+
+def indexing_cpus(cpu_share: float) -> set[int]:
+    """The cores indexing may run on: the last `cpu_share` of the available ones"""
+    if hasattr(os, "sched_getaffinity"):
+        available = sorted(os.sched_getaffinity(0))
+    else:
+        available = list(range(os.cpu_count() or 1))
+    count = max(1, int(len(available) * cpu_share))
+    return set(available[-count:])
@@ -0,0 +1,99 @@
+import os
+import asyncio
+import logging
+import multiprocessing
+from functools import partial
+from typing import Optional
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from indexer import Indexer
+from governor import indexing_cpus
+
+logger = logging.getLogger(__name__)
+
+_worker_indexer: Optional[Indexer] = None
+
+
+def _init_worker(torch_threads: int, cpus: set[int]) -> None:
+    import torch
+
+    global _worker_indexer
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+    os.nice(10)
+    torch.set_num_threads(torch_threads)
+    logging.basicConfig(level=logging.INFO)
+    _worker_indexer = Indexer()
+    # Autotuning may have picked fewer threads, never more than the budget
+    torch.set_num_threads(min(torch.get_num_threads(), torch_threads))
+    logger.info(f"Index worker {os.getpid()} ready on cores {sorted(cpus)} with {torch_threads} torch threads")
+
+
+def _call(method: str, *args):
+    return getattr(_worker_indexer, method)(*args)
+
+
+class IndexWorker:
+    """
+    Runs Indexer methods for the index loop away from the query path.
+
+    In "process" mode a single worker process with its own Indexer does
+    the embedding, pinned to the indexing share of the cores, at a lower
+    priority and with its own torch thread budget, so a reindex cannot
+    take the threads `/query` and `/embedding` use. In "thread" mode, used
+    by the mmap vector backend whose files have a single writer, tasks run
+    one at a time on a dedicated thread of the serving process.
+    """
+
+    def __init__(self, indexer: Indexer) -> None:
+        self.indexer = indexer
+        config = indexer.config
+        self.mode = config.INDEX_WORKER_MODE
+        if self.mode == "process" and config.VECTOR_BACKEND == "mmap":
+            logger.warning("The mmap vector backend has a single writer, indexing in a thread instead of a process")
+            self.mode = "thread"
+        self._executor: Optional[Executor] = None
+        self._cpus = indexing_cpus(config.INDEX_CPU_SHARE)
+        self._torch_threads = config.INDEX_TORCH_THREADS or len(self._cpus)
+        if self.mode == "process":
+            self._limit_query_threads()
+
+    def _limit_query_threads(self) -> None:
+        """Leave the indexing cores to the worker, queries get the other ones"""
+        import torch
+
+        available = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+        query_threads = max(1, available - len(self._cpus))
+        if torch.get_num_threads() > query_threads:
+            torch.set_num_threads(query_threads)
+            logger.info(f"Limited query torch threads to {query_threads}, indexing uses {len(self._cpus)} cores")
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.mode == "process":
+                self._executor = ProcessPoolExecutor(
+                    max_workers=1,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self._torch_threads, self._cpus),
+                )
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="index-worker")
+        return self._executor
+
+    async def call(self, method: str, *args):
+        loop = asyncio.get_running_loop()
+        if self.mode == "process":
+            try:
+                return await loop.run_in_executor(self._get_executor(), partial(_call, method, *args))
+            except BrokenProcessPool:
+                logger.error("Index worker process died, it will be restarted for the next task")
+                self._executor = None
+                raise
+        return await loop.run_in_executor(self._get_executor(), partial(getattr(self.indexer, method), *args))
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
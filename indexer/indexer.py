@@ -2,27 +2,32 @@ import os
 import uuid
 import torch
 import logging
+import tempfile
 import time
 from dataclasses import dataclass
-from typing import List, Dict
-from pathlib import Path
+from typing import List, Dict, Optional
+from pathlib import Path, PurePosixPath
 
-from qdrant_client import QdrantClient
-from langchain_qdrant import QdrantVectorStore
+from qdrant_pool import get_qdrant_client
 from langchain_huggingface import HuggingFaceEmbeddings
-from qdrant_client.http.models import Distance, VectorParams, Filter, FieldCondition, MatchValue
+from langchain_core.documents import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
 from langchain_community.document_loaders import (
     TextLoader,
-    CSVLoader,
     Docx2txtLoader,
     UnstructuredExcelLoader,
     PyMuPDFLoader,
     UnstructuredPowerPointLoader,
 )
 
-from storage import MinimaStore, IndexingStatus
+from storage import MinimaDoc, MinimaStore, IndexingStatus, FileFingerprint, file_fingerprint
+from ingest import TEXT_EXTENSIONS, IngestItem, ingest_path
+from autotune import autotune, configure_threading
+from tabular_loader import TabularLoader
+from text_cache import ExtractedTextCache
+from tracing import tracer
+from vector_store import QdrantBackend, SearchFilter, VectorBackend
 
 logger = logging.getLogger(__name__)
 
@@ -34,12 +39,12 @@ class Config:
         ".pptx": UnstructuredPowerPointLoader,
         ".ppt": UnstructuredPowerPointLoader,
         ".xls": UnstructuredExcelLoader,
-        ".xlsx": UnstructuredExcelLoader,
+        ".xlsx": TabularLoader,
         ".docx": Docx2txtLoader,
         ".doc": Docx2txtLoader,
         ".txt": TextLoader,
         ".md": TextLoader,
-        ".csv": CSVLoader,
+        ".csv": TabularLoader,
     }
     
     DEVICE = torch.device(
@@ -53,77 +58,158 @@ class Config:
     CONTAINER_PATH = os.environ.get("CONTAINER_PATH")
     QDRANT_COLLECTION = "mnm_storage"
     QDRANT_BOOTSTRAP = "qdrant"
+    QDRANT_PREFER_GRPC = os.environ.get("QDRANT_PREFER_GRPC", "false").lower() == "true"
+    QDRANT_GRPC_PORT = int(os.environ.get("QDRANT_GRPC_PORT", 6334))
+    QDRANT_TIMEOUT = int(os.environ.get("QDRANT_TIMEOUT", 10))
+    QDRANT_RETRIES = int(os.environ.get("QDRANT_RETRIES", 3))
+    QDRANT_UPSERT_BATCH_SIZE = int(os.environ.get("QDRANT_UPSERT_BATCH_SIZE", 256))
     EMBEDDING_MODEL_ID = os.environ.get("EMBEDDING_MODEL_ID")
     EMBEDDING_SIZE = os.environ.get("EMBEDDING_SIZE")
+    EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", 32))
+
+    AUTOTUNE = os.environ.get("AUTOTUNE", "false").lower() == "true"
+    AUTOTUNE_PATH = os.environ.get("AUTOTUNE_PATH", "/indexer/storage/tuning.json")
+    AUTOTUNE_MAX_LATENCY_MS = float(os.environ.get("AUTOTUNE_MAX_LATENCY_MS", 2000))
+    AUTOTUNE_BATCH_SIZES = [8, 16, 32, 64, 128]
+
+    VECTOR_BACKEND = os.environ.get("VECTOR_BACKEND", "qdrant")
+    MMAP_PATH = os.environ.get("MMAP_PATH", "/indexer/storage/vectors")
+    MMAP_DTYPE = os.environ.get("MMAP_DTYPE", "float16")
+    MMAP_IVF_LISTS = int(os.environ.get("MMAP_IVF_LISTS", 0))
+    MMAP_NPROBE = int(os.environ.get("MMAP_NPROBE", 8))
     
-    CHUNK_SIZE = 500
-    CHUNK_OVERLAP = 200
+    INDEX_WORKER_MODE = os.environ.get("INDEX_WORKER_MODE", "process")
+    INDEX_CPU_SHARE = float(os.environ.get("INDEX_CPU_SHARE", 0.5))
+    INDEX_TORCH_THREADS = int(os.environ.get("INDEX_TORCH_THREADS", 0))
+    QUERY_P95_TARGET_MS = float(os.environ.get("QUERY_P95_TARGET_MS", 300))
+    QUERY_QUEUE_THRESHOLD = int(os.environ.get("QUERY_QUEUE_THRESHOLD", 4))
+    INDEX_MAX_PAUSE_SECONDS = float(os.environ.get("INDEX_MAX_PAUSE_SECONDS", 5))
+    INDEX_IDLE_SECONDS = float(os.environ.get("INDEX_IDLE_SECONDS", 30))
+    INGEST_PATH_PREFIX = os.environ.get("INGEST_PATH_PREFIX", "/ingest")
+    INGEST_BATCH_SIZE = int(os.environ.get("INGEST_BATCH_SIZE", 64))
+    INGEST_MAX_DOCUMENT_BYTES = int(os.environ.get("INGEST_MAX_DOCUMENT_BYTES", 50 * 1024 * 1024))
+    REINDEX_INTERVAL_SECONDS = float(os.environ.get("REINDEX_INTERVAL_SECONDS", 60 * 20))
+    REINDEX_MIN_INTERVAL_SECONDS = float(os.environ.get("REINDEX_MIN_INTERVAL_SECONDS", 60 * 5))
+    REINDEX_MAX_INTERVAL_SECONDS = float(os.environ.get("REINDEX_MAX_INTERVAL_SECONDS", 60 * 60 * 2))
+
+    BATCH_QUERY_SIZE = int(os.environ.get("BATCH_QUERY_SIZE", 64))
+    BATCH_STREAM_THRESHOLD = int(os.environ.get("BATCH_STREAM_THRESHOLD", 100))
+
+    CHUNK_SIZE = int(os.environ.get("CHUNK_SIZE", 500))
+    CHUNK_OVERLAP = int(os.environ.get("CHUNK_OVERLAP", 200))
+    TEXT_CACHE_PATH = os.environ.get("TEXT_CACHE_PATH", "/indexer/storage/text_cache")
+    TEXT_CACHE_MAX_BYTES = int(os.environ.get("TEXT_CACHE_MAX_BYTES", 2 * 1024 ** 3))
 
 class Indexer:
     def __init__(self):
         self.config = Config()
-        self.qdrant = self._initialize_qdrant()
+        configure_threading()
         self.embed_model = self._initialize_embeddings()
-        self.document_store = self._setup_collection()
+        if self.config.AUTOTUNE:
+            self._autotune()
+        self.store = self._initialize_store()
         self.text_splitter = self._initialize_text_splitter()
+        self.text_cache = ExtractedTextCache(self.config.TEXT_CACHE_PATH, self.config.TEXT_CACHE_MAX_BYTES)
 
-    def _initialize_qdrant(self) -> QdrantClient:
-        return QdrantClient(host=self.config.QDRANT_BOOTSTRAP)
+    def _initialize_store(self) -> VectorBackend:
+        if self.config.VECTOR_BACKEND == "mmap":
+            # imported here so that the Qdrant deployment does not need the local store
+            from mmap_store import MmapBackend
+            return MmapBackend(
+                path=self.config.MMAP_PATH,
+                embeddings=self.embed_model,
+                vector_size=int(self.config.EMBEDDING_SIZE),
+                dtype=self.config.MMAP_DTYPE,
+                ivf_lists=self.config.MMAP_IVF_LISTS,
+                nprobe=self.config.MMAP_NPROBE,
+            )
+        if self.config.VECTOR_BACKEND != "qdrant":
+            raise ValueError(f"Unsupported vector backend: {self.config.VECTOR_BACKEND}")
+        qdrant = get_qdrant_client(
+            host=self.config.QDRANT_BOOTSTRAP,
+            prefer_grpc=self.config.QDRANT_PREFER_GRPC,
+            grpc_port=self.config.QDRANT_GRPC_PORT,
+            timeout=self.config.QDRANT_TIMEOUT,
+            retries=self.config.QDRANT_RETRIES,
+        )
+        return QdrantBackend(
+            client=qdrant,
+            collection=self.config.QDRANT_COLLECTION,
+            embeddings=self.embed_model,
+            vector_size=self.config.EMBEDDING_SIZE,
+        )
 
     def _initialize_embeddings(self) -> HuggingFaceEmbeddings:
         return HuggingFaceEmbeddings(
             model_name=self.config.EMBEDDING_MODEL_ID,
             model_kwargs={'device': self.config.DEVICE},
-            encode_kwargs={'normalize_embeddings': False}
+            encode_kwargs={'normalize_embeddings': False, 'batch_size': self.config.EMBEDDING_BATCH_SIZE}
         )
 
+    def _autotune(self) -> None:
+        sample = ("Minima indexes local documents and answers questions about them. " * 10)[:self.config.CHUNK_SIZE]
+
+        def workload(batch_size: int) -> None:
+            self.embed_model.encode_kwargs["batch_size"] = batch_size
+            self.embed_model.embed_documents([sample] * batch_size)
+
+        result = autotune(
+            name=f"embeddings {self.config.EMBEDDING_MODEL_ID}",
+            workload=workload,
+            device=self.config.DEVICE.type,
+            cache_path=self.config.AUTOTUNE_PATH,
+            batch_sizes=self.config.AUTOTUNE_BATCH_SIZES,
+            max_latency_ms=self.config.AUTOTUNE_MAX_LATENCY_MS,
+        )
+        self.embed_model.encode_kwargs["batch_size"] = result.batch_size
+
     def _initialize_text_splitter(self) -> RecursiveCharacterTextSplitter:
         return RecursiveCharacterTextSplitter(
             chunk_size=self.config.CHUNK_SIZE,
             chunk_overlap=self.config.CHUNK_OVERLAP
         )
 
-    def _setup_collection(self) -> QdrantVectorStore:
-        if not self.qdrant.collection_exists(self.config.QDRANT_COLLECTION):
-            self.qdrant.create_collection(
-                collection_name=self.config.QDRANT_COLLECTION,
-                vectors_config=VectorParams(
-                    size=self.config.EMBEDDING_SIZE,
-                    distance=Distance.COSINE
-                ),
-            )
-        self.qdrant.create_payload_index(
-            collection_name=self.config.QDRANT_COLLECTION,
-            field_name="fpath",
-            field_schema="keyword"
-        )
-        return QdrantVectorStore(
-            client=self.qdrant,
-            collection_name=self.config.QDRANT_COLLECTION,
-            embedding=self.embed_model,
-        )
-
     def _create_loader(self, file_path: str):
         file_extension = Path(file_path).suffix.lower()
         loader_class = self.config.EXTENSIONS_TO_LOADERS.get(file_extension)
         
         if not loader_class:
             raise ValueError(f"Unsupported file type: {file_extension}")
-        
+
+        if loader_class is TabularLoader:
+            return TabularLoader(file_path=file_path, chunk_size=self.config.CHUNK_SIZE)
         return loader_class(file_path=file_path)
 
-    def _process_file(self, loader) -> List[str]:
+    @staticmethod
+    def _file_metadata(file_path: str, last_updated_seconds: int) -> Dict[str, any]:
+        """Payload fields used to filter searches, see SearchFilter"""
+        path = PurePosixPath(file_path)
+        return {
+            "file_path": file_path,
+            "dirs": [str(parent) for parent in path.parents if str(parent) not in (".", "/")],
+            "extension": path.suffix.lower(),
+            "last_updated_seconds": last_updated_seconds,
+        }
+
+    def _process_file(self, loader, last_updated_seconds: int, fingerprint: FileFingerprint) -> List[str]:
+        if isinstance(loader, TabularLoader):
+            return self._process_stream(loader, last_updated_seconds)
         try:
-            documents = loader.load_and_split(self.text_splitter)
+            documents = self.text_splitter.split_documents(self._load_documents(loader, fingerprint))
             if not documents:
                 logger.warning(f"No documents loaded from {loader.file_path}")
                 return []
 
+            file_metadata = self._file_metadata(loader.file_path, last_updated_seconds)
             for doc in documents:
-                doc.metadata['file_path'] = loader.file_path
+                doc.metadata.update(file_metadata)
 
             uuids = [str(uuid.uuid4()) for _ in range(len(documents))]
-            ids = self.document_store.add_documents(documents=documents, ids=uuids)
+            ids = self.store.add_documents(
+                documents=documents,
+                ids=uuids,
+                batch_size=self.config.QDRANT_UPSERT_BATCH_SIZE
+            )
             
             logger.info(f"Successfully processed {len(ids)} documents from {loader.file_path}")
             return ids
@@ -132,79 +218,285 @@ class Indexer:
             logger.error(f"Error processing file {loader.file_path}: {str(e)}")
             return []
 
-    def index(self, message: Dict[str, any]) -> None:
+    def _load_documents(self, loader, fingerprint: Optional[FileFingerprint] = None) -> List[Document]:
+        """
+        Run a loader, or reuse its output for a file with the same content
+        from the text cache. The cache is keyed on the sampled fingerprint
+        `index` already computed, so a miss costs no extra read of the file.
+        """
+        if not self.text_cache.enabled:
+            return loader.load()
+        fingerprint = fingerprint or file_fingerprint(loader.file_path)
+        key = f"{fingerprint.fingerprint}-{fingerprint.size}-{type(loader).__name__}"
+        documents = self.text_cache.get(key)
+        if documents is None:
+            documents = loader.load()
+            self.text_cache.put(key, documents)
+            return documents
+        logger.info(f"Reusing extracted text of {loader.file_path}")
+        for doc in documents:
+            if "source" in doc.metadata:
+                doc.metadata["source"] = loader.file_path
+        return documents
+
+    def _process_stream(self, loader: TabularLoader, last_updated_seconds: int) -> List[str]:
+        """Index a loader's already chunked documents batch by batch, keeping memory bounded"""
+        file_metadata = self._file_metadata(loader.file_path, last_updated_seconds)
+        batch_size = self.config.QDRANT_UPSERT_BATCH_SIZE
+        ids: List[str] = []
+        batch: List[Document] = []
+        try:
+            for doc in loader.lazy_load():
+                doc.metadata.update(file_metadata)
+                batch.append(doc)
+                if len(batch) >= batch_size:
+                    ids.extend(self.store.add_documents(batch, [str(uuid.uuid4()) for _ in batch], batch_size))
+                    batch = []
+            if batch:
+                ids.extend(self.store.add_documents(batch, [str(uuid.uuid4()) for _ in batch], batch_size))
+            logger.info(f"Successfully processed {len(ids)} documents from {loader.file_path}")
+            return ids
+        except Exception as e:
+            logger.error(f"Error processing file {loader.file_path}: {str(e)}")
+            if ids:
+                self.store.delete(ids)
+            return []
+
+    def index(self, message: Dict[str, any]) -> str:
+        """Index one crawled file, returning indexed, moved, unchanged or failed"""
         start = time.time()
         path, file_id, last_updated_seconds = message["path"], message["file_id"], message["last_updated_seconds"]
         logger.info(f"Processing file: {path} (ID: {file_id})")
         indexing_status: IndexingStatus = MinimaStore.check_needs_indexing(fpath=path, last_updated_seconds=last_updated_seconds)
+        if message.get("force") and indexing_status == IndexingStatus.no_need_reindexing:
+            indexing_status = IndexingStatus.need_reindexing
+        status = "unchanged"
         if indexing_status != IndexingStatus.no_need_reindexing:
             logger.info(f"Indexing needed for {path} with status: {indexing_status}")
             try:
-                if indexing_status == IndexingStatus.need_reindexing:
-                    logger.info(f"Removing {path} from index storage for reindexing")
-                    self.remove_from_storage(files_to_remove=[path])
-                loader = self._create_loader(path)
-                ids = self._process_file(loader)
-                if ids:
-                    logger.info(f"Successfully indexed {path} with IDs: {ids}")
+                fingerprint = file_fingerprint(path)
+                if indexing_status == IndexingStatus.new_file and self._relocate(path, last_updated_seconds, fingerprint):
+                    logger.info(f"Skipping {path}, its chunks were moved from the previous path")
+                    status = "moved"
+                else:
+                    status = "indexed"
+                    if indexing_status == IndexingStatus.need_reindexing:
+                        logger.info(f"Removing {path} from index storage for reindexing")
+                        self.remove_from_storage(files_to_remove=[path])
+                    loader = self._create_loader(path)
+                    ids = self._process_file(loader, last_updated_seconds, fingerprint)
+                    if ids:
+                        logger.info(f"Successfully indexed {path} with {len(ids)} chunks")
+                MinimaStore.record_fingerprint(path, fingerprint)
             except Exception as e:
                 logger.error(f"Failed to index file {path}: {str(e)}")
+                status = "failed"
         else:
             logger.info(f"Skipping {path}, no indexing required. timestamp didn't change")
+            if MinimaStore.get_fingerprint(path) is None:
+                try:
+                    MinimaStore.record_fingerprint(path, file_fingerprint(path))
+                except OSError as e:
+                    logger.error(f"Unable to fingerprint {path}: {e}")
         end = time.time()
         logger.info(f"Processing took {end - start} seconds for file {path}")
+        return status
+
+    def _relocate(self, path: str, last_updated_seconds: int, fingerprint: FileFingerprint) -> bool:
+        """
+        Re-point the chunks of a file that was moved or renamed to `path`.
+
+        A manifest entry with the same size and fingerprint whose file no
+        longer exists is taken as the old location; its chunks get the new
+        path metadata in place and its manifest entry is dropped, so the
+        file is neither parsed nor embedded again.
+        """
+        for candidate in MinimaStore.find_by_fingerprint(fingerprint):
+            if candidate.fpath == path or os.path.exists(candidate.fpath):
+                continue
+            metadata = {**self._file_metadata(path, last_updated_seconds), "source": path}
+            moved = self.store.move_file(candidate.fpath, metadata)
+            if not moved:
+                continue
+            MinimaStore.delete_m_doc(candidate.fpath)
+            logger.info(f"Detected move of {candidate.fpath} to {path}, re-pointed {moved} chunks")
+            return True
+        return False
 
     def purge(self, message: Dict[str, any]) -> None:
         existing_file_paths: list[str] = message["existing_file_paths"]
-        files_to_remove = MinimaStore.find_removed_files(existing_file_paths=set(existing_file_paths))
+        files_to_remove = MinimaStore.find_removed_files(
+            existing_file_paths=set(existing_file_paths),
+            directory=message.get("directory")
+        )
         if len(files_to_remove) > 0:
             logger.info(f"purge processing removing old files {files_to_remove}")
             self.remove_from_storage(files_to_remove)
         else:
             logger.info("Nothing to purge")
 
+    def ingest(self, items: List[IngestItem]) -> List[Dict[str, any]]:
+        """
+        Upsert or delete a batch of pushed documents by external ID.
+
+        Documents whose content hash matches the manifest are left alone.
+        The others have their previous chunks deleted and the new ones,
+        with ids derived from the virtual path and chunk number, embedded
+        and stored in one call, so replaying a batch gives the same index.
+        If storing fails the manifest entries are dropped as well, and the
+        next push of those documents indexes them again.
+        """
+        results = [{"id": item.external_id} for item in items]
+        latest: Dict[str, int] = {}
+        for position, item in enumerate(items):
+            try:
+                path = ingest_path(self.config.INGEST_PATH_PREFIX, item.external_id)
+            except ValueError as e:
+                results[position].update(status="failed", error=str(e))
+                continue
+            if path in latest:
+                results[latest[path]]["status"] = "superseded"
+            latest[path] = position
+
+        known = MinimaStore.get_m_docs(list(latest))
+        replaced: List[str] = []
+        removed: List[str] = []
+        upserted: List[int] = []
+        manifest: List[MinimaDoc] = []
+        documents: List[Document] = []
+        ids: List[str] = []
+        for path, position in latest.items():
+            item, result = items[position], results[position]
+            if item.delete:
+                if path in known:
+                    replaced.append(path)
+                    removed.append(path)
+                result["status"] = "deleted"
+                continue
+            content_hash = item.content_hash()
+            if path in known and known[path].fingerprint == content_hash:
+                result["status"] = "unchanged"
+                continue
+            try:
+                chunks = self._ingest_documents(item)
+            except Exception as e:
+                logger.error(f"Failed to parse pushed document {item.external_id}: {e}")
+                result.update(status="failed", error=str(e))
+                continue
+            last_updated_seconds = item.last_updated_seconds or round(time.time())
+            metadata = {
+                **item.metadata,
+                **self._file_metadata(path, last_updated_seconds),
+                "source": path,
+                "external_id": item.external_id,
+            }
+            for number, chunk in enumerate(chunks):
+                chunk.metadata.update(metadata)
+                documents.append(chunk)
+                ids.append(str(uuid.uuid5(uuid.NAMESPACE_URL, f"{path}#{number}")))
+            if path in known:
+                replaced.append(path)
+            manifest.append(MinimaDoc(
+                fpath=path,
+                last_updated_seconds=last_updated_seconds,
+                size=len(item.content) if item.content is not None else len(item.text.encode()),
+                fingerprint=content_hash,
+            ))
+            result.update(status="upserted", chunks=len(chunks))
+            upserted.append(position)
+
+        if replaced:
+            self.remove_from_storage(replaced)
+        if removed:
+            MinimaStore.delete_m_docs(removed)
+        try:
+            if documents:
+                self.store.add_documents(documents, ids, self.config.QDRANT_UPSERT_BATCH_SIZE)
+        except Exception as e:
+            logger.error(f"Failed to store {len(documents)} pushed chunks: {e}")
+            MinimaStore.delete_m_docs([doc.fpath for doc in manifest])
+            for position in upserted:
+                results[position] = {"id": items[position].external_id, "status": "failed", "error": str(e)}
+            return results
+        MinimaStore.restore_m_docs(manifest)
+        logger.info(f"Ingested {len(manifest)} documents with {len(documents)} chunks, deleted {len(removed)}")
+        return results
+
+    def _ingest_documents(self, item: IngestItem) -> List[Document]:
+        """Split a pushed document; file bytes go through the loader of their extension"""
+        if item.text is not None or item.extension in TEXT_EXTENSIONS:
+            text = item.text if item.text is not None else item.content.decode("utf-8", errors="replace")
+            return self.text_splitter.split_documents([Document(page_content=text)])
+        # The loaders read paths, binary formats are parsed from a temporary file
+        with tempfile.NamedTemporaryFile(suffix=item.extension) as f:
+            f.write(item.content)
+            f.flush()
+            loader = self._create_loader(f.name)
+            if isinstance(loader, TabularLoader):
+                return list(loader.lazy_load())
+            return self.text_splitter.split_documents(self._load_documents(loader))
+
     def remove_from_storage(self, files_to_remove: list[str]):
-        filter_conditions = Filter(
-            must=[
-                FieldCondition(
-                    key="fpath",
-                    match=MatchValue(value=fpath)
-                )
-                for fpath in files_to_remove
+        self.store.delete_files(files_to_remove)
+
+    def backfill_metadata(self) -> None:
+        """Add the filterable payload fields to chunks indexed before they existed"""
+        def metadata_for(file_path: str) -> Dict[str, any]:
+            last_updated_seconds = round(os.path.getmtime(file_path)) if os.path.exists(file_path) else 0
+            return self._file_metadata(file_path, last_updated_seconds)
+
+        self.store.backfill_metadata(metadata_for)
+
+    def container_path(self, path: str) -> str:
+        """Map a path under LOCAL_FILES_PATH on the host to its location in the container"""
+        path = path.rstrip("/")
+        local_root = (self.config.LOCAL_FILES_PATH or "").rstrip("/")
+        if local_root and (path == local_root or path.startswith(local_root + "/")):
+            path = self.config.CONTAINER_PATH.rstrip("/") + path[len(local_root):]
+        return str(PurePosixPath(path))
+
+    def _search_filter(
+            self,
+            path_prefix: Optional[str] = None,
+            file_types: Optional[List[str]] = None,
+            modified_after: Optional[int] = None,
+            modified_before: Optional[int] = None,
+    ) -> Optional[SearchFilter]:
+        search_filter = SearchFilter(modified_after=modified_after, modified_before=modified_before)
+        if path_prefix:
+            search_filter.directory = self.container_path(path_prefix)
+        if file_types:
+            search_filter.extensions = [
+                ext.lower() if ext.startswith(".") else f".{ext.lower()}" for ext in file_types
             ]
-        )
-        response = self.qdrant.delete(
-            collection_name=self.config.QDRANT_COLLECTION,
-            points_selector=filter_conditions,
-            wait=True
-        )
-        logger.info(f"Delete response for {len(files_to_remove)} for files: {files_to_remove} is: {response}")
+        return None if search_filter.is_empty() else search_filter
 
-    def find(self, query: str) -> Dict[str, any]:
+    def find(
+            self,
+            query: str,
+            k: int = 4,
+            score_threshold: Optional[float] = None,
+            path_prefix: Optional[str] = None,
+            file_types: Optional[List[str]] = None,
+            modified_after: Optional[int] = None,
+            modified_before: Optional[int] = None,
+    ) -> Dict[str, any]:
         try:
             logger.info(f"Searching for: {query}")
-            found = self.document_store.search(query, search_type="similarity")
+            with tracer.span("vector.search", backend=self.config.VECTOR_BACKEND, k=k) as span:
+                found = self.store.search(
+                    query,
+                    k=k,
+                    search_filter=self._search_filter(path_prefix, file_types, modified_after, modified_before),
+                    score_threshold=score_threshold
+                )
+                span.set(results=len(found))
             
             if not found:
                 logger.info("No results found")
-                return {"links": set(), "output": ""}
+                return {"links": set(), "output": "", "results": []}
 
-            links = set()
-            results = []
-            
-            for item in found:
-                path = item.metadata["file_path"].replace(
-                    self.config.CONTAINER_PATH,
-                    self.config.LOCAL_FILES_PATH
-                )
-                links.add(f"file://{path}")
-                results.append(item.page_content)
-
-            output = {
-                "links": links,
-                "output": ". ".join(results)
-            }
-            
+            output = self._format_results(found)
             logger.info(f"Found {len(found)} results")
             return output
             
@@ -212,5 +504,55 @@ class Indexer:
             logger.error(f"Search failed: {str(e)}")
             return {"error": "Unable to find anything for the given query"}
 
+    def find_batch(
+            self,
+            queries: List[str],
+            k: int = 4,
+            score_threshold: Optional[float] = None,
+            path_prefix: Optional[str] = None,
+            file_types: Optional[List[str]] = None,
+            modified_after: Optional[int] = None,
+            modified_before: Optional[int] = None,
+    ) -> List[Dict[str, any]]:
+        """
+        Search several queries at once.
+
+        All queries are embedded in one batched model call and searched in
+        one batch request to the vector store. Results are returned in query
+        order, with the same shape as `find`.
+        """
+        logger.info(f"Batch searching {len(queries)} queries")
+        with tracer.span("embed.documents", count=len(queries)):
+            vectors = self.embed_model.embed_documents(queries)
+        search_filter = self._search_filter(path_prefix, file_types, modified_after, modified_before)
+        with tracer.span("vector.search_batch", backend=self.config.VECTOR_BACKEND, k=k, count=len(queries)):
+            found = self.store.search_vectors(vectors, k, search_filter, score_threshold)
+        return [self._format_results(item) for item in found]
+
+    def _format_results(self, found: List[tuple]) -> Dict[str, any]:
+        links = set()
+        results = []
+        chunks = []
+
+        for item, score in found:
+            path = item.metadata["file_path"].replace(
+                self.config.CONTAINER_PATH,
+                self.config.LOCAL_FILES_PATH
+            )
+            links.add(f"file://{path}")
+            results.append(item.page_content)
+            chunks.append({
+                "content": item.page_content,
+                "link": f"file://{path}",
+                "score": score
+            })
+
+        return {
+            "links": links,
+            "output": ". ".join(results),
+            "results": chunks
+        }
+
     def embed(self, query: str):
-        return self.embed_model.embed_query(query)
\ No newline at end of file
+        with tracer.span("embed.query"):
+            return self.embed_model.embed_query(query)
\ No newline at end of file
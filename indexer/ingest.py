@@ -0,0 +1,158 @@
+import json
+import base64
+import hashlib
+from dataclasses import dataclass, field
+from pathlib import PurePosixPath
+from typing import AsyncIterator, Dict, Optional, Tuple, Union
+from starlette.requests import Request
+from starlette.datastructures import UploadFile
+
+TEXT_EXTENSIONS = {"", ".txt", ".md"}
+MAX_MULTIPART_PARTS = 10000
+# Room for the id, filename and metadata around the document in an NDJSON record
+MAX_ENVELOPE_BYTES = 1024 * 1024
+
+
+def max_line_bytes(max_bytes: int) -> int:
+    """Longest NDJSON record that can hold a document of `max_bytes`, base64 encoded"""
+    return 4 * -(-max_bytes // 3) + MAX_ENVELOPE_BYTES
+
+
+@dataclass
+class IngestItem:
+    """
+    One pushed document, stored under the virtual path `<prefix>/<external_id>`.
+
+    Exactly one of `text` and `content` (raw file bytes, parsed by the
+    loader for the extension of `filename`) is set, unless `delete` is.
+    """
+    external_id: str
+    text: Optional[str] = None
+    content: Optional[bytes] = None
+    filename: Optional[str] = None
+    metadata: Dict[str, any] = field(default_factory=dict)
+    last_updated_seconds: Optional[int] = None
+    delete: bool = False
+
+    @property
+    def extension(self) -> str:
+        return PurePosixPath(self.filename or self.external_id).suffix.lower()
+
+    def content_hash(self) -> str:
+        """Identifies the indexed state, an unchanged hash needs no re-embedding"""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update((self.filename or "").encode())
+        digest.update(json.dumps(self.metadata, sort_keys=True, default=str).encode())
+        digest.update(self.text.encode() if self.text is not None else self.content)
+        return digest.hexdigest()
+
+
+def ingest_path(prefix: str, external_id: str) -> str:
+    """Virtual file path of an external ID; slashes in the ID become folders"""
+    parts = [part for part in external_id.strip().split("/") if part]
+    if not parts or any(part in (".", "..") for part in parts):
+        raise ValueError(f"Invalid external id {external_id!r}")
+    return str(PurePosixPath(prefix, *parts))
+
+
+def parse_record(record: Dict[str, any], max_bytes: int) -> IngestItem:
+    """
+    Validate one NDJSON record:
+    {"id": ..., "text": ... | "content_base64": ..., "filename": ..., "metadata": {...}}
+    or {"id": ..., "delete": true}
+    """
+    if not isinstance(record, dict) or not isinstance(record.get("id"), str):
+        raise ValueError("Each record needs a string \"id\"")
+    item = IngestItem(
+        external_id=record["id"],
+        filename=record.get("filename"),
+        metadata=record.get("metadata") or {},
+        last_updated_seconds=record.get("last_updated_seconds"),
+        delete=bool(record.get("delete")),
+    )
+    if item.delete:
+        return _validate(item, max_bytes)
+    if isinstance(record.get("text"), str):
+        item.text = record["text"]
+    elif isinstance(record.get("content_base64"), str):
+        item.content = base64.b64decode(record["content_base64"], validate=True)
+    else:
+        raise ValueError("Each record needs \"text\", \"content_base64\" or \"delete\"")
+    return _validate(item, max_bytes)
+
+
+def _validate(item: IngestItem, max_bytes: int) -> IngestItem:
+    if not isinstance(item.metadata, dict):
+        raise ValueError("\"metadata\" must be an object")
+    if not item.delete:
+        size = len(item.content) if item.content is not None else len(item.text)
+        if size > max_bytes:
+            raise ValueError(f"Document of {size} bytes exceeds the {max_bytes} bytes limit")
+    return item
+
+
+async def iter_items(request: Request, max_bytes: int) -> AsyncIterator[Tuple[str, Union[IngestItem, Exception]]]:
+    """
+    Yield (position, item or parse error) from an ingest request body.
+
+    NDJSON bodies are parsed line by line as they stream in, see
+    `parse_record`. In multipart bodies every file part is a document and
+    every text part other than "metadata" a text document, both with the
+    part name as external ID; the optional "metadata" part is a JSON object
+    of metadata by external ID. NDJSON records longer than `max_line_bytes` are rejected, and skipped, as soon
+    as the buffered part exceeds it.
+    """
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        form = await request.form(max_files=MAX_MULTIPART_PARTS, max_fields=MAX_MULTIPART_PARTS)
+        try:
+            metadata = json.loads(form.get("metadata") or "{}")
+            if not isinstance(metadata, dict):
+                raise ValueError("expected an object")
+        except ValueError as e:
+            yield "metadata", ValueError(f"Invalid metadata part: {e}")
+            return
+        for name, value in form.multi_items():
+            if name == "metadata":
+                continue
+            if isinstance(value, UploadFile):
+                item = IngestItem(external_id=name, content=await value.read(), filename=value.filename)
+            else:
+                item = IngestItem(external_id=name, text=value)
+            item.metadata = metadata.get(name) or {}
+            try:
+                result = _validate(item, max_bytes)
+            except ValueError as e:
+                result = e
+            yield name, result
+        return
+
+    max_line = max_line_bytes(max_bytes)
+    buffer = bytearray()
+    line_number = 0
+    skipping = False
+    async for chunk in request.stream():
+        # Only the new chunk can hold a newline, the buffered part has none
+        search_from = len(buffer)
+        buffer += chunk
+        while (newline := buffer.find(b"\n", search_from)) >= 0:
+            line_number += 1
+            if skipping:
+                skipping = False
+            elif buffer[:newline].strip():
+                yield f"line {line_number}", _parse_line(bytes(buffer[:newline]), max_bytes)
+            del buffer[:newline + 1]
+            search_from = 0
+        if len(buffer) > max_line:
+            if not skipping:
+                yield f"line {line_number + 1}", ValueError(f"Record exceeds the {max_line} bytes limit")
+                skipping = True
+            buffer.clear()
+    if buffer.strip() and not skipping:
+        yield f"line {line_number + 1}", _parse_line(bytes(buffer), max_bytes)
+
+
+def _parse_line(line: bytes, max_bytes: int) -> Union[IngestItem, Exception]:
+    try:
+        return parse_record(json.loads(line), max_bytes)
+    except ValueError as e:
+        return e
@@ -0,0 +1,423 @@
+import os
+import json
+import sqlite3
+import logging
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from vector_store import ScoredDocuments, SearchFilter, StoredPoint, VectorBackend
+
+logger = logging.getLogger(__name__)
+
+SQLITE_MAX_PARAMS = 500
+SCORE_CHUNK_ROWS = 65536
+
+
+class MmapBackend(VectorBackend):
+    """
+    Embedded vector store kept in a directory on local disk.
+
+    Vectors are L2 normalized and stored in a memory-mapped array of
+    float16, or int8 with one float32 scale per row, so opening an existing
+    store maps the file instead of reading it and the OS page cache holds
+    the hot part. Payloads live in a SQLite sidecar whose columns back the
+    search filters. Deleted rows are reused by later upserts.
+
+    With `ivf_lists` set, an inverted file index is trained with k-means
+    once the store holds enough vectors, and retrained whenever the number
+    of vectors has doubled since. Unfiltered searches only score the rows
+    of the `nprobe` clusters closest to the query, falling back to every
+    row when those clusters hold fewer than k; filtered searches score all
+    matching rows. Scores are cosine similarities, like Qdrant's.
+    """
+
+    DTYPES = {"float16": np.float16, "int8": np.int8}
+
+    def __init__(
+            self,
+            path: str,
+            embeddings: Embeddings,
+            vector_size: int,
+            dtype: str = "float16",
+            ivf_lists: int = 0,
+            nprobe: int = 8,
+            initial_capacity: int = 1024,
+    ) -> None:
+        if dtype not in self.DTYPES:
+            raise ValueError(f"Unsupported vector dtype: {dtype}")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.embeddings = embeddings
+        self.ivf_lists = ivf_lists
+        self.nprobe = nprobe
+        self._lock = threading.RLock()
+        self._meta_path = os.path.join(path, "meta.json")
+        self._centroids_path = os.path.join(path, "centroids.npy")
+        self._meta = self._load_meta(int(vector_size), dtype, initial_capacity)
+        self.dim = self._meta["dim"]
+        self.dtype = self.DTYPES[self._meta["dtype"]]
+        self._db = sqlite3.connect(os.path.join(path, "payloads.db"), check_same_thread=False)
+        self._setup_db()
+        self._open_arrays()
+        self._load_rows()
+        self._centroids = np.load(self._centroids_path) if os.path.exists(self._centroids_path) else None
+        logger.info(f"Opened local vector store at {path} with {int(self._live.sum())} vectors")
+
+    def _load_meta(self, vector_size: int, dtype: str, initial_capacity: int) -> Dict[str, any]:
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path) as f:
+                meta = json.load(f)
+            if meta["dim"] != vector_size:
+                raise ValueError(
+                    f"Local vector store at {self.path} holds {meta['dim']}-d vectors, expected {vector_size}"
+                )
+            return meta
+        meta = {"dim": vector_size, "dtype": dtype, "capacity": initial_capacity, "count": 0}
+        self._write_meta(meta)
+        return meta
+
+    def _write_meta(self, meta: Dict[str, any]) -> None:
+        tmp_path = self._meta_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._meta_path)
+
+    def _setup_db(self) -> None:
+        self._db.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS points (
+                row INTEGER PRIMARY KEY,
+                id TEXT NOT NULL UNIQUE,
+                file_path TEXT,
+                extension TEXT,
+                last_updated_seconds INTEGER,
+                cluster INTEGER NOT NULL DEFAULT -1,
+                page_content TEXT NOT NULL,
+                metadata TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS points_file_path ON points (file_path);
+            CREATE INDEX IF NOT EXISTS points_extension ON points (extension);
+            CREATE INDEX IF NOT EXISTS points_last_updated ON points (last_updated_seconds);
+        """)
+
+    def _open_arrays(self) -> None:
+        capacity = self._meta["capacity"]
+        self._vectors = self._map("vectors.bin", self.dtype, (capacity, self.dim))
+        self._scales = self._map("scales.bin", np.float32, (capacity,)) if self.dtype == np.int8 else None
+
+    def _map(self, name: str, dtype, shape) -> np.memmap:
+        file_path = os.path.join(self.path, name)
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        with open(file_path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        return np.memmap(file_path, dtype=dtype, mode="r+", shape=shape)
+
+    def _load_rows(self) -> None:
+        # meta.json is written after the payloads commit, so after a crash
+        # it can lag behind the rows SQLite already holds
+        (max_row,) = self._db.execute("SELECT MAX(row) FROM points").fetchone()
+        if max_row is not None and max_row >= self._meta["count"]:
+            logger.warning(f"Recovering row count {max_row + 1} of local vector store at {self.path}")
+            self._meta["count"] = max_row + 1
+            if max_row >= self._meta["capacity"]:
+                self._meta["capacity"] = 1 << max_row.bit_length()
+                self._open_arrays()
+            self._write_meta(self._meta)
+        capacity = self._meta["capacity"]
+        self._live = np.zeros(capacity, dtype=bool)
+        self._clusters = np.full(capacity, -1, dtype=np.int32)
+        rows = self._db.execute("SELECT row, cluster FROM points").fetchall()
+        if rows:
+            rows = np.array(rows, dtype=np.int64)
+            self._live[rows[:, 0]] = True
+            self._clusters[rows[:, 0]] = rows[:, 1]
+
+    def _grow(self, needed: int) -> None:
+        capacity = self._meta["capacity"]
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        self._vectors.flush()
+        if self._scales is not None:
+            self._scales.flush()
+        self._meta["capacity"] = capacity
+        self._open_arrays()
+        self._live = np.concatenate([self._live, np.zeros(capacity - len(self._live), dtype=bool)])
+        self._clusters = np.concatenate(
+            [self._clusters, np.full(capacity - len(self._clusters), -1, dtype=np.int32)]
+        )
+        self._write_meta(self._meta)
+
+    def _allocate(self, n: int) -> np.ndarray:
+        count = self._meta["count"]
+        free = np.flatnonzero(~self._live[:count])[:n]
+        fresh = np.arange(count, count + n - len(free))
+        self._grow(count + len(fresh))
+        self._meta["count"] = count + len(fresh)
+        return np.concatenate([free, fresh]).astype(np.int64)
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def _encode(self, rows: np.ndarray, vectors: np.ndarray) -> None:
+        if self.dtype == np.int8:
+            scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+            self._vectors[rows] = np.round(vectors / scales[:, None]).astype(np.int8)
+            self._scales[rows] = scales
+        else:
+            self._vectors[rows] = vectors.astype(np.float16)
+
+    def _decode(self, rows: np.ndarray) -> np.ndarray:
+        vectors = self._vectors[rows].astype(np.float32)
+        if self._scales is not None:
+            vectors *= self._scales[rows][:, None]
+        return vectors
+
+    def add_documents(self, documents: List[Document], ids: List[str], batch_size: int) -> List[str]:
+        for start in range(0, len(documents), batch_size):
+            batch, batch_ids = documents[start:start + batch_size], ids[start:start + batch_size]
+            vectors = self.embeddings.embed_documents([doc.page_content for doc in batch])
+            self._upsert(batch, batch_ids, self._normalize(np.asarray(vectors, dtype=np.float32)))
+        self._maybe_build_index()
+        return ids
+
+    def upsert_points(self, points: List[StoredPoint]) -> None:
+        vectors = self._normalize(np.asarray([point.vector for point in points], dtype=np.float32))
+        self._upsert([point.document for point in points], [point.id for point in points], vectors)
+        self._maybe_build_index()
+
+    def iter_points(self, batch_size: int) -> Iterator[List[StoredPoint]]:
+        last_row = -1
+        while True:
+            with self._lock:
+                page = self._db.execute(
+                    "SELECT row, id, page_content, metadata FROM points WHERE row > ? ORDER BY row LIMIT ?",
+                    (last_row, batch_size)
+                ).fetchall()
+                if not page:
+                    break
+                vectors = self._decode(np.array([row for row, *_ in page], dtype=np.int64))
+            last_row = page[-1][0]
+            yield [
+                StoredPoint(
+                    id=point_id,
+                    vector=vector.tolist(),
+                    document=Document(page_content=page_content, metadata=json.loads(metadata))
+                )
+                for (_, point_id, page_content, metadata), vector in zip(page, vectors)
+            ]
+
+    def _maybe_build_index(self) -> None:
+        if not self.ivf_lists:
+            return
+        live = int(self._live.sum())
+        if self._centroids is None:
+            if live >= self.ivf_lists * 39:
+                self.build_index()
+        elif live >= 2 * self._meta.get("ivf_trained_rows", 0):
+            self.build_index()
+
+    def _upsert(self, documents: List[Document], ids: List[str], vectors: np.ndarray) -> None:
+        with self._lock:
+            # the delete and the insert commit together
+            self._delete_rows(self._rows_where("id", ids), commit=False)
+            rows = self._allocate(len(ids))
+            self._encode(rows, vectors)
+            self._vectors.flush()
+            if self._scales is not None:
+                self._scales.flush()
+            clusters = self._assign(vectors) if self._centroids is not None else np.full(len(ids), -1)
+            self._db.executemany(
+                "INSERT INTO points (row, id, file_path, extension, last_updated_seconds, cluster, page_content, metadata) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        int(row), point_id,
+                        doc.metadata.get("file_path"),
+                        doc.metadata.get("extension"),
+                        doc.metadata.get("last_updated_seconds"),
+                        int(cluster),
+                        doc.page_content,
+                        json.dumps(doc.metadata),
+                    )
+                    for row, point_id, cluster, doc in zip(rows, ids, clusters, documents)
+                ]
+            )
+            self._db.commit()
+            self._write_meta(self._meta)
+            self._live[rows] = True
+            self._clusters[rows] = clusters
+
+    def _rows_where(self, column: str, values: Iterable[str]) -> List[int]:
+        values = list(values)
+        rows = []
+        for start in range(0, len(values), SQLITE_MAX_PARAMS):
+            chunk = values[start:start + SQLITE_MAX_PARAMS]
+            placeholders = ",".join("?" * len(chunk))
+            rows.extend(
+                row for (row,) in self._db.execute(
+                    f"SELECT row FROM points WHERE {column} IN ({placeholders})", chunk
+                )
+            )
+        return rows
+
+    def _delete_rows(self, rows: List[int], commit: bool = True) -> None:
+        if not rows:
+            return
+        self._live[rows] = False
+        for start in range(0, len(rows), SQLITE_MAX_PARAMS):
+            chunk = rows[start:start + SQLITE_MAX_PARAMS]
+            self._db.execute(f"DELETE FROM points WHERE row IN ({','.join('?' * len(chunk))})", chunk)
+        if commit:
+            self._db.commit()
+
+    def delete(self, ids: List[str]) -> None:
+        with self._lock:
+            self._delete_rows(self._rows_where("id", ids))
+
+    def delete_files(self, file_paths: List[str]) -> None:
+        with self._lock:
+            rows = self._rows_where("file_path", file_paths)
+            self._delete_rows(rows)
+        logger.info(f"Deleted {len(rows)} chunks for files: {file_paths}")
+
+    def move_file(self, file_path: str, metadata: Dict[str, any]) -> int:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT row, metadata FROM points WHERE file_path = ?", (file_path,)
+            ).fetchall()
+            updated = []
+            for row, stored in rows:
+                merged = {**json.loads(stored), **metadata}
+                updated.append((
+                    merged.get("file_path"), merged.get("extension"), merged.get("last_updated_seconds"),
+                    json.dumps(merged), row
+                ))
+            self._db.executemany(
+                "UPDATE points SET file_path = ?, extension = ?, last_updated_seconds = ?, metadata = ? WHERE row = ?",
+                updated
+            )
+            self._db.commit()
+        return len(updated)
+
+    def _filtered_rows(self, search_filter: SearchFilter) -> np.ndarray:
+        conditions, params = [], []
+        if search_filter.directory:
+            prefix = search_filter.directory.rstrip("/").replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            conditions.append("file_path LIKE ? ESCAPE '\\'")
+            params.append(f"{prefix}/%")
+        if search_filter.extensions:
+            conditions.append(f"extension IN ({','.join('?' * len(search_filter.extensions))})")
+            params.extend(search_filter.extensions)
+        if search_filter.modified_after is not None:
+            conditions.append("last_updated_seconds >= ?")
+            params.append(search_filter.modified_after)
+        if search_filter.modified_before is not None:
+            conditions.append("last_updated_seconds <= ?")
+            params.append(search_filter.modified_before)
+        rows = self._db.execute(f"SELECT row FROM points WHERE {' AND '.join(conditions)}", params).fetchall()
+        return np.array([row for (row,) in rows], dtype=np.int64)
+
+    def _candidates(self, query: np.ndarray, k: int, search_filter: Optional[SearchFilter]) -> np.ndarray:
+        if search_filter is not None and not search_filter.is_empty():
+            # probing could miss most of a narrow filter's rows, so they are all scored
+            return self._filtered_rows(search_filter)
+        rows = np.flatnonzero(self._live[:self._meta["count"]])
+        if self._centroids is not None:
+            probes = np.argsort(-(self._centroids @ query))[:self.nprobe]
+            probed = rows[np.isin(self._clusters[rows], probes)]
+            if len(probed) >= k:
+                return probed
+        return rows
+
+    def _payloads(self, rows: List[int]) -> Dict[int, Document]:
+        placeholders = ",".join("?" * len(rows))
+        documents = {}
+        for row, point_id, page_content, metadata in self._db.execute(
+                f"SELECT row, id, page_content, metadata FROM points WHERE row IN ({placeholders})", rows
+        ):
+            documents[row] = Document(page_content=page_content, metadata={**json.loads(metadata), "_id": point_id})
+        return documents
+
+    def _search(
+            self, query: np.ndarray, k: int, search_filter: Optional[SearchFilter], score_threshold: Optional[float]
+    ) -> ScoredDocuments:
+        with self._lock:
+            rows = self._candidates(query, k, search_filter)
+            if not len(rows):
+                return []
+            scores = np.concatenate([
+                self._decode(rows[start:start + SCORE_CHUNK_ROWS]) @ query
+                for start in range(0, len(rows), SCORE_CHUNK_ROWS)
+            ])
+            if score_threshold is not None:
+                keep = scores >= score_threshold
+                rows, scores = rows[keep], scores[keep]
+            if len(rows) > k:
+                top = np.argpartition(-scores, k - 1)[:k]
+                rows, scores = rows[top], scores[top]
+            order = np.argsort(-scores)
+            rows, scores = rows[order], scores[order]
+            if not len(rows):
+                return []
+            documents = self._payloads([int(row) for row in rows])
+        return [(documents[int(row)], float(score)) for row, score in zip(rows, scores)]
+
+    def search(
+            self, query: str, k: int, search_filter: Optional[SearchFilter], score_threshold: Optional[float]
+    ) -> ScoredDocuments:
+        vector = self._normalize(np.asarray([self.embeddings.embed_query(query)], dtype=np.float32))[0]
+        return self._search(vector, k, search_filter, score_threshold)
+
+    def search_vectors(
+            self,
+            vectors: List[List[float]],
+            k: int,
+            search_filter: Optional[SearchFilter],
+            score_threshold: Optional[float]
+    ) -> List[ScoredDocuments]:
+        normalized = self._normalize(np.asarray(vectors, dtype=np.float32))
+        return [self._search(vector, k, search_filter, score_threshold) for vector in normalized]
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        return np.argmax(vectors @ self._centroids.T, axis=1).astype(np.int32)
+
+    def build_index(self, iterations: int = 10, seed: int = 0) -> None:
+        """Train the IVF centroids with spherical k-means and assign every row to a cluster"""
+        with self._lock:
+            rows = np.flatnonzero(self._live[:self._meta["count"]])
+            if len(rows) < self.ivf_lists:
+                return
+            rng = np.random.default_rng(seed)
+            sample = self._decode(np.sort(rng.choice(rows, min(len(rows), self.ivf_lists * 256), replace=False)))
+            centroids = sample[rng.choice(len(sample), self.ivf_lists, replace=False)]
+            for _ in range(iterations):
+                assignment = np.argmax(sample @ centroids.T, axis=1)
+                for cluster in range(self.ivf_lists):
+                    members = sample[assignment == cluster]
+                    if len(members):
+                        centroids[cluster] = members.sum(axis=0)
+                centroids = self._normalize(centroids)
+            self._centroids = centroids.astype(np.float32)
+            clusters = np.concatenate([
+                self._assign(self._decode(rows[start:start + SCORE_CHUNK_ROWS]))
+                for start in range(0, len(rows), SCORE_CHUNK_ROWS)
+            ])
+            self._db.executemany(
+                "UPDATE points SET cluster = ? WHERE row = ?",
+                [(int(cluster), int(row)) for row, cluster in zip(rows, clusters)]
+            )
+            self._db.commit()
+            np.save(self._centroids_path, self._centroids)
+            self._clusters[rows] = clusters
+            self._meta["ivf_trained_rows"] = len(rows)
+            self._write_meta(self._meta)
+        logger.info(f"Built IVF index with {self.ivf_lists} lists over {len(rows)} vectors")
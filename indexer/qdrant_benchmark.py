@@ -0,0 +1,96 @@
+"""
+Compare REST and gRPC transports against a running Qdrant.
+
+Usage:
+    python qdrant_benchmark.py --host localhost --points 20000 --dim 768
+
+For every transport a scratch collection is created, filled with random
+vectors in batches and queried with single and batched searches. Upsert
+throughput and search latency percentiles are printed as a table, and
+the scratch collections are removed afterwards.
+"""
+import time
+import uuid
+import argparse
+import statistics
+import numpy as np
+from qdrant_pool import get_qdrant_client
+from qdrant_client.http.models import Distance, PointStruct, QueryRequest, VectorParams
+
+
+def percentile(values: list[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def run(host: str, prefer_grpc: bool, points: int, dim: int, batch_size: int, queries: int) -> dict:
+    client = get_qdrant_client(host=host, prefer_grpc=prefer_grpc, retries=0)
+    collection = f"bench_{'grpc' if prefer_grpc else 'rest'}_{uuid.uuid4().hex[:8]}"
+    client.create_collection(
+        collection_name=collection,
+        vectors_config=VectorParams(size=dim, distance=Distance.COSINE),
+    )
+    rng = np.random.default_rng(0)
+    try:
+        start = time.perf_counter()
+        for offset in range(0, points, batch_size):
+            vectors = rng.random((min(batch_size, points - offset), dim), dtype=np.float32)
+            client.upsert(
+                collection_name=collection,
+                points=[
+                    PointStruct(id=offset + i, vector=vector.tolist(), payload={"fpath": f"/bench/{offset + i}"})
+                    for i, vector in enumerate(vectors)
+                ],
+                wait=True,
+            )
+        upsert_seconds = time.perf_counter() - start
+
+        query_vectors = rng.random((queries, dim), dtype=np.float32)
+        latencies = []
+        for vector in query_vectors:
+            start = time.perf_counter()
+            client.query_points(collection_name=collection, query=vector.tolist(), limit=10)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        client.query_batch_points(
+            collection_name=collection,
+            requests=[QueryRequest(query=vector.tolist(), limit=10) for vector in query_vectors],
+        )
+        batch_ms = (time.perf_counter() - start) * 1000
+    finally:
+        client.delete_collection(collection)
+
+    return {
+        "transport": "gRPC" if prefer_grpc else "REST",
+        "upsert_points_per_s": points / upsert_seconds,
+        "search_p50_ms": statistics.median(latencies),
+        "search_p95_ms": percentile(latencies, 95),
+        "search_p99_ms": percentile(latencies, 99),
+        "batch_search_ms": batch_ms,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Qdrant REST vs gRPC transport")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    results = [
+        run(args.host, prefer_grpc, args.points, args.dim, args.batch_size, args.queries)
+        for prefer_grpc in (False, True)
+    ]
+    columns = list(results[0])
+    print(" | ".join(columns))
+    print(" | ".join("---" for _ in columns))
+    for result in results:
+        print(" | ".join(
+            value if isinstance(value, str) else f"{value:.2f}" for value in result.values()
+        ))
+
+
+if __name__ == "__main__":
+    main()
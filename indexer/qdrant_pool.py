@@ -0,0 +1,113 @@
+import time
+import grpc
+import httpx
+import random
+import logging
+import threading
+from typing import Any, Callable
+from qdrant_client import QdrantClient
+from qdrant_client.http.exceptions import ResponseHandlingException
+
+logger = logging.getLogger(__name__)
+
+KEEPALIVE_GRPC_OPTIONS = {
+    "grpc.keepalive_time_ms": 30_000,
+    "grpc.keepalive_timeout_ms": 10_000,
+    "grpc.keepalive_permit_without_calls": 1,
+    "grpc.http2.max_pings_without_data": 0,
+}
+RETRYABLE_GRPC_CODES = {
+    grpc.StatusCode.UNAVAILABLE,
+    grpc.StatusCode.DEADLINE_EXCEEDED,
+    grpc.StatusCode.RESOURCE_EXHAUSTED,
+}
+
+
+def _is_transient(error: Exception) -> bool:
+    if isinstance(error, ResponseHandlingException):
+        return True
+    if isinstance(error, grpc.RpcError):
+        return error.code() in RETRYABLE_GRPC_CODES
+    return False
+
+
+class RetryingQdrantClient(QdrantClient):
+    """
+    QdrantClient that retries transient transport failures.
+
+    Only idempotent calls are retried: searches, reads, upserts with
+    explicit ids and deletes by filter.
+    """
+
+    def __init__(self, retries: int, backoff_seconds: float, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self._retries = retries
+        self._backoff_seconds = backoff_seconds
+
+    def _with_retries(self, call: Callable, *args: Any, **kwargs: Any) -> Any:
+        attempt = 0
+        while True:
+            try:
+                return call(*args, **kwargs)
+            except Exception as e:
+                if attempt >= self._retries or not _is_transient(e):
+                    raise
+                delay = self._backoff_seconds * (2 ** attempt) * (0.5 + random.random())
+                attempt += 1
+                logger.warning(f"Qdrant call {call.__name__} failed with {e}, retry {attempt} in {delay:.2f}s")
+                time.sleep(delay)
+
+    def query_points(self, *args: Any, **kwargs: Any) -> Any:
+        return self._with_retries(super().query_points, *args, **kwargs)
+
+    def query_batch_points(self, *args: Any, **kwargs: Any) -> Any:
+        return self._with_retries(super().query_batch_points, *args, **kwargs)
+
+    def retrieve(self, *args: Any, **kwargs: Any) -> Any:
+        return self._with_retries(super().retrieve, *args, **kwargs)
+
+    def scroll(self, *args: Any, **kwargs: Any) -> Any:
+        return self._with_retries(super().scroll, *args, **kwargs)
+
+    def upsert(self, *args: Any, **kwargs: Any) -> Any:
+        return self._with_retries(super().upsert, *args, **kwargs)
+
+    def delete(self, *args: Any, **kwargs: Any) -> Any:
+        return self._with_retries(super().delete, *args, **kwargs)
+
+
+_clients: dict[tuple, RetryingQdrantClient] = {}
+_lock = threading.Lock()
+
+
+def get_qdrant_client(
+        host: str,
+        prefer_grpc: bool = False,
+        grpc_port: int = 6334,
+        timeout: int = 10,
+        retries: int = 3,
+        backoff_seconds: float = 0.2,
+        pool_size: int = 16,
+) -> RetryingQdrantClient:
+    """
+    Return the process-wide Qdrant client for the given settings.
+
+    The client keeps its gRPC channel or HTTP connection pool open for the
+    lifetime of the process, so every caller shares the same keep-alive
+    connections instead of building its own client.
+    """
+    key = (host, prefer_grpc, grpc_port, timeout, retries, backoff_seconds, pool_size)
+    with _lock:
+        if key not in _clients:
+            logger.info(f"Connecting to Qdrant at {host} over {'gRPC' if prefer_grpc else 'REST'}")
+            _clients[key] = RetryingQdrantClient(
+                retries=retries,
+                backoff_seconds=backoff_seconds,
+                host=host,
+                grpc_port=grpc_port,
+                prefer_grpc=prefer_grpc,
+                timeout=timeout,
+                grpc_options=KEEPALIVE_GRPC_OPTIONS,
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            )
+        return _clients[key]
@@ -0,0 +1,241 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from governor import ResourceGovernor
+from index_worker import IndexWorker
+
+logger = logging.getLogger(__name__)
+
+AVAILABLE_EXTENSIONS = [".pdf", ".xls", "xlsx", ".doc", ".docx", ".txt", ".md", ".csv", ".ppt", ".pptx"]
+
+
+@dataclass
+class ReindexRun:
+    id: str
+    scope: str
+    scheduled: bool
+    force: bool = False
+    state: str = "crawling"
+    started_at: float = field(default_factory=time.time)
+    indexing_started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    seen: int = 0
+    queued: int = 0
+    done: int = 0
+    changed: int = 0
+    failed: int = 0
+    error: Optional[str] = None
+    cancel_requested: bool = False
+
+    def progress(self) -> dict:
+        processed = self.done + self.failed
+        throughput = 0.0
+        if self.indexing_started_at is not None:
+            elapsed = (self.finished_at or time.time()) - self.indexing_started_at
+            throughput = processed / elapsed if elapsed > 0 else 0.0
+        eta = None
+        if self.state == "indexing" and throughput > 0:
+            eta = round((self.queued - processed) / throughput, 1)
+        return {
+            "id": self.id,
+            "scope": self.scope,
+            "scheduled": self.scheduled,
+            "force": self.force,
+            "state": self.state,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "files_seen": self.seen,
+            "files_queued": self.queued,
+            "files_done": self.done,
+            "files_changed": self.changed,
+            "files_failed": self.failed,
+            "files_per_second": round(throughput, 3),
+            "eta_seconds": eta,
+            "error": self.error,
+        }
+
+
+class ReindexCoordinator:
+    """
+    Runs crawl and index passes over the document folder, one at a time.
+
+    A run walks its scope (the whole CONTAINER_PATH or a subfolder of it),
+    hands every supported file to the index worker and finally purges the
+    manifest entries of files under the scope that were not found, which
+    leaves documents pushed through /ingest alone. Only one run exists at
+    any time: scheduled runs wait for a manual one to finish and manual
+    triggers are refused while a run is active, so no file is queued twice.
+
+    Full runs are scheduled adaptively: the interval halves after a run
+    that found changed files and grows by half after a run that found
+    none, bounded by `min_interval_seconds` and `max_interval_seconds`.
+    Cancelling is cooperative and takes effect between two files; a
+    cancelled run does not purge, since it has not seen every file.
+    """
+
+    def __init__(
+            self,
+            worker: IndexWorker,
+            governor: ResourceGovernor,
+            root: str,
+            interval_seconds: float = 1200.0,
+            min_interval_seconds: float = 300.0,
+            max_interval_seconds: float = 7200.0,
+            history: int = 10,
+    ) -> None:
+        self.worker = worker
+        self.governor = governor
+        self.root = os.path.normpath(root)
+        self.min_interval_seconds = min_interval_seconds
+        self.max_interval_seconds = max_interval_seconds
+        self.interval_seconds = min(max(interval_seconds, min_interval_seconds), max_interval_seconds)
+        self.next_run_at = time.time()
+        self.current: Optional[ReindexRun] = None
+        self.history: deque = deque(maxlen=history)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, scope: Optional[str] = None, scheduled: bool = False, force: bool = False) -> ReindexRun:
+        """Start a run; `force` re-chunks and re-embeds unchanged files too"""
+        if self.current is not None:
+            raise RuntimeError(f"Reindex {self.current.id} of {self.current.scope} is already running")
+        scope = os.path.normpath(scope or self.root)
+        if os.path.commonpath([self.root, scope]) != self.root:
+            raise ValueError(f"{scope} is outside of {self.root}")
+        if not os.path.isdir(scope):
+            raise ValueError(f"{scope} is not a folder")
+        run = ReindexRun(id=str(uuid.uuid4()), scope=scope, scheduled=scheduled, force=force)
+        self.current = run
+        self._task = asyncio.create_task(self._run(run))
+        logger.info(f"Reindex {run.id} of {scope} started")
+        return run
+
+    def cancel(self) -> Optional[ReindexRun]:
+        if self.current is not None:
+            logger.info(f"Cancelling reindex {self.current.id}")
+            self.current.cancel_requested = True
+        return self.current
+
+    def status(self) -> dict:
+        return {
+            "current": self.current.progress() if self.current else None,
+            "history": [run.progress() for run in reversed(self.history)],
+            "interval_seconds": round(self.interval_seconds, 1),
+            "next_run_in_seconds": round(max(self.next_run_at - time.time(), 0), 1),
+        }
+
+    async def schedule_loop(self) -> None:
+        try:
+            await self.worker.call("backfill_metadata")
+        except Exception as e:
+            logger.error(f"Error in backfilling search metadata: {e}")
+        while True:
+            await asyncio.sleep(max(self.next_run_at - time.time(), 0))
+            if self._task is None:
+                try:
+                    self.start(scheduled=True)
+                except Exception as e:
+                    logger.error(f"Unable to start scheduled reindex: {e}")
+                    self.next_run_at = time.time() + self.interval_seconds
+                    continue
+            # A full manual run reschedules, so check the time again after any run
+            task = self._task
+            if task is not None:
+                await task
+
+    async def shutdown(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def _crawl(self, run: ReindexRun) -> List[Dict[str, any]]:
+        messages = []
+        for root, _, files in os.walk(run.scope):
+            if run.cancel_requested:
+                break
+            logger.info(f"Processing folder: {root}")
+            for file in files:
+                run.seen += 1
+                if not any(file.endswith(ext) for ext in AVAILABLE_EXTENSIONS):
+                    logger.info(f"Skipping file: {file}")
+                    continue
+                path = os.path.join(root, file)
+                try:
+                    last_updated_seconds = round(os.path.getmtime(path))
+                except OSError as e:
+                    logger.error(f"Unable to read {path}: {e}")
+                    run.failed += 1
+                    continue
+                messages.append({
+                    "path": path,
+                    "file_id": str(uuid.uuid4()),
+                    "last_updated_seconds": last_updated_seconds,
+                    "force": run.force,
+                    "type": "file"
+                })
+                run.queued += 1
+        return messages
+
+    async def _run(self, run: ReindexRun) -> None:
+        try:
+            messages = await asyncio.to_thread(self._crawl, run)
+            run.state = "indexing"
+            run.indexing_started_at = time.time()
+            for message in messages:
+                if run.cancel_requested:
+                    break
+                await self.governor.pause()
+                started = time.monotonic()
+                try:
+                    status = await self.worker.call("index", message)
+                except Exception as e:
+                    logger.error(f"Failed to process message: {message}: {e}")
+                    status = "failed"
+                self.governor.record_work(time.monotonic() - started)
+                if status == "failed":
+                    run.failed += 1
+                else:
+                    run.done += 1
+                    run.changed += status in ("indexed", "moved")
+            if run.cancel_requested:
+                run.state = "cancelled"
+            else:
+                await self.worker.call("purge", {
+                    "existing_file_paths": [message["path"] for message in messages],
+                    "directory": run.scope,
+                    "type": "all_files"
+                })
+                run.state = "completed"
+        except asyncio.CancelledError:
+            run.state = "cancelled"
+            raise
+        except Exception as e:
+            logger.error(f"Reindex {run.id} failed: {e}")
+            run.state = "failed"
+            run.error = str(e)
+        finally:
+            run.finished_at = time.time()
+            self.history.append(run)
+            self.current = None
+            self._task = None
+            if run.scope == self.root:
+                self._reschedule(run)
+            logger.info(f"Reindex {run.id} {run.state}: {run.progress()}")
+
+    def _reschedule(self, run: ReindexRun) -> None:
+        if run.state == "completed":
+            factor = 0.5 if run.changed else 1.5
+            self.interval_seconds = min(
+                max(self.interval_seconds * factor, self.min_interval_seconds),
+                self.max_interval_seconds
+            )
+        self.next_run_at = run.finished_at + self.interval_seconds
+        logger.info(
+            f"{run.changed} of {run.done} files changed, "
+            f"next full reindex in {self.interval_seconds:.0f}s"
+        )
@@ -0,0 +1,252 @@
+"""
+Export and import index snapshots.
+
+A snapshot is a gzip-compressed stream of JSON lines: a header with the
+embedding model, the MinimaStore manifest entries, every chunk with its
+vector and payload, and an end record with the counts. Vectors can be
+stored as float32, float16 or int8 with a per-vector scale.
+
+Usage (inside the indexer container):
+    python snapshot.py export /indexer/storage/minima.snapshot.gz --quantize int8
+    python snapshot.py import /indexer/storage/minima.snapshot.gz
+
+The same streams are served by GET and POST /snapshot.
+"""
+import io
+import sys
+import gzip
+import json
+import time
+import zlib
+import base64
+import asyncio
+import logging
+import argparse
+from typing import AsyncIterator, BinaryIO, Dict, Iterator, List
+
+import numpy as np
+from langchain_core.documents import Document
+
+from indexer import Indexer
+from storage import MinimaDoc, MinimaStore
+from vector_store import StoredPoint
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = "minima-snapshot"
+SNAPSHOT_VERSION = 1
+QUANTIZATIONS = ("float32", "float16", "int8")
+EXPORT_BATCH_SIZE = 256
+IMPORT_BATCH_SIZE = 256
+FLUSH_BYTES = 1 << 20
+
+
+def encode_vector(vector: List[float], quantize: str) -> Dict[str, any]:
+    values = np.asarray(vector, dtype=np.float32)
+    if quantize == "int8":
+        scale = max(float(np.abs(values).max()), 1e-12) / 127.0
+        data = np.round(values / scale).astype(np.int8)
+        return {"vector": base64.b64encode(data.tobytes()).decode(), "scale": scale}
+    data = values.astype(np.float16 if quantize == "float16" else np.float32)
+    return {"vector": base64.b64encode(data.tobytes()).decode()}
+
+
+def decode_vector(record: Dict[str, any], quantize: str) -> List[float]:
+    data = base64.b64decode(record["vector"])
+    if quantize == "int8":
+        return (np.frombuffer(data, dtype=np.int8).astype(np.float32) * record["scale"]).tolist()
+    dtype = np.float16 if quantize == "float16" else np.float32
+    return np.frombuffer(data, dtype=dtype).astype(np.float32).tolist()
+
+
+def iter_records(indexer: Indexer, quantize: str = "float32") -> Iterator[Dict[str, any]]:
+    if quantize not in QUANTIZATIONS:
+        raise ValueError(f"Unsupported quantization: {quantize}")
+    yield {
+        "type": "header",
+        "format": SNAPSHOT_FORMAT,
+        "version": SNAPSHOT_VERSION,
+        "embedding_model": indexer.config.EMBEDDING_MODEL_ID,
+        "embedding_size": int(indexer.config.EMBEDDING_SIZE),
+        "quantize": quantize,
+        "created_seconds": round(time.time()),
+    }
+    manifest = 0
+    for doc in MinimaStore.list_m_docs():
+        manifest += 1
+        yield {
+            "type": "manifest",
+            "fpath": doc.fpath,
+            "last_updated_seconds": doc.last_updated_seconds,
+            "size": doc.size,
+            "fingerprint": doc.fingerprint,
+        }
+    points = 0
+    for batch in indexer.store.iter_points(EXPORT_BATCH_SIZE):
+        for point in batch:
+            points += 1
+            yield {
+                "type": "point",
+                "id": point.id,
+                **encode_vector(point.vector, quantize),
+                "page_content": point.document.page_content,
+                "metadata": point.document.metadata,
+            }
+    yield {"type": "end", "manifest": manifest, "points": points}
+    logger.info(f"Exported snapshot with {manifest} files and {points} chunks")
+
+
+def iter_snapshot(indexer: Indexer, quantize: str = "float32") -> Iterator[bytes]:
+    """Yield a gzip-compressed snapshot in chunks of about FLUSH_BYTES"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    buffer = []
+    size = 0
+    for record in iter_records(indexer, quantize):
+        line = json.dumps(record).encode() + b"\n"
+        buffer.append(compressor.compress(line))
+        size += len(buffer[-1])
+        if size >= FLUSH_BYTES:
+            yield b"".join(buffer)
+            buffer, size = [], 0
+    buffer.append(compressor.flush())
+    yield b"".join(buffer)
+
+
+class AsyncStreamReader(io.RawIOBase):
+    """
+    Blocking file object over an async byte stream, for a worker thread.
+
+    Every read pulls the next chunk on the event loop, so an upload is
+    parsed while it arrives and is never buffered as a whole; when the
+    reader stops early, e.g. on a bad header, the rest is not read.
+    """
+
+    def __init__(self, stream: AsyncIterator[bytes], loop: asyncio.AbstractEventLoop) -> None:
+        self._iterator = stream.__aiter__()
+        self._loop = loop
+        self._pending = memoryview(b"")
+        self._done = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending and not self._done:
+            try:
+                chunk = asyncio.run_coroutine_threadsafe(self._iterator.__anext__(), self._loop).result()
+                self._pending = memoryview(chunk)
+            except StopAsyncIteration:
+                self._done = True
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+def import_snapshot(indexer: Indexer, stream: BinaryIO) -> Dict[str, int]:
+    """
+    Load a snapshot into the vector store and the manifest.
+
+    Meant for a new or emptied node. Files the local manifest already knows
+    are skipped, both their chunks and their manifest entry, so an import
+    racing with the first crawl does not duplicate chunks. Chunks are
+    loaded before the manifest; if the import fails, for instance on a
+    truncated stream, the loaded chunks are removed again and the next
+    crawl indexes those files.
+    """
+    known = {doc.fpath for doc in MinimaStore.list_m_docs()}
+    manifest: List[MinimaDoc] = []
+    batch: List[StoredPoint] = []
+    loaded_files = set()
+    stats = {"points": 0, "skipped_points": 0, "manifest": 0}
+    header = None
+    complete = False
+    try:
+        with gzip.GzipFile(fileobj=stream, mode="rb") as lines:
+            for line in lines:
+                record = json.loads(line)
+                kind = record.get("type")
+                if header is None:
+                    header = _check_header(indexer, record)
+                elif kind == "manifest":
+                    if record["fpath"] not in known:
+                        manifest.append(MinimaDoc(
+                            fpath=record["fpath"],
+                            last_updated_seconds=record["last_updated_seconds"],
+                            size=record.get("size"),
+                            fingerprint=record.get("fingerprint")
+                        ))
+                elif kind == "point":
+                    if record["metadata"].get("file_path") in known:
+                        stats["skipped_points"] += 1
+                        continue
+                    loaded_files.add(record["metadata"].get("file_path"))
+                    batch.append(StoredPoint(
+                        id=record["id"],
+                        vector=decode_vector(record, header["quantize"]),
+                        document=Document(page_content=record["page_content"], metadata=record["metadata"])
+                    ))
+                    if len(batch) >= IMPORT_BATCH_SIZE:
+                        indexer.store.upsert_points(batch)
+                        stats["points"] += len(batch)
+                        batch = []
+                elif kind == "end":
+                    complete = True
+        if not complete:
+            raise ValueError("Snapshot is truncated")
+        if batch:
+            indexer.store.upsert_points(batch)
+            stats["points"] += len(batch)
+    except Exception:
+        if loaded_files:
+            logger.error(f"Snapshot import failed, removing chunks of {len(loaded_files)} partially imported files")
+            indexer.store.delete_files(list(loaded_files))
+        raise
+    MinimaStore.restore_m_docs(manifest)
+    stats["manifest"] = len(manifest)
+    logger.info(f"Imported snapshot: {stats}")
+    return stats
+
+
+def _check_header(indexer: Indexer, record: Dict[str, any]) -> Dict[str, any]:
+    if record.get("type") != "header" or record.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError("Not a Minima snapshot")
+    if record["version"] > SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version {record['version']}")
+    if record["quantize"] not in QUANTIZATIONS:
+        raise ValueError(f"Unsupported quantization: {record['quantize']}")
+    if record["embedding_model"] != indexer.config.EMBEDDING_MODEL_ID \
+            or record["embedding_size"] != int(indexer.config.EMBEDDING_SIZE):
+        raise ValueError(
+            f"Snapshot was made with {record['embedding_model']} ({record['embedding_size']}), "
+            f"this node uses {indexer.config.EMBEDDING_MODEL_ID} ({indexer.config.EMBEDDING_SIZE})"
+        )
+    return record
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Export or import a Minima index snapshot")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_command = commands.add_parser("export")
+    export_command.add_argument("path", help="snapshot file to write, - for stdout")
+    export_command.add_argument("--quantize", choices=QUANTIZATIONS, default="float32")
+    import_command = commands.add_parser("import")
+    import_command.add_argument("path", help="snapshot file to read, - for stdin")
+    args = parser.parse_args()
+
+    MinimaStore.create_db_and_tables()
+    indexer = Indexer()
+    if args.command == "export":
+        out = sys.stdout.buffer if args.path == "-" else open(args.path, "wb")
+        with out:
+            for chunk in iter_snapshot(indexer, args.quantize):
+                out.write(chunk)
+    else:
+        source = sys.stdin.buffer if args.path == "-" else open(args.path, "rb")
+        with source:
+            print(json.dumps(import_snapshot(indexer, source)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,9 @@
+import os
+import hashlib
 import logging
+from dataclasses import dataclass
+from typing import Optional
+from sqlalchemy import inspect, text
 from sqlmodel import Field, Session, SQLModel, create_engine, select
 
 from singleton import Singleton
@@ -16,6 +21,9 @@ class IndexingStatus(Enum):
 class MinimaDoc(SQLModel, table=True):
     fpath: str = Field(primary_key=True)
     last_updated_seconds: int | None = Field(default=None, index=True)
+    size: int | None = Field(default=None)
+    fingerprint: str | None = Field(default=None, index=True)
+    inode: int | None = Field(default=None)
 
 
 class MinimaDocUpdate(SQLModel):
@@ -29,12 +37,47 @@ sqlite_url = f"sqlite:///{sqlite_file_name}"
 connect_args = {"check_same_thread": False}
 engine = create_engine(sqlite_url, connect_args=connect_args)
 
+FINGERPRINT_BLOCK_SIZE = 64 * 1024
+
+
+@dataclass
+class FileFingerprint:
+    size: int
+    fingerprint: str
+    inode: int
+
+
+def file_fingerprint(fpath: str) -> FileFingerprint:
+    """
+    Cheap content identity of a file: its size and a hash of its first,
+    middle and last 64KB (the whole file when smaller). The inode is kept
+    as a hint, a plain rename keeps it.
+    """
+    stat = os.stat(fpath)
+    digest = hashlib.blake2b(str(stat.st_size).encode(), digest_size=16)
+    with open(fpath, "rb") as f:
+        if stat.st_size <= 3 * FINGERPRINT_BLOCK_SIZE:
+            digest.update(f.read())
+        else:
+            for offset in (0, stat.st_size // 2, stat.st_size - FINGERPRINT_BLOCK_SIZE):
+                f.seek(offset)
+                digest.update(f.read(FINGERPRINT_BLOCK_SIZE))
+    return FileFingerprint(size=stat.st_size, fingerprint=digest.hexdigest(), inode=stat.st_ino)
+
 
 class MinimaStore(metaclass=Singleton):
 
     @staticmethod
     def create_db_and_tables():
         SQLModel.metadata.create_all(engine)
+        existing = {column["name"] for column in inspect(engine).get_columns(MinimaDoc.__tablename__)}
+        with engine.begin() as connection:
+            for column in MinimaDoc.__table__.columns:
+                if column.name not in existing:
+                    logger.info(f"Adding column {column.name} to {MinimaDoc.__tablename__}")
+                    connection.execute(text(
+                        f"ALTER TABLE {MinimaDoc.__tablename__} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}"
+                    ))
 
     @staticmethod
     def delete_m_doc(fpath: str) -> None:
@@ -56,10 +99,12 @@ class MinimaStore(metaclass=Singleton):
             return doc
 
     @staticmethod
-    def find_removed_files(existing_file_paths: set[str]):
+    def find_removed_files(existing_file_paths: set[str], directory: Optional[str] = None):
         removed_files: list[str] = []
         with Session(engine) as session:
             statement = select(MinimaDoc)
+            if directory:
+                statement = statement.where(MinimaDoc.fpath.startswith(directory.rstrip("/") + "/"))
             results = session.exec(statement)
             logger.debug(f"find_removed_files count found {results}")
             for doc in results:
@@ -71,6 +116,60 @@ class MinimaStore(metaclass=Singleton):
             MinimaStore.delete_m_doc(fpath)
         return removed_files
 
+    @staticmethod
+    def list_m_docs() -> list[MinimaDoc]:
+        with Session(engine) as session:
+            return list(session.exec(select(MinimaDoc)))
+
+    @staticmethod
+    def get_m_docs(fpaths: list[str]) -> dict[str, MinimaDoc]:
+        with Session(engine) as session:
+            statement = select(MinimaDoc).where(MinimaDoc.fpath.in_(fpaths))
+            return {doc.fpath: doc for doc in session.exec(statement)}
+
+    @staticmethod
+    def delete_m_docs(fpaths: list[str]) -> None:
+        with Session(engine) as session:
+            for doc in session.exec(select(MinimaDoc).where(MinimaDoc.fpath.in_(fpaths))):
+                session.delete(doc)
+            session.commit()
+
+    @staticmethod
+    def restore_m_docs(docs: list[MinimaDoc]) -> None:
+        with Session(engine) as session:
+            for doc in docs:
+                session.merge(doc)
+            session.commit()
+
+    @staticmethod
+    def get_fingerprint(fpath: str) -> str | None:
+        with Session(engine) as session:
+            doc = session.get(MinimaDoc, fpath)
+            return doc.fingerprint if doc is not None else None
+
+    @staticmethod
+    def record_fingerprint(fpath: str, fingerprint: FileFingerprint) -> None:
+        with Session(engine) as session:
+            doc = session.get(MinimaDoc, fpath)
+            if doc is None:
+                return
+            doc.size = fingerprint.size
+            doc.fingerprint = fingerprint.fingerprint
+            doc.inode = fingerprint.inode
+            session.add(doc)
+            session.commit()
+
+    @staticmethod
+    def find_by_fingerprint(fingerprint: FileFingerprint) -> list[MinimaDoc]:
+        """Manifest entries with the same content, those with the same inode first"""
+        with Session(engine) as session:
+            statement = select(MinimaDoc).where(
+                MinimaDoc.fingerprint == fingerprint.fingerprint,
+                MinimaDoc.size == fingerprint.size
+            )
+            docs = list(session.exec(statement))
+        return sorted(docs, key=lambda doc: doc.inode != fingerprint.inode)
+
     @staticmethod
     def check_needs_indexing(fpath: str, last_updated_seconds: int) -> IndexingStatus:
         indexing_status: IndexingStatus = IndexingStatus.no_need_reindexing
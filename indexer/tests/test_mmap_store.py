@@ -0,0 +1,179 @@
+"""MmapBackend round trips through the memory-mapped vectors and the SQLite sidecar."""
+import hashlib
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from mmap_store import MmapBackend
+from vector_store import SearchFilter, StoredPoint
+
+DIM = 32
+
+
+class HashEmbeddings(Embeddings):
+    """Deterministic unit vectors derived from the text, no model needed"""
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+        return np.random.default_rng(seed).standard_normal(DIM).tolist()
+
+
+def document(text: str, file_path: str, last_updated_seconds: int = 100) -> Document:
+    return Document(page_content=text, metadata={
+        "file_path": file_path,
+        "extension": "." + file_path.rsplit(".", 1)[-1],
+        "last_updated_seconds": last_updated_seconds,
+    })
+
+
+DOCUMENTS = [
+    document("alpha notes", "/docs/a/alpha.md", 100),
+    document("beta report", "/docs/a/beta.pdf", 200),
+    document("gamma sheet", "/docs/b/gamma.csv", 300),
+    document("delta memo", "/docs/b/delta.md", 400),
+]
+IDS = ["id-alpha", "id-beta", "id-gamma", "id-delta"]
+
+
+@pytest.fixture(params=["float16", "int8"])
+def store_args(request, tmp_path):
+    return {"path": str(tmp_path / "store"), "embeddings": HashEmbeddings(), "vector_size": DIM, "dtype": request.param}
+
+
+def ids(found) -> list[str]:
+    return [doc.metadata["_id"] for doc, _ in found]
+
+
+def test_search_returns_exact_match_first(store_args):
+    store = MmapBackend(**store_args)
+    store.add_documents(DOCUMENTS, IDS, batch_size=3)
+    for doc, point_id in zip(DOCUMENTS, IDS):
+        found = store.search(doc.page_content, k=2, search_filter=None, score_threshold=None)
+        assert ids(found)[0] == point_id
+        assert found[0][1] == pytest.approx(1.0, abs=0.02)
+        assert found[0][0].page_content == doc.page_content
+        assert found[0][0].metadata["file_path"] == doc.metadata["file_path"]
+
+
+def test_filters(store_args):
+    store = MmapBackend(**store_args)
+    store.add_documents(DOCUMENTS, IDS, batch_size=16)
+
+    def search(search_filter: SearchFilter) -> set:
+        return set(ids(store.search("alpha notes", k=10, search_filter=search_filter, score_threshold=None)))
+
+    assert search(SearchFilter(directory="/docs/a")) == {"id-alpha", "id-beta"}
+    assert search(SearchFilter(directory="/docs/a/")) == {"id-alpha", "id-beta"}
+    assert search(SearchFilter(directory="/doc")) == set()
+    assert search(SearchFilter(extensions=[".md"])) == {"id-alpha", "id-delta"}
+    assert search(SearchFilter(modified_after=200, modified_before=300)) == {"id-beta", "id-gamma"}
+    assert search(SearchFilter(directory="/docs/b", extensions=[".md"])) == {"id-delta"}
+
+
+def test_delete_and_reuse_rows(store_args):
+    store = MmapBackend(**store_args)
+    store.add_documents(DOCUMENTS, IDS, batch_size=16)
+    store.delete(["id-alpha"])
+    store.delete_files(["/docs/b/gamma.csv"])
+    remaining = ids(store.search("alpha notes", k=10, search_filter=None, score_threshold=None))
+    assert sorted(remaining) == ["id-beta", "id-delta"]
+
+    store.add_documents([document("epsilon", "/docs/c/epsilon.txt")], ["id-epsilon"], batch_size=16)
+    assert store._meta["count"] == len(DOCUMENTS)
+    assert ids(store.search("epsilon", k=1, search_filter=None, score_threshold=None)) == ["id-epsilon"]
+
+
+def test_upsert_replaces_existing_id(store_args):
+    store = MmapBackend(**store_args)
+    store.add_documents(DOCUMENTS, IDS, batch_size=16)
+    store.add_documents([document("alpha rewritten", "/docs/a/alpha.md")], ["id-alpha"], batch_size=16)
+    found = store.search("alpha rewritten", k=10, search_filter=None, score_threshold=None)
+    assert len(found) == len(DOCUMENTS)
+    assert ids(found)[0] == "id-alpha"
+    assert found[0][0].page_content == "alpha rewritten"
+
+
+def test_reopen_keeps_vectors_and_payloads(store_args):
+    store = MmapBackend(**{**store_args, "initial_capacity": 2})
+    store.add_documents(DOCUMENTS, IDS, batch_size=16)
+    store.delete(["id-beta"])
+    store.move_file("/docs/b/delta.md", {"file_path": "/docs/c/delta.md"})
+    before = store.search("gamma sheet", k=10, search_filter=None, score_threshold=None)
+    store._db.close()
+
+    reopened = MmapBackend(**store_args)
+    after = reopened.search("gamma sheet", k=10, search_filter=None, score_threshold=None)
+    assert ids(after) == ids(before)
+    assert [score for _, score in after] == pytest.approx([score for _, score in before])
+    assert reopened._meta["capacity"] >= len(DOCUMENTS)
+    assert ids(reopened.search("delta memo", k=1, search_filter=SearchFilter(directory="/docs/c"),
+                               score_threshold=None)) == ["id-delta"]
+    assert reopened.search("x", k=10, search_filter=SearchFilter(directory="/docs/b", extensions=[".md"]),
+                           score_threshold=None) == []
+
+
+def test_reopen_with_other_dimension_fails(store_args):
+    MmapBackend(**store_args)._db.close()
+    with pytest.raises(ValueError):
+        MmapBackend(**{**store_args, "vector_size": DIM * 2})
+
+
+def test_points_round_trip_between_stores(store_args, tmp_path):
+    store = MmapBackend(**store_args)
+    store.add_documents(DOCUMENTS, IDS, batch_size=16)
+    copy = MmapBackend(**{**store_args, "path": str(tmp_path / "copy")})
+    for points in store.iter_points(batch_size=3):
+        assert all(isinstance(point, StoredPoint) for point in points)
+        copy.upsert_points(points)
+    query = "beta report"
+    assert ids(copy.search(query, k=10, search_filter=None, score_threshold=None)) == \
+        ids(store.search(query, k=10, search_filter=None, score_threshold=None))
+
+
+def test_ivf_index_finds_exact_matches(tmp_path):
+    store = MmapBackend(str(tmp_path / "ivf"), HashEmbeddings(), DIM, ivf_lists=2, nprobe=2)
+    texts = [f"chunk {i}" for i in range(100)]
+    store.add_documents([document(text, f"/docs/{i}.md") for i, text in enumerate(texts)],
+                        [f"id-{i}" for i in range(100)], batch_size=32)
+    assert store._centroids is not None
+    for i in (0, 42, 99):
+        assert ids(store.search(texts[i], k=1, search_filter=None, score_threshold=None)) == [f"id-{i}"]
+
+
+def test_filtered_search_scores_all_matching_rows_with_ivf(tmp_path):
+    store = MmapBackend(str(tmp_path / "ivf"), HashEmbeddings(), DIM, ivf_lists=8, nprobe=1)
+    store.add_documents([document(f"chunk {i}", f"/docs/{i % 50}/{i}.md") for i in range(400)],
+                        [f"id-{i}" for i in range(400)], batch_size=64)
+    assert store._centroids is not None
+    found = store.search("unrelated", k=8, search_filter=SearchFilter(directory="/docs/7"), score_threshold=None)
+    assert sorted(ids(found)) == sorted(f"id-{i}" for i in range(7, 400, 50))
+    assert len(store.search("unrelated", k=400, search_filter=None, score_threshold=None)) == 400
+
+
+def test_ivf_index_is_retrained_when_the_store_doubles(tmp_path):
+    store = MmapBackend(str(tmp_path / "ivf"), HashEmbeddings(), DIM, ivf_lists=2)
+    store.add_documents([document(f"chunk {i}", f"/docs/{i}.md") for i in range(80)],
+                        [f"id-{i}" for i in range(80)], batch_size=80)
+    assert store._meta["ivf_trained_rows"] == 80
+    store.add_documents([document(f"more {i}", f"/docs/more{i}.md") for i in range(80)],
+                        [f"more-{i}" for i in range(80)], batch_size=80)
+    assert store._meta["ivf_trained_rows"] == 160
+
+
+def test_reopen_recovers_rows_missing_from_meta(store_args):
+    store = MmapBackend(**store_args)
+    store.add_documents(DOCUMENTS[:2], IDS[:2], batch_size=16)
+    stale_meta = dict(store._meta)
+    store.add_documents(DOCUMENTS[2:], IDS[2:], batch_size=16)
+    # a crash between the payload commit and the meta write
+    store._write_meta(stale_meta)
+    store._db.close()
+
+    reopened = MmapBackend(**store_args)
+    assert reopened._meta["count"] == len(DOCUMENTS)
+    reopened.add_documents([document("epsilon", "/docs/c/epsilon.txt")], ["id-epsilon"], batch_size=16)
+    assert len(reopened.search("epsilon", k=10, search_filter=None, score_threshold=None)) == len(DOCUMENTS) + 1
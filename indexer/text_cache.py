@@ -0,0 +1,113 @@
+import os
+import gzip
+import json
+import logging
+import threading
+from typing import List, Optional
+
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+
+
+class ExtractedTextCache:
+    """
+    Gzip-compressed documents produced by loaders, keyed by file fingerprint.
+
+    Parsing PDFs and Office files is often slower than embedding them, and
+    its output does not depend on the chunking or the embedding model, so
+    the loader output is kept before splitting. Entries are keyed by the
+    file's size, its sampled fingerprint (see storage.file_fingerprint) and
+    the loader name, which makes a moved or copied file a hit and an edited
+    one a miss without reading the whole file. Every hit refreshes the
+    entry's mtime; once the cache exceeds `max_bytes` the least recently
+    used entries are removed down to 90% of the cap.
+    """
+
+    def __init__(self, path: str, max_bytes: int) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self._size: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path) and self.max_bytes > 0
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.path, key[:2], f"{key}.json.gz")
+
+    def get(self, key: str) -> Optional[List[Document]]:
+        entry_path = self._entry_path(key)
+        try:
+            with gzip.open(entry_path, "rt", encoding="utf-8") as f:
+                entry = json.load(f)
+            os.utime(entry_path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Dropping unreadable text cache entry {entry_path}: {e}")
+            self._remove(entry_path)
+            return None
+        if entry.get("version") != CACHE_VERSION:
+            return None
+        return [Document(page_content=doc["page_content"], metadata=doc["metadata"]) for doc in entry["documents"]]
+
+    def put(self, key: str, documents: List[Document]) -> None:
+        entry_path = self._entry_path(key)
+        entry = {
+            "version": CACHE_VERSION,
+            "documents": [{"page_content": doc.page_content, "metadata": doc.metadata} for doc in documents],
+        }
+        try:
+            os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+            tmp_path = f"{entry_path}.{os.getpid()}.tmp"
+            with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=6) as f:
+                json.dump(entry, f, default=str)
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, entry_path)
+        except OSError as e:
+            logger.warning(f"Unable to store text cache entry {entry_path}: {e}")
+            return
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _entries(self) -> List[os.DirEntry]:
+        entries = []
+        if not os.path.isdir(self.path):
+            return entries
+        for shard in os.scandir(self.path):
+            if shard.is_dir():
+                entries.extend(entry for entry in os.scandir(shard.path) if entry.name.endswith(".json.gz"))
+        return entries
+
+    def _scan_size(self) -> int:
+        return sum(entry.stat().st_size for entry in self._entries())
+
+    def _evict(self) -> None:
+        entries = sorted(self._entries(), key=lambda entry: entry.stat().st_mtime)
+        size = sum(entry.stat().st_size for entry in entries)
+        target = self.max_bytes * 0.9
+        removed = 0
+        for entry in entries:
+            if size <= target:
+                break
+            size -= entry.stat().st_size
+            self._remove(entry.path)
+            removed += 1
+        self._size = size
+        logger.info(f"Evicted {removed} text cache entries, {size / 1e6:.1f}MB left")
+
+    @staticmethod
+    def _remove(entry_path: str) -> None:
+        try:
+            os.remove(entry_path)
+        except OSError:
+            pass
@@ -0,0 +1,319 @@
+import logging
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from qdrant_client import QdrantClient
+from langchain_qdrant import QdrantVectorStore
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from qdrant_client.http.models import (
+    Distance,
+    VectorParams,
+    Filter,
+    FieldCondition,
+    IsEmptyCondition,
+    MatchAny,
+    MatchValue,
+    PayloadField,
+    PayloadSchemaType,
+    PointIdsList,
+    PointStruct,
+    QueryRequest,
+    Range,
+)
+
+logger = logging.getLogger(__name__)
+
+ScoredDocuments = List[Tuple[Document, float]]
+
+
+@dataclass
+class SearchFilter:
+    """Backend independent search filter over the chunk metadata"""
+    directory: Optional[str] = None
+    extensions: Optional[List[str]] = None
+    modified_after: Optional[int] = None
+    modified_before: Optional[int] = None
+
+    def is_empty(self) -> bool:
+        return (
+            self.directory is None and not self.extensions
+            and self.modified_after is None and self.modified_before is None
+        )
+
+
+@dataclass
+class StoredPoint:
+    """A chunk with its vector, as moved between backends and snapshots"""
+    id: str
+    vector: List[float]
+    document: Document
+
+
+class VectorBackend(ABC):
+    """Storage for embedded chunks used by the Indexer"""
+
+    @abstractmethod
+    def add_documents(self, documents: List[Document], ids: List[str], batch_size: int) -> List[str]:
+        """Embed and upsert documents under the given ids"""
+
+    @abstractmethod
+    def delete(self, ids: List[str]) -> None:
+        """Delete chunks by id"""
+
+    @abstractmethod
+    def delete_files(self, file_paths: List[str]) -> None:
+        """Delete every chunk of the given files"""
+
+    @abstractmethod
+    def move_file(self, file_path: str, metadata: Dict[str, any]) -> int:
+        """Merge `metadata` into the chunks of a file, e.g. its new path, returning how many changed"""
+
+    @abstractmethod
+    def search(
+            self, query: str, k: int, search_filter: Optional[SearchFilter], score_threshold: Optional[float]
+    ) -> ScoredDocuments:
+        """Embed the query and return the k most similar chunks"""
+
+    @abstractmethod
+    def search_vectors(
+            self,
+            vectors: List[List[float]],
+            k: int,
+            search_filter: Optional[SearchFilter],
+            score_threshold: Optional[float]
+    ) -> List[ScoredDocuments]:
+        """Return the k most similar chunks for every vector, in order"""
+
+    @abstractmethod
+    def iter_points(self, batch_size: int) -> Iterator[List[StoredPoint]]:
+        """Yield every stored chunk with its vector, in batches"""
+
+    @abstractmethod
+    def upsert_points(self, points: List[StoredPoint]) -> None:
+        """Store already embedded chunks"""
+
+    def backfill_metadata(self, metadata_for: Callable[[str], Dict[str, any]]) -> None:
+        """Add missing filterable metadata to previously stored chunks"""
+
+
+class QdrantBackend(VectorBackend):
+    """Chunks stored in a Qdrant collection through langchain's QdrantVectorStore"""
+
+    PAYLOAD_INDEXES = {
+        "metadata.file_path": PayloadSchemaType.KEYWORD,
+        "metadata.dirs": PayloadSchemaType.KEYWORD,
+        "metadata.extension": PayloadSchemaType.KEYWORD,
+        "metadata.last_updated_seconds": PayloadSchemaType.INTEGER,
+    }
+
+    def __init__(self, client: QdrantClient, collection: str, embeddings: Embeddings, vector_size: int):
+        self.client = client
+        self.collection = collection
+        self.embeddings = embeddings
+        self._setup_collection(vector_size)
+        self.document_store = QdrantVectorStore(
+            client=self.client,
+            collection_name=self.collection,
+            embedding=self.embeddings,
+        )
+
+    def _setup_collection(self, vector_size: int) -> None:
+        if not self.client.collection_exists(self.collection):
+            self.client.create_collection(
+                collection_name=self.collection,
+                vectors_config=VectorParams(
+                    size=vector_size,
+                    distance=Distance.COSINE
+                ),
+            )
+        for field_name, field_schema in self.PAYLOAD_INDEXES.items():
+            self.client.create_payload_index(
+                collection_name=self.collection,
+                field_name=field_name,
+                field_schema=field_schema
+            )
+
+    def add_documents(self, documents: List[Document], ids: List[str], batch_size: int) -> List[str]:
+        return self.document_store.add_documents(documents=documents, ids=ids, batch_size=batch_size)
+
+    def delete(self, ids: List[str]) -> None:
+        self.client.delete(
+            collection_name=self.collection,
+            points_selector=PointIdsList(points=ids),
+            wait=True
+        )
+
+    def delete_files(self, file_paths: List[str]) -> None:
+        filter_conditions = Filter(
+            must=[
+                FieldCondition(
+                    key="metadata.file_path",
+                    match=MatchAny(any=file_paths)
+                )
+            ]
+        )
+        response = self.client.delete(
+            collection_name=self.collection,
+            points_selector=filter_conditions,
+            wait=True
+        )
+        logger.info(f"Delete response for {len(file_paths)} for files: {file_paths} is: {response}")
+
+    def move_file(self, file_path: str, metadata: Dict[str, any]) -> int:
+        file_filter = Filter(must=[
+            FieldCondition(key="metadata.file_path", match=MatchValue(value=file_path))
+        ])
+        count = self.client.count(
+            collection_name=self.collection,
+            count_filter=file_filter,
+            exact=True
+        ).count
+        self.client.set_payload(
+            collection_name=self.collection,
+            payload=metadata,
+            key="metadata",
+            points=file_filter,
+            wait=True
+        )
+        return count
+
+    def search(
+            self, query: str, k: int, search_filter: Optional[SearchFilter], score_threshold: Optional[float]
+    ) -> ScoredDocuments:
+        return self.document_store.similarity_search_with_score(
+            query,
+            k=k,
+            filter=self._to_filter(search_filter),
+            score_threshold=score_threshold
+        )
+
+    def search_vectors(
+            self,
+            vectors: List[List[float]],
+            k: int,
+            search_filter: Optional[SearchFilter],
+            score_threshold: Optional[float]
+    ) -> List[ScoredDocuments]:
+        qdrant_filter = self._to_filter(search_filter)
+        responses = self.client.query_batch_points(
+            collection_name=self.collection,
+            requests=[
+                QueryRequest(
+                    query=vector,
+                    filter=qdrant_filter,
+                    limit=k,
+                    score_threshold=score_threshold,
+                    with_payload=True
+                )
+                for vector in vectors
+            ]
+        )
+        return [
+            [
+                (
+                    Document(
+                        page_content=point.payload["page_content"],
+                        metadata={**point.payload["metadata"], "_id": point.id}
+                    ),
+                    point.score
+                )
+                for point in response.points
+            ]
+            for response in responses
+        ]
+
+    def iter_points(self, batch_size: int) -> Iterator[List[StoredPoint]]:
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.collection,
+                limit=batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True
+            )
+            if points:
+                yield [
+                    StoredPoint(
+                        id=str(point.id),
+                        vector=point.vector,
+                        document=Document(
+                            page_content=point.payload["page_content"],
+                            metadata=point.payload["metadata"]
+                        )
+                    )
+                    for point in points
+                ]
+            if offset is None:
+                break
+
+    def upsert_points(self, points: List[StoredPoint]) -> None:
+        self.client.upsert(
+            collection_name=self.collection,
+            points=[
+                PointStruct(
+                    id=point.id,
+                    vector=list(point.vector),
+                    payload={
+                        "page_content": point.document.page_content,
+                        "metadata": point.document.metadata
+                    }
+                )
+                for point in points
+            ],
+            wait=True
+        )
+
+    def backfill_metadata(self, metadata_for: Callable[[str], Dict[str, any]]) -> None:
+        missing = Filter(must=[IsEmptyCondition(is_empty=PayloadField(key="metadata.extension"))])
+        backfilled = set()
+        while True:
+            points, _ = self.client.scroll(
+                collection_name=self.collection,
+                scroll_filter=missing,
+                limit=256,
+                with_payload=["metadata.file_path"],
+                with_vectors=False
+            )
+            file_paths = {
+                point.payload["metadata"]["file_path"] for point in points
+            } - backfilled
+            if not file_paths:
+                break
+            for file_path in file_paths:
+                self.client.set_payload(
+                    collection_name=self.collection,
+                    payload=metadata_for(file_path),
+                    key="metadata",
+                    points=Filter(must=[
+                        FieldCondition(key="metadata.file_path", match=MatchValue(value=file_path))
+                    ]),
+                    wait=True
+                )
+                backfilled.add(file_path)
+        if backfilled:
+            logger.info(f"Backfilled search metadata for {len(backfilled)} files")
+
+    @staticmethod
+    def _to_filter(search_filter: Optional[SearchFilter]) -> Optional[Filter]:
+        if search_filter is None or search_filter.is_empty():
+            return None
+        conditions = []
+        if search_filter.directory:
+            conditions.append(FieldCondition(
+                key="metadata.dirs",
+                match=MatchValue(value=search_filter.directory)
+            ))
+        if search_filter.extensions:
+            conditions.append(FieldCondition(
+                key="metadata.extension",
+                match=MatchAny(any=search_filter.extensions)
+            ))
+        if search_filter.modified_after is not None or search_filter.modified_before is not None:
+            conditions.append(FieldCondition(
+                key="metadata.last_updated_seconds",
+                range=Range(gte=search_filter.modified_after, lte=search_filter.modified_before)
+            ))
+        return Filter(must=conditions)
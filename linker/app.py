@@ -5,6 +5,8 @@ import random
 import string
 from fastapi import FastAPI
 from requestor import request_data
+from tasks import TaskProcessor
+from tracing import tracer
 from contextlib import asynccontextmanager
 
 import json
@@ -29,6 +31,7 @@ def sign_in_with_email_and_password(email, password):
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+tracer.service_name = os.environ.get("SERVICE_NAME", "linker")
 
 USERS_COLLECTION_NAME = "users_otp"
 COLLECTION_NAME = os.environ.get("FIRESTORE_COLLECTION_NAME")
@@ -36,6 +39,10 @@ TASKS_COLLECTION = os.environ.get("TASKS_COLLECTION")
 USER_ID = os.environ.get("USER_ID")
 PASSWORD = os.environ.get("PASSWORD")
 FB_PROJECT = os.environ.get("FB_PROJECT")
+TASKS_MODE = os.environ.get("TASKS_MODE", "listen")
+TASKS_WORKERS = int(os.environ.get("TASKS_WORKERS", 8))
+TASKS_LEASE_SECONDS = float(os.environ.get("TASKS_LEASE_SECONDS", 300))
+TASKS_MAX_ATTEMPTS = int(os.environ.get("TASKS_MAX_ATTEMPTS", 3))
 
 app = FastAPI()
 response = sign_in_with_email_and_password(USER_ID, PASSWORD)
@@ -58,28 +65,16 @@ async def poll_firestore():
     else:
         doc_ref.create({'otp': random_otp})
     
-    while True:
-        print(f"OTP for this computer in Minima GPT: {random_otp}")
-        try:
-            docs = db.collection(COLLECTION_NAME).document(USER_ID).collection(TASKS_COLLECTION).stream()
-            for doc in docs:
-                data = doc.to_dict()
-                if data['status'] == 'PENDING':
-                    response = await request_data(data['request'])
-                    if 'error' not in response:
-                        logger.info(f"Updating Firestore document: {doc.id}")
-                        doc_ref = db.collection(COLLECTION_NAME).document(USER_ID).collection(TASKS_COLLECTION).document(doc.id)
-                        doc_ref.update({
-                            'status': 'COMPLETED',
-                            'links': response['result']['links'],
-                            'result': response['result']['output']
-                        })
-                    else:
-                        logger.error(f"Error in processing request: {response['error']}")
-            await asyncio.sleep(0.5)
-        except Exception as e:
-            logger.error(f"Error in polling Firestore collection: {e}")
-            await asyncio.sleep(0.5)
+    print(f"OTP for this computer in Minima GPT: {random_otp}")
+    processor = TaskProcessor(
+        db=db,
+        tasks=db.collection(COLLECTION_NAME).document(USER_ID).collection(TASKS_COLLECTION),
+        request_data=request_data,
+        workers=TASKS_WORKERS,
+        lease_seconds=TASKS_LEASE_SECONDS,
+        max_attempts=TASKS_MAX_ATTEMPTS,
+    )
+    await processor.run(mode=TASKS_MODE)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
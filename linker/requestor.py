@@ -1,31 +1,24 @@
-import httpx
 import logging
-import asyncio
+from http_client import HttpClient
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-REQUEST_DATA_URL = "http://indexer:8000/query"
-REQUEST_HEADERS = {
-    'Accept': 'application/json',
-    'Content-Type': 'application/json'
-}
+INDEXER_URL = "http://indexer:8000"
+REQUEST_DEADLINE_SECONDS = 30
+
+indexer_client = HttpClient(INDEXER_URL)
 
 async def request_data(query):
     payload = {
         "query": query
     }
-    async with httpx.AsyncClient() as client:
-        try:
-            logger.info(f"Requesting data from indexer with query: {query}")
-            response = await client.post(REQUEST_DATA_URL, 
-                                         headers=REQUEST_HEADERS, 
-                                         json=payload)
-            response.raise_for_status()
-            data = response.json()
-            logger.info(f"Received data: {data}")
-            return data
+    try:
+        logger.info(f"Requesting data from indexer with query: {query}")
+        data = await indexer_client.apost("/query", json=payload, deadline=REQUEST_DEADLINE_SECONDS)
+        logger.info(f"Received data: {data}")
+        return data
 
-        except Exception as e:
-            logger.error(f"HTTP error: {e}")
-            return { "error": str(e) }
\ No newline at end of file
+    except Exception as e:
+        logger.error(f"HTTP error: {e}")
+        return { "error": str(e) }
\ No newline at end of file
@@ -0,0 +1,208 @@
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Optional
+from google.cloud import firestore
+from google.cloud.firestore_v1.base_query import FieldFilter
+from tracing import tracer
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PENDING = "PENDING"
+PROCESSING = "PROCESSING"
+COMPLETED = "COMPLETED"
+FAILED = "FAILED"
+
+
+class TaskProcessor:
+    """
+    Processes PENDING tasks of a Firestore tasks collection.
+
+    In "listen" mode a snapshot listener limited to PENDING tasks feeds a
+    bounded pool of workers; if the listener cannot be started or closes,
+    the processor falls back to polling the same query with exponential
+    backoff while idle. A worker claims a task by moving it from PENDING
+    to PROCESSING in a transaction, so a task is never processed twice even
+    if it is seen by both the listener and a poll, or by several linkers.
+
+    A claim holds a lease of `lease_seconds`. If the linker dies or the
+    final update fails, the task stays PROCESSING until a periodic sweep
+    finds the expired lease and puts it back to PENDING, or marks it FAILED
+    once it has been claimed `max_attempts` times.
+
+    Claims and releases run in Firestore transactions; the tests drive them
+    with an in-memory fake of the client or the Firestore emulator.
+    """
+
+    def __init__(
+            self,
+            db: firestore.Client,
+            tasks: firestore.CollectionReference,
+            request_data: Callable[[str], Awaitable[dict]],
+            workers: int = 8,
+            poll_min_seconds: float = 0.5,
+            poll_max_seconds: float = 10.0,
+            lease_seconds: float = 300.0,
+            max_attempts: int = 3,
+    ) -> None:
+        self.db = db
+        self.tasks = tasks
+        self.request_data = request_data
+        self.workers = workers
+        self.poll_min_seconds = poll_min_seconds
+        self.poll_max_seconds = poll_max_seconds
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._queue: Optional[asyncio.Queue] = None
+        self._seen: set[str] = set()
+        self._watch = None
+
+    async def run(self, mode: str = "listen") -> None:
+        self._queue = asyncio.Queue()
+        workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        workers.append(asyncio.create_task(self._sweep()))
+        try:
+            if mode == "listen":
+                await self._listen()
+            await self._poll()
+        finally:
+            if self._watch is not None:
+                self._watch.unsubscribe()
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    def _pending_query(self):
+        return self.tasks.where(filter=FieldFilter("status", "==", PENDING))
+
+    def _enqueue(self, doc_id: str) -> bool:
+        if doc_id in self._seen:
+            return False
+        self._seen.add(doc_id)
+        self._queue.put_nowait(doc_id)
+        return True
+
+    async def _listen(self) -> None:
+        loop = asyncio.get_running_loop()
+
+        def on_snapshot(snapshots, changes, read_time):
+            for change in changes:
+                if change.type.name != "REMOVED":
+                    loop.call_soon_threadsafe(self._enqueue, change.document.id)
+
+        try:
+            self._watch = self._pending_query().on_snapshot(on_snapshot)
+        except Exception as e:
+            logger.error(f"Unable to start Firestore listener: {e}")
+            return
+        logger.info("Listening for pending tasks")
+        while self._watch.is_active:
+            await asyncio.sleep(self.poll_max_seconds)
+        logger.warning("Firestore listener closed, falling back to polling")
+
+    async def _poll(self) -> None:
+        logger.info("Polling for pending tasks")
+        delay = self.poll_min_seconds
+        while True:
+            try:
+                docs = await asyncio.to_thread(lambda: list(self._pending_query().stream()))
+                found = [self._enqueue(doc.id) for doc in docs]
+                delay = self.poll_min_seconds if any(found) else min(delay * 2, self.poll_max_seconds)
+            except Exception as e:
+                logger.error(f"Error in polling Firestore collection: {e}")
+                delay = min(delay * 2, self.poll_max_seconds)
+            await asyncio.sleep(delay)
+
+    async def _sweep(self) -> None:
+        while True:
+            await asyncio.sleep(self.lease_seconds / 2)
+            try:
+                recovered = await asyncio.to_thread(self.recover_expired)
+                if recovered:
+                    logger.warning(f"Recovered {recovered} tasks with an expired lease")
+            except Exception as e:
+                logger.error(f"Error in recovering expired tasks: {e}")
+
+    async def _worker(self) -> None:
+        while True:
+            doc_id = await self._queue.get()
+            try:
+                with tracer.span("linker.task", task_id=doc_id):
+                    await self._process(doc_id)
+            except Exception as e:
+                logger.error(f"Error in processing task {doc_id}: {e}")
+            finally:
+                self._seen.discard(doc_id)
+                self._queue.task_done()
+
+    async def _process(self, doc_id: str) -> None:
+        data = await asyncio.to_thread(self.claim, doc_id)
+        if data is None:
+            logger.info(f"Task {doc_id} already claimed")
+            return
+        response = await self.request_data(data["request"])
+        doc_ref = self.tasks.document(doc_id)
+        if "error" not in response:
+            logger.info(f"Updating Firestore document: {doc_id}")
+            await asyncio.to_thread(doc_ref.update, {
+                "status": COMPLETED,
+                "links": response["result"]["links"],
+                "result": response["result"]["output"]
+            })
+        else:
+            logger.error(f"Error in processing request: {response['error']}")
+            await asyncio.to_thread(doc_ref.update, {
+                "status": FAILED,
+                "error": response["error"]
+            })
+
+    def claim(self, doc_id: str) -> Optional[dict[str, Any]]:
+        """Move a task from PENDING to PROCESSING, returning its data if this call won"""
+        doc_ref = self.tasks.document(doc_id)
+
+        @firestore.transactional
+        def claim_in_transaction(transaction):
+            snapshot = doc_ref.get(transaction=transaction)
+            if not snapshot.exists:
+                return None
+            data = snapshot.to_dict()
+            if data.get("status") != PENDING:
+                return None
+            transaction.update(doc_ref, {
+                "status": PROCESSING,
+                "lease_expires_at": time.time() + self.lease_seconds,
+                "attempts": data.get("attempts", 0) + 1,
+            })
+            return data
+
+        return claim_in_transaction(self.db.transaction())
+
+    def recover_expired(self) -> int:
+        """Release PROCESSING tasks whose lease expired, returning how many were released"""
+        now = time.time()
+        processing = self.tasks.where(filter=FieldFilter("status", "==", PROCESSING)).stream()
+        expired = [doc.id for doc in processing if doc.to_dict().get("lease_expires_at", 0) < now]
+        return sum(self._release(doc_id, now) for doc_id in expired)
+
+    def _release(self, doc_id: str, now: float) -> bool:
+        doc_ref = self.tasks.document(doc_id)
+
+        @firestore.transactional
+        def release_in_transaction(transaction):
+            snapshot = doc_ref.get(transaction=transaction)
+            if not snapshot.exists:
+                return False
+            data = snapshot.to_dict()
+            if data.get("status") != PROCESSING or data.get("lease_expires_at", 0) >= now:
+                return False
+            if data.get("attempts", 0) >= self.max_attempts:
+                transaction.update(doc_ref, {
+                    "status": FAILED,
+                    "error": f"Task lease expired after {data['attempts']} attempts"
+                })
+            else:
+                transaction.update(doc_ref, {"status": PENDING})
+            return True
+
+        return release_in_transaction(self.db.transaction())
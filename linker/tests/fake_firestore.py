@@ -0,0 +1,175 @@
+"""
+In-memory stand-in for the part of the Firestore client TaskProcessor uses.
+
+Transactions are serialized by one lock and buffer their writes until
+commit, so `firestore.transactional` drives them like real ones. Queries
+support equality filters; snapshot listeners get the matching documents
+first and then every change, like a Watch.
+"""
+import copy
+import uuid
+import threading
+from types import SimpleNamespace
+from typing import Any, Callable, Optional
+
+ADDED = SimpleNamespace(name="ADDED")
+MODIFIED = SimpleNamespace(name="MODIFIED")
+REMOVED = SimpleNamespace(name="REMOVED")
+
+
+class FakeSnapshot:
+    def __init__(self, reference: "FakeDocument", data: Optional[dict]) -> None:
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self._data = copy.deepcopy(data)
+
+    def to_dict(self) -> Optional[dict]:
+        return copy.deepcopy(self._data)
+
+
+class FakeDocument:
+    def __init__(self, collection: "FakeCollection", doc_id: str) -> None:
+        self.collection = collection
+        self.id = doc_id
+
+    def get(self, transaction: Optional["FakeTransaction"] = None) -> FakeSnapshot:
+        with self.collection.db.lock:
+            return FakeSnapshot(self, self.collection.docs.get(self.id))
+
+    def set(self, data: dict) -> None:
+        self.collection.write(self.id, copy.deepcopy(data))
+
+    def update(self, data: dict) -> None:
+        with self.collection.db.lock:
+            current = self.collection.docs.get(self.id)
+            if current is None:
+                raise KeyError(f"No document to update: {self.id}")
+            self.collection.write(self.id, {**current, **copy.deepcopy(data)})
+
+    def delete(self) -> None:
+        self.collection.write(self.id, None)
+
+
+class FakeWatch:
+    def __init__(self, query: "FakeQuery", callback: Callable) -> None:
+        self.query = query
+        self.callback = callback
+        self.is_active = True
+
+    def unsubscribe(self) -> None:
+        self.is_active = False
+        self.query.collection.watches.remove(self)
+
+    def notify(self, snapshot: FakeSnapshot, before: Optional[dict]) -> None:
+        was_match = before is not None and self.query.matches(before)
+        is_match = snapshot.exists and self.query.matches(snapshot.to_dict())
+        if is_match:
+            change = MODIFIED if was_match else ADDED
+        elif was_match:
+            change = REMOVED
+        else:
+            return
+        self.callback([], [SimpleNamespace(type=change, document=snapshot)], None)
+
+
+class FakeQuery:
+    def __init__(self, collection: "FakeCollection", filters: list) -> None:
+        self.collection = collection
+        self.filters = filters
+
+    def where(self, filter) -> "FakeQuery":
+        assert filter.op_string == "==", "only equality filters are supported"
+        return FakeQuery(self.collection, self.filters + [filter])
+
+    def matches(self, data: dict) -> bool:
+        return all(data.get(f.field_path) == f.value for f in self.filters)
+
+    def stream(self) -> list[FakeSnapshot]:
+        with self.collection.db.lock:
+            return [
+                FakeSnapshot(self.collection.document(doc_id), data)
+                for doc_id, data in self.collection.docs.items()
+                if self.matches(data)
+            ]
+
+    def on_snapshot(self, callback: Callable) -> FakeWatch:
+        watch = FakeWatch(self, callback)
+        with self.collection.db.lock:
+            self.collection.watches.append(watch)
+            changes = [SimpleNamespace(type=ADDED, document=snapshot) for snapshot in self.stream()]
+        callback([], changes, None)
+        return watch
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, db: "FakeFirestore", name: str) -> None:
+        super().__init__(self, [])
+        self.db = db
+        self.name = name
+        self.docs: dict[str, dict] = {}
+        self.watches: list[FakeWatch] = []
+
+    def document(self, doc_id: str) -> FakeDocument:
+        return FakeDocument(self, doc_id)
+
+    def write(self, doc_id: str, data: Optional[dict]) -> None:
+        with self.db.lock:
+            before = self.docs.get(doc_id)
+            if data is None:
+                self.docs.pop(doc_id, None)
+            else:
+                self.docs[doc_id] = data
+            snapshot = FakeSnapshot(self.document(doc_id), data)
+            for watch in list(self.watches):
+                watch.notify(snapshot, before)
+
+
+class FakeTransaction:
+    """Holds the database lock from begin to commit or rollback"""
+
+    _read_only = False
+    _max_attempts = 1
+
+    def __init__(self, db: "FakeFirestore") -> None:
+        self.db = db
+        self._id: Optional[bytes] = None
+        self._writes: list[tuple[FakeDocument, dict]] = []
+
+    def _clean_up(self) -> None:
+        self._writes = []
+        self._id = None
+
+    def _begin(self, retry_id: Any = None) -> None:
+        self.db.lock.acquire()
+        self._id = uuid.uuid4().bytes
+
+    def update(self, reference: FakeDocument, data: dict) -> None:
+        self._writes.append((reference, data))
+
+    def _commit(self) -> list:
+        try:
+            for reference, data in self._writes:
+                reference.update(data)
+        finally:
+            self._clean_up()
+            self.db.lock.release()
+        return []
+
+    def _rollback(self) -> None:
+        if self._id is not None:
+            self._clean_up()
+            self.db.lock.release()
+
+
+class FakeFirestore:
+    def __init__(self) -> None:
+        self.lock = threading.RLock()
+        self.collections: dict[str, FakeCollection] = {}
+
+    def collection(self, name: str) -> FakeCollection:
+        with self.lock:
+            return self.collections.setdefault(name, FakeCollection(self, name))
+
+    def transaction(self) -> FakeTransaction:
+        return FakeTransaction(self)
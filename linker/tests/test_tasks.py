@@ -0,0 +1,116 @@
+"""
+TaskProcessor against an in-memory fake of Firestore and, when one runs,
+the Firestore emulator.
+
+Start one with `gcloud emulators firestore start --host-port=localhost:8080`
+and run `FIRESTORE_EMULATOR_HOST=localhost:8080 pytest linker/tests`.
+"""
+import os
+import time
+import uuid
+import asyncio
+import pytest
+
+firestore = pytest.importorskip("google.cloud.firestore")
+
+from fake_firestore import FakeFirestore
+from tasks import COMPLETED, FAILED, PENDING, PROCESSING, TaskProcessor
+
+
+@pytest.fixture(params=["fake", "emulator"])
+def db(request):
+    if request.param == "fake":
+        return FakeFirestore()
+    if not os.environ.get("FIRESTORE_EMULATOR_HOST"):
+        pytest.skip("FIRESTORE_EMULATOR_HOST is not set")
+    return firestore.Client(project="minima-test")
+
+
+@pytest.fixture
+def tasks(db):
+    collection = db.collection("tasks-" + uuid.uuid4().hex)
+    yield collection
+    for doc in collection.stream():
+        doc.reference.delete()
+
+
+async def answer(request: str) -> dict:
+    if request == "fail":
+        return {"error": "indexer failed"}
+    return {"result": {"links": [f"file:///{request}.md"], "output": f"answer to {request}"}}
+
+
+def run_until(processor: TaskProcessor, mode: str, done, timeout: float = 20.0) -> None:
+    async def main():
+        runner = asyncio.create_task(processor.run(mode=mode))
+        deadline = time.monotonic() + timeout
+        try:
+            while not await asyncio.to_thread(done):
+                assert time.monotonic() < deadline, "tasks were not processed in time"
+                await asyncio.sleep(0.2)
+        finally:
+            runner.cancel()
+            await asyncio.gather(runner, return_exceptions=True)
+
+    asyncio.run(main())
+
+
+def statuses(tasks) -> dict:
+    return {doc.id: doc.to_dict()["status"] for doc in tasks.stream()}
+
+
+@pytest.mark.parametrize("mode", ["listen", "poll"])
+def test_processes_pending_tasks(db, tasks, mode):
+    for name in ("a", "b", "fail"):
+        tasks.document(name).set({"status": PENDING, "request": name})
+    processor = TaskProcessor(db, tasks, answer, workers=2, poll_min_seconds=0.1, poll_max_seconds=0.5)
+
+    run_until(processor, mode, lambda: PENDING not in statuses(tasks).values())
+
+    assert statuses(tasks) == {"a": COMPLETED, "b": COMPLETED, "fail": FAILED}
+    assert tasks.document("a").get().to_dict()["result"] == "answer to a"
+
+
+def test_claim_is_exclusive(db, tasks):
+    tasks.document("a").set({"status": PENDING, "request": "a"})
+    processor = TaskProcessor(db, tasks, answer)
+
+    assert processor.claim("a")["request"] == "a"
+    assert processor.claim("a") is None
+    claimed = tasks.document("a").get().to_dict()
+    assert claimed["status"] == PROCESSING
+    assert claimed["attempts"] == 1
+
+
+def test_expired_lease_is_released_then_failed(db, tasks):
+    tasks.document("stuck").set({"status": PROCESSING, "request": "stuck", "lease_expires_at": 0, "attempts": 1})
+    tasks.document("busy").set({"status": PROCESSING, "request": "busy", "lease_expires_at": time.time() + 60})
+    tasks.document("dead").set({"status": PROCESSING, "request": "dead", "lease_expires_at": 0, "attempts": 3})
+    processor = TaskProcessor(db, tasks, answer, max_attempts=3)
+
+    assert processor.recover_expired() == 2
+    assert statuses(tasks) == {"stuck": PENDING, "busy": PROCESSING, "dead": FAILED}
+
+
+def test_recovered_task_is_processed(db, tasks):
+    tasks.document("stuck").set({"status": PROCESSING, "request": "stuck", "lease_expires_at": 0})
+    processor = TaskProcessor(db, tasks, answer, lease_seconds=0.4, poll_min_seconds=0.1, poll_max_seconds=0.5)
+
+    run_until(processor, "listen", lambda: statuses(tasks)["stuck"] == COMPLETED)
+
+
+def test_crashing_task_fails_after_max_attempts(db, tasks):
+    calls = []
+
+    async def crash(request: str) -> dict:
+        calls.append(request)
+        raise RuntimeError("linker died")
+
+    tasks.document("crash").set({"status": PENDING, "request": "crash"})
+    processor = TaskProcessor(db, tasks, crash, lease_seconds=0.3, max_attempts=2,
+                              poll_min_seconds=0.1, poll_max_seconds=0.3)
+
+    run_until(processor, "poll", lambda: statuses(tasks)["crash"] == FAILED)
+
+    assert len(calls) == 2
+    assert "2 attempts" in tasks.document("crash").get().to_dict()["error"]
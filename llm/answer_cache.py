@@ -0,0 +1,71 @@
+import uuid
+import logging
+import threading
+import numpy as np
+from dataclasses import dataclass
+from collections import OrderedDict
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedAnswer:
+    """An answer together with the chunks it was generated from and their file paths"""
+    answer: str
+    links: set
+    chunk_ids: list[str]
+    chunk_paths: list[str]
+
+
+class AnswerCache:
+    """
+    Bounded semantic cache of answers.
+
+    Entries are keyed by the normalized question embedding, and a lookup
+    returns the most similar cached question if its cosine similarity is
+    at least `threshold`. The least recently used entries are evicted
+    once `max_size` is reached.
+    """
+
+    def __init__(self, max_size: int, threshold: float) -> None:
+        self._max_size = max_size
+        self._threshold = threshold
+        self._entries: OrderedDict[str, tuple[np.ndarray, CachedAnswer]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def enabled(self) -> bool:
+        return self._max_size > 0
+
+    def lookup(self, embedding: list[float]) -> Optional[tuple[str, CachedAnswer]]:
+        vector = self._normalize(embedding)
+        with self._lock:
+            if not self._entries:
+                return None
+            keys = list(self._entries)
+            matrix = np.stack([self._entries[key][0] for key in keys])
+            similarities = matrix @ vector
+            best = int(np.argmax(similarities))
+            if similarities[best] < self._threshold:
+                return None
+            key = keys[best]
+            self._entries.move_to_end(key)
+            logger.info(f"Answer cache hit with similarity {similarities[best]}")
+            return key, self._entries[key][1]
+
+    def put(self, embedding: list[float], entry: CachedAnswer) -> None:
+        vector = self._normalize(embedding)
+        with self._lock:
+            self._entries[str(uuid.uuid4())] = (vector, entry)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def remove(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    @staticmethod
+    def _normalize(embedding: list[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
@@ -1,9 +1,12 @@
+import os
+import uuid
 import logging
 import asyncio
 from fastapi import FastAPI
 from fastapi import WebSocket
 from llm_chain import LLMChain
 from async_queue import AsyncQueue
+from tracing import tracer
 
 import async_socket_to_chat
 import async_question_to_answer
@@ -13,15 +16,17 @@ app = FastAPI()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("llm")
+tracer.service_name = os.environ.get("SERVICE_NAME", "llm")
 
 @app.websocket("/llm/")
 async def chat_client(websocket: WebSocket):
 
+    connection_id = str(uuid.uuid4())
     question_queue = AsyncQueue()
     response_queue = AsyncQueue()
 
     answer_to_socket_promise = async_answer_to_socket.loop(response_queue, websocket)
-    question_to_answer_promise = async_question_to_answer.loop(question_queue, response_queue)
+    question_to_answer_promise = async_question_to_answer.loop(question_queue, response_queue, connection_id)
     socket_to_chat_promise = async_socket_to_chat.loop(websocket, question_queue, response_queue)
 
     await asyncio.gather(
@@ -1,24 +1,43 @@
+import os
 import json
+import asyncio
 import logging
 from llm_chain import LLMChain
 from async_queue import AsyncQueue
+from scheduler import scheduler
+from tracing import tracer
 import control_flow_commands as cfc
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("chat")
 
+_llm_chain = None
+
+DEBUG_SPANS = os.environ.get("TRACE_DEBUG_RESPONSES", "false").lower() == "true"
+
+
+def get_llm_chain() -> LLMChain:
+    """Return the chain shared by all connections, creating it on first use"""
+    global _llm_chain
+    if _llm_chain is None:
+        _llm_chain = LLMChain()
+    return _llm_chain
+
 async def loop(
         questions_queue: AsyncQueue,
         response_queue: AsyncQueue,
+        connection_id: str,
 ):
 
-    llm_chain = LLMChain()
+    llm_chain = get_llm_chain()
 
     while True:
         data = await questions_queue.dequeue()
         data = data.replace("\n", "")
 
         if data == cfc.CFC_CLIENT_DISCONNECTED:
+            scheduler.cancel(connection_id)
+            await asyncio.to_thread(llm_chain.end_session, connection_id)
             response_queue.enqueue(
                 json.dumps({
                     "reporter": "output_message",
@@ -36,6 +55,7 @@ async def loop(
             )
             
         elif data == cfc.CFC_CHAT_STOPPED:
+            scheduler.cancel(connection_id)
             response_queue.enqueue(
                 json.dumps({
                     "reporter": "output_message",
@@ -44,12 +64,71 @@ async def loop(
             )
             
         elif data:
-            result = llm_chain.invoke(data)
+            scheduler.submit(
+                connection_id,
+                lambda question=data: answer(llm_chain, question, connection_id, response_queue),
+                on_position=lambda position: response_queue.enqueue(
+                    json.dumps({
+                        "reporter": "output_message",
+                        "type": "queue_position",
+                        "message": "",
+                        "position": position,
+                    })
+                ),
+            )
+
+
+async def answer(
+        llm_chain: LLMChain,
+        question: str,
+        connection_id: str,
+        response_queue: AsyncQueue,
+):
+    with tracer.collect() as spans, tracer.span("chat.answer", connection_id=connection_id):
+        await stream_answer(llm_chain, question, connection_id, response_queue, spans)
+
+
+async def stream_answer(
+        llm_chain: LLMChain,
+        question: str,
+        connection_id: str,
+        response_queue: AsyncQueue,
+        spans: list,
+):
+    async for event in llm_chain.astream(question, session_id=connection_id):
+        if event["type"] == "links":
+            response_queue.enqueue(
+                json.dumps({
+                    "reporter": "output_message",
+                    "type": "links",
+                    "message": "",
+                    "links": list(event["links"])
+                })
+            )
+        elif event["type"] == "token":
             response_queue.enqueue(
                 json.dumps({
                     "reporter": "output_message",
-                    "type": "answer",
-                    "message": result["answer"],
-                    "links": list(result["links"])
+                    "type": "answer_chunk",
+                    "message": event["token"],
                 })
-            )
\ No newline at end of file
+            )
+        elif event["type"] == "answer":
+            message = {
+                "reporter": "output_message",
+                "type": "answer",
+                "message": event["answer"],
+                "links": list(event["links"]),
+                "cached": event["cached"]
+            }
+            if DEBUG_SPANS:
+                message["spans"] = [span.to_dict() for span in spans]
+            response_queue.enqueue(json.dumps(message, default=str))
+        elif event["type"] == "error":
+            response_queue.enqueue(
+                json.dumps({
+                    "reporter": "output_message",
+                    "type": "error",
+                    "message": event["error"],
+                })
+            )
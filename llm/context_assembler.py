@@ -0,0 +1,84 @@
+import logging
+from typing import Sequence
+from langchain.schema import Document
+from reranker import DENSE_SCORE_KEY, RERANK_SCORE_KEY
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_SEPARATOR = "\n\n"
+
+
+class ContextAssembler:
+    """
+    Builds the QA context from reranked documents within a token budget.
+
+    Documents are ordered by rerank score (dense score when the reranker
+    was skipped), overlapping neighbouring chunks of the same file are
+    merged back into one passage, and passages are added until the budget
+    is spent. The last passage that does not fit is cut at a word boundary.
+    Tokens are estimated from the character count, which keeps the prompt
+    size predictable without loading the generation model's tokenizer.
+    """
+
+    def __init__(self, token_budget: int, chars_per_token: float = 4.0, min_overlap: int = 20) -> None:
+        self.token_budget = token_budget
+        self.chars_per_token = chars_per_token
+        self.min_overlap = min_overlap
+
+    def format(self, documents: Sequence[Document]) -> str:
+        return DOCUMENT_SEPARATOR.join(doc.page_content for doc in self.assemble(documents))
+
+    def assemble(self, documents: Sequence[Document]) -> list[Document]:
+        ranked = sorted(
+            enumerate(documents),
+            key=lambda item: (-self._score(item[1]), item[0])
+        )
+        passages = self._merge_overlapping([doc for _, doc in ranked])
+
+        budget = int(self.token_budget * self.chars_per_token)
+        assembled = []
+        for doc in passages:
+            cost = len(doc.page_content) + (len(DOCUMENT_SEPARATOR) if assembled else 0)
+            if cost <= budget:
+                assembled.append(doc)
+                budget -= cost
+                continue
+            remaining = budget - (len(DOCUMENT_SEPARATOR) if assembled else 0)
+            if remaining >= self.min_overlap:
+                cut = doc.page_content[:remaining].rsplit(" ", 1)[0]
+                assembled.append(Document(page_content=cut, metadata=doc.metadata))
+            break
+
+        logger.info(f"Assembled {len(assembled)} passages from {len(documents)} documents")
+        return assembled
+
+    def _merge_overlapping(self, documents: list[Document]) -> list[Document]:
+        merged: list[Document] = []
+        for doc in documents:
+            for i, passage in enumerate(merged):
+                if passage.metadata.get("file_path") != doc.metadata.get("file_path"):
+                    continue
+                text = self._join(passage.page_content, doc.page_content)
+                if text is None:
+                    text = self._join(doc.page_content, passage.page_content)
+                if text is not None:
+                    merged[i] = Document(page_content=text, metadata=passage.metadata)
+                    break
+            else:
+                merged.append(doc)
+        return merged
+
+    def _join(self, first: str, second: str) -> str | None:
+        """Join two chunks if the end of `first` overlaps the start of `second`"""
+        if second in first:
+            return first
+        for size in range(min(len(first), len(second)) - 1, self.min_overlap - 1, -1):
+            if first.endswith(second[:size]):
+                return first + second[size:]
+        return None
+
+    @staticmethod
+    def _score(doc: Document) -> float:
+        if RERANK_SCORE_KEY in doc.metadata:
+            return doc.metadata[RERANK_SCORE_KEY]
+        return doc.metadata.get(DENSE_SCORE_KEY, 0.0)
@@ -0,0 +1,112 @@
+"""
+Stand-ins for Ollama and the indexer's /embedding endpoint, for load tests.
+
+Usage:
+    python fake_backends.py --port 11435 --first-token-ms 200 --tokens-per-second 40
+
+Chat responses stream `--answer-tokens` tokens after `--first-token-ms`,
+paced at `--tokens-per-second`. Embeddings are deterministic unit vectors
+derived from a hash of the text, so a seeded collection and the queries
+agree without a model.
+"""
+import time
+import json
+import asyncio
+import hashlib
+import argparse
+import numpy as np
+import uvicorn
+from datetime import datetime, timezone
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+
+def fake_embedding(text: str, dim: int) -> list[float]:
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dim)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def create_app(
+        model: str = "fake",
+        first_token_ms: float = 200,
+        tokens_per_second: float = 40,
+        answer_tokens: int = 60,
+        embedding_dim: int = 768,
+        embedding_ms: float = 5,
+) -> FastAPI:
+    app = FastAPI()
+
+    def chunk(content: str, done: bool, started: float) -> dict:
+        message = {
+            "model": model,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "message": {"role": "assistant", "content": content},
+            "done": done,
+        }
+        if done:
+            message.update({
+                "done_reason": "stop",
+                "total_duration": int((time.monotonic() - started) * 1e9),
+                "eval_count": answer_tokens,
+            })
+        return message
+
+    async def tokens():
+        await asyncio.sleep(first_token_ms / 1000)
+        for i in range(answer_tokens):
+            yield f"token{i} "
+            await asyncio.sleep(1 / tokens_per_second)
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": [{"name": model, "model": model}]}
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        body = await request.json()
+        started = time.monotonic()
+        if not body.get("stream", True):
+            content = "".join([token async for token in tokens()])
+            return chunk(content, True, started)
+
+        async def stream():
+            async for token in tokens():
+                yield json.dumps(chunk(token, False, started)) + "\n"
+            yield json.dumps(chunk("", True, started)) + "\n"
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    @app.post("/embedding")
+    async def embedding(request: Request):
+        body = await request.json()
+        await asyncio.sleep(embedding_ms / 1000)
+        return {"result": fake_embedding(body["query"], embedding_dim)}
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fake Ollama and indexer embedding server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--model", default="fake")
+    parser.add_argument("--first-token-ms", type=float, default=200)
+    parser.add_argument("--tokens-per-second", type=float, default=40)
+    parser.add_argument("--answer-tokens", type=int, default=60)
+    parser.add_argument("--embedding-dim", type=int, default=768)
+    parser.add_argument("--embedding-ms", type=float, default=5)
+    args = parser.parse_args()
+    app = create_app(
+        model=args.model,
+        first_token_ms=args.first_token_ms,
+        tokens_per_second=args.tokens_per_second,
+        answer_tokens=args.answer_tokens,
+        embedding_dim=args.embedding_dim,
+        embedding_ms=args.embedding_ms,
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
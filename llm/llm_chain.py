@@ -1,28 +1,34 @@
 import os
-import uuid
 import torch
-import datetime
+import asyncio
 import logging
-from dataclasses import dataclass
-from typing import Sequence, Optional
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Sequence, Optional
 from qdrant_client import QdrantClient
-from langchain_ollama import ChatOllama
+from qdrant_pool import get_qdrant_client
+from ollama_pool import OllamaPool, PooledChatOllama
 from minima_embed import MinimaEmbeddings
 from langgraph.graph import START, StateGraph
 from langchain_qdrant import QdrantVectorStore
 from langchain_core.messages import BaseMessage
 from langgraph.graph.message import add_messages
 from typing_extensions import Annotated, TypedDict
-from langgraph.checkpoint.memory import MemorySaver
 from langchain_core.messages import AIMessage, HumanMessage
 from langchain.chains.retrieval import create_retrieval_chain
 from langchain.retrievers import ContextualCompressionRetriever
-from langchain.retrievers.document_compressors import CrossEncoderReranker
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.chains.combine_documents import create_stuff_documents_chain
+from langchain_core.runnables import RunnablePassthrough
+from langchain_core.output_parsers import StrOutputParser
 from langchain_community.cross_encoders.huggingface import HuggingFaceCrossEncoder
 from langchain.chains.history_aware_retriever import create_history_aware_retriever
 from langchain.schema import Document
+from reranker import CascadeReranker, RerankBatcher, ScoreCache, ScoredRetriever
+from session_store import SessionStore, create_session_store
+from answer_cache import AnswerCache, CachedAnswer
+from context_assembler import ContextAssembler
+from autotune import autotune, configure_threading
+from tracing import tracer
+from scheduler import raise_if_cancelled
 
 logger = logging.getLogger(__name__)
 
@@ -36,12 +42,20 @@ CONTEXTUALIZE_Q_SYSTEM_PROMPT = (
 
 SYSTEM_PROMPT = (
     "You are an assistant for question-answering tasks. "
-    "Use the following pieces of retrieved context to answer "
-    "the question. If you don't know the answer, say that you "
+    "Use the pieces of retrieved context given with the question "
+    "to answer it. If you don't know the answer, say that you "
     "don't know. Use three sentences maximum and keep the "
     "answer concise."
-    "\n\n"
+)
+
+# The retrieved context travels with the question rather than in the
+# system prompt, so the system prompt and chat history form a stable
+# prefix that Ollama can serve from its KV cache.
+QUESTION_PROMPT = (
+    "Context:\n"
     "{context}"
+    "\n\n"
+    "Question: {input}"
 )
 
 @dataclass
@@ -49,10 +63,36 @@ class LLMConfig:
     """Configuration settings for the LLM Chain"""
     qdrant_collection: str = "mnm_storage"
     qdrant_host: str = "qdrant"
-    ollama_url: str = "http://ollama:11434"
+    qdrant_path: Optional[str] = os.environ.get("QDRANT_PATH")
+    qdrant_prefer_grpc: bool = os.environ.get("QDRANT_PREFER_GRPC", "false").lower() == "true"
+    qdrant_grpc_port: int = int(os.environ.get("QDRANT_GRPC_PORT", 6334))
+    qdrant_timeout: int = int(os.environ.get("QDRANT_TIMEOUT", 10))
+    qdrant_retries: int = int(os.environ.get("QDRANT_RETRIES", 3))
+    ollama_urls: list[str] = field(
+        default_factory=lambda: os.environ.get("OLLAMA_URLS", "http://ollama:11434").split(",")
+    )
     ollama_model: str = os.environ.get("OLLAMA_MODEL")
+    ollama_contextualize_model: Optional[str] = os.environ.get("OLLAMA_CONTEXTUALIZE_MODEL")
+    ollama_health_interval: float = float(os.environ.get("OLLAMA_HEALTH_INTERVAL", 10))
     rerank_model: str = os.environ.get("RERANKER_MODEL")
     temperature: float = 0.5
+    rerank_candidates: int = int(os.environ.get("RERANK_CANDIDATES", 4))
+    rerank_top_n: int = int(os.environ.get("RERANK_TOP_N", 3))
+    rerank_skip_margin: float = float(os.environ.get("RERANK_SKIP_MARGIN", 0.15))
+    rerank_batch_size: int = int(os.environ.get("RERANK_BATCH_SIZE", 64))
+    rerank_batch_wait_ms: int = int(os.environ.get("RERANK_BATCH_WAIT_MS", 10))
+    rerank_cache_size: int = int(os.environ.get("RERANK_CACHE_SIZE", 10000))
+    context_token_budget: int = int(os.environ.get("CONTEXT_TOKEN_BUDGET", 1500))
+    session_max_turns: int = int(os.environ.get("SESSION_MAX_TURNS", 5))
+    session_ttl_seconds: int = int(os.environ.get("SESSION_TTL_SECONDS", 60 * 60))
+    session_max_sessions: int = int(os.environ.get("SESSION_MAX_SESSIONS", 1000))
+    session_store_path: Optional[str] = os.environ.get("SESSION_STORE_PATH")
+    answer_cache_size: int = int(os.environ.get("ANSWER_CACHE_SIZE", 1000))
+    answer_cache_threshold: float = float(os.environ.get("ANSWER_CACHE_THRESHOLD", 0.95))
+    autotune: bool = os.environ.get("AUTOTUNE", "false").lower() == "true"
+    autotune_path: str = os.environ.get("AUTOTUNE_PATH", "/llm/storage/tuning.json")
+    autotune_max_latency_ms: float = float(os.environ.get("AUTOTUNE_MAX_LATENCY_MS", 500))
+    autotune_batch_sizes: list[int] = field(default_factory=lambda: [4, 8, 16, 32, 64])
     device: torch.device = torch.device(
         "mps" if torch.backends.mps.is_available() else
         "cuda" if torch.cuda.is_available() else
@@ -81,22 +121,46 @@ class LLMChain:
         """Initialize the LLM Chain with optional custom configuration"""
         self.localConfig = LocalConfig()
         self.config = config or LLMConfig()
-        self.llm = self._setup_llm()
+        configure_threading()
+        self.ollama_pool = self._setup_ollama_pool()
+        self.llm = self._setup_llm(self.config.ollama_model, "llm.generate")
+        self.contextualize_llm = self._setup_llm(
+            self.config.ollama_contextualize_model or self.config.ollama_model, "llm.contextualize"
+        )
         self.document_store = self._setup_document_store()
         self.chain = self._setup_chain()
         self.graph = self._create_graph()
+        self.sessions = self._setup_session_store()
+        self.answer_cache = AnswerCache(
+            max_size=self.config.answer_cache_size,
+            threshold=self.config.answer_cache_threshold
+        )
 
-    def _setup_llm(self) -> ChatOllama:
-        """Initialize the LLM model"""
-        return ChatOllama(
-            base_url=self.config.ollama_url,
-            model=self.config.ollama_model,
-            temperature=self.config.temperature
+    def _setup_ollama_pool(self) -> OllamaPool:
+        """Initialize the pool of Ollama backends"""
+        return OllamaPool(
+            urls=self.config.ollama_urls,
+            temperature=self.config.temperature,
+            health_interval=self.config.ollama_health_interval
         )
 
+    def _setup_llm(self, model: str, span_name: str) -> PooledChatOllama:
+        """Initialize an LLM model served by the Ollama pool"""
+        return PooledChatOllama(pool=self.ollama_pool, model=model, span_name=span_name)
+
     def _setup_document_store(self) -> QdrantVectorStore:
         """Initialize the document store with vector embeddings"""
-        qdrant = QdrantClient(host=self.config.qdrant_host)
+        if self.config.qdrant_path:
+            # Local on-disk collection, used by the load-test harness
+            qdrant = QdrantClient(path=self.config.qdrant_path)
+        else:
+            qdrant = get_qdrant_client(
+                host=self.config.qdrant_host,
+                prefer_grpc=self.config.qdrant_prefer_grpc,
+                grpc_port=self.config.qdrant_grpc_port,
+                timeout=self.config.qdrant_timeout,
+                retries=self.config.qdrant_retries,
+            )
         embed_model = MinimaEmbeddings()
         return QdrantVectorStore(
             client=qdrant,
@@ -104,16 +168,44 @@ class LLMChain:
             embedding=embed_model
         )
 
+    def _autotune(self, reranker: HuggingFaceCrossEncoder) -> int:
+        """Benchmark the reranker on this hardware and return the batch size to use"""
+        query = "How do I configure the indexer?"
+        passage = ("Minima indexes local documents and answers questions about them. " * 8)[:500]
+        result = autotune(
+            name=f"reranker {self.config.rerank_model}",
+            workload=lambda batch_size: reranker.score([(query, passage)] * batch_size),
+            device=self.config.device.type,
+            cache_path=self.config.autotune_path,
+            batch_sizes=self.config.autotune_batch_sizes,
+            max_latency_ms=self.config.autotune_max_latency_ms,
+        )
+        return result.batch_size
+
     def _setup_chain(self):
         """Set up the retrieval and QA chain"""
         # Initialize retriever with reranking
-        base_retriever = self.document_store.as_retriever()
+        base_retriever = ScoredRetriever(
+            vectorstore=self.document_store,
+            k=self.config.rerank_candidates
+        )
         reranker = HuggingFaceCrossEncoder(
             model_name=self.config.rerank_model,
             model_kwargs={'device': self.config.device},
         )
+        rerank_batch_size = self._autotune(reranker) if self.config.autotune else self.config.rerank_batch_size
+        compressor = CascadeReranker(
+            batcher=RerankBatcher(
+                reranker,
+                max_batch_size=rerank_batch_size,
+                max_wait_ms=self.config.rerank_batch_wait_ms
+            ),
+            cache=ScoreCache(self.config.rerank_cache_size),
+            top_n=self.config.rerank_top_n,
+            skip_margin=self.config.rerank_skip_margin
+        )
         compression_retriever = ContextualCompressionRetriever(
-            base_compressor=CrossEncoderReranker(model=reranker, top_n=3),
+            base_compressor=compressor,
             base_retriever=base_retriever
         )
 
@@ -124,17 +216,23 @@ class LLMChain:
             ("human", "{input}"),
         ])
         history_aware_retriever = create_history_aware_retriever(
-            self.llm, compression_retriever, contextualize_prompt
+            self.contextualize_llm, compression_retriever, contextualize_prompt
         )
 
         # Create QA chain
+        assembler = ContextAssembler(token_budget=self.config.context_token_budget)
         qa_prompt = ChatPromptTemplate.from_messages([
             ("system", SYSTEM_PROMPT),
             MessagesPlaceholder("chat_history"),
-            ("human", "{input}"),
+            ("human", QUESTION_PROMPT),
         ])
-        qa_chain = create_stuff_documents_chain(self.llm, qa_prompt)
-        
+        qa_chain = (
+            RunnablePassthrough.assign(context=lambda state: assembler.format(state["context"]))
+            | qa_prompt
+            | self.llm
+            | StrOutputParser()
+        )
+
         return create_retrieval_chain(history_aware_retriever, qa_chain)
 
     def _create_graph(self) -> StateGraph:
@@ -142,7 +240,16 @@ class LLMChain:
         workflow = StateGraph(state_schema=State)
         workflow.add_edge(START, "model")
         workflow.add_node("model", self._call_model)
-        return workflow.compile(checkpointer=MemorySaver())
+        return workflow.compile()
+
+    def _setup_session_store(self) -> SessionStore:
+        """Initialize the bounded per-connection conversation history"""
+        return create_session_store(
+            path=self.config.session_store_path,
+            max_turns=self.config.session_max_turns,
+            ttl_seconds=self.config.session_ttl_seconds,
+            max_sessions=self.config.session_max_sessions
+        )
 
     def _call_model(self, state: State) -> dict:
         """Process the query through the model"""
@@ -158,38 +265,161 @@ class LLMChain:
             "answer": response["answer"],
         }
     
-    def invoke(self, message: str) -> dict:
+    def invoke(self, message: str, session_id: Optional[str] = None) -> dict:
         """
         Process a user message and return the response
         
         Args:
             message: The user's input message
+            session_id: The conversation the message belongs to, if any
             
         Returns:
             dict: Contains the model's response or error information
         """
         try:
             logger.info(f"Processing query: {message}")
-            config = {
-                "configurable": {
-                    "thread_id": uuid.uuid4(),
-                    "thread_ts": datetime.datetime.now().isoformat()
-                }   
-            }
-            result = self.graph.invoke(
-                {"input": message},
-                config=config
-            )
+            history = self._history(session_id)
+            embedding, cached = self._lookup_answer(message, history)
+            if cached is not None:
+                if session_id is not None:
+                    self.sessions.append_turn(session_id, message, cached.answer)
+                return {"answer": cached.answer, "links": cached.links, "cached": True}
+            result = self.graph.invoke({
+                "input": message,
+                "chat_history": history,
+            })
             logger.info(f"OUTPUT: {result}")
-            links = set()
-            for ctx in result["context"]:
-                doc: Document = ctx
-                path = doc.metadata["file_path"].replace(
-                    self.localConfig.CONTAINER_PATH,
-                    self.localConfig.LOCAL_FILES_PATH
-                )
-                links.add(f"file://{path}")
-            return {"answer": result["answer"], "links": links}
+            if session_id is not None:
+                self.sessions.append_turn(session_id, message, result["answer"])
+            links = self._get_links(result["context"])
+            self._store_answer(embedding, result["answer"], links, result["context"])
+            return {"answer": result["answer"], "links": links, "cached": False}
         except Exception as e:
             logger.error(f"Error processing query", exc_info=True)
-            return {"error": str(e), "status": "error"}
\ No newline at end of file
+            return {"error": str(e), "status": "error"}
+
+    async def astream(self, message: str, session_id: Optional[str] = None) -> AsyncIterator[dict]:
+        """
+        Process a user message and stream the response as it is generated
+
+        Args:
+            message: The user's input message
+            session_id: The conversation the message belongs to, if any
+
+        Yields:
+            dict: A "links" event once retrieval finishes, a "token" event
+            for every generated chunk and a final "answer" event with the
+            full answer, or an "error" event if processing failed. Answers
+            served from the answer cache skip straight to the final event
+        """
+        try:
+            logger.info(f"Streaming query: {message}")
+            history = await asyncio.to_thread(self._history, session_id)
+            embedding, cached = await asyncio.to_thread(self._lookup_answer, message, history)
+            if cached is not None:
+                if session_id is not None:
+                    await asyncio.to_thread(self.sessions.append_turn, session_id, message, cached.answer)
+                yield {"type": "links", "links": cached.links}
+                yield {"type": "answer", "answer": cached.answer, "links": cached.links, "cached": True}
+                return
+
+            state = {"input": message, "chat_history": history}
+            answer = []
+            links = set()
+            context = []
+            async for chunk in self.chain.astream(state):
+                if "context" in chunk:
+                    context = chunk["context"]
+                    links = self._get_links(context)
+                    yield {"type": "links", "links": links}
+                if "answer" in chunk:
+                    answer.append(chunk["answer"])
+                    yield {"type": "token", "token": chunk["answer"]}
+            answer = "".join(answer)
+            logger.info(f"Streamed response: {answer}")
+            if session_id is not None:
+                await asyncio.to_thread(self.sessions.append_turn, session_id, message, answer)
+            self._store_answer(embedding, answer, links, context)
+            yield {"type": "answer", "answer": answer, "links": links, "cached": False}
+        except Exception as e:
+            logger.error(f"Error streaming query", exc_info=True)
+            yield {"type": "error", "error": str(e)}
+
+    def end_session(self, session_id: str) -> None:
+        """Forget the conversation history of a closed connection"""
+        self.sessions.drop(session_id)
+
+    def _history(self, session_id: Optional[str]) -> list[BaseMessage]:
+        if session_id is None:
+            return []
+        return self.sessions.history(session_id)
+
+    def _lookup_answer(
+            self, message: str, history: list[BaseMessage]
+    ) -> tuple[Optional[list[float]], Optional[CachedAnswer]]:
+        """
+        Find a cached answer for a semantically equivalent question.
+
+        Follow-up questions depend on the chat history, so only the first
+        question of a conversation is looked up. A hit is dropped if any of
+        the chunks it was answered from is no longer in the index, which
+        happens whenever the indexer re-indexes or purges the cited file,
+        or now belongs to another path because the file was moved. On a
+        miss the embedding is remembered by MinimaEmbeddings, so retrieval
+        does not ask the indexer for it again.
+        """
+        if not self.answer_cache.enabled() or history:
+            return None, None
+        with tracer.span("answer_cache.lookup") as span:
+            embedding, cached = self._lookup_cached_answer(message)
+            span.set(hit=cached is not None)
+            return embedding, cached
+
+    def _lookup_cached_answer(self, message: str) -> tuple[Optional[list[float]], Optional[CachedAnswer]]:
+        try:
+            embedding = self.document_store.embeddings.embed_query(message)
+        except Exception as e:
+            logger.error(f"Unable to embed question for the answer cache: {e}")
+            return None, None
+        raise_if_cancelled()
+        found = self.answer_cache.lookup(embedding)
+        if found is None:
+            return embedding, None
+        key, cached = found
+        points = self.document_store.client.retrieve(
+            collection_name=self.config.qdrant_collection,
+            ids=cached.chunk_ids,
+            with_payload=["metadata.file_path"],
+            with_vectors=False
+        )
+        # A moved file keeps its chunk ids, so the cited paths are compared as well
+        current_paths = {str(point.id): point.payload.get("metadata", {}).get("file_path") for point in points}
+        if [current_paths.get(chunk_id) for chunk_id in cached.chunk_ids] != cached.chunk_paths:
+            logger.info("Cached answer is stale, cited documents changed")
+            self.answer_cache.remove(key)
+            return embedding, None
+        return embedding, cached
+
+    def _store_answer(
+            self, embedding: Optional[list[float]], answer: str, links: set, context: Sequence[Document]
+    ) -> None:
+        chunk_ids = [str(doc.metadata["_id"]) for doc in context if "_id" in doc.metadata]
+        if embedding is None or not answer or len(chunk_ids) != len(context):
+            return
+        chunk_paths = [doc.metadata["file_path"] for doc in context]
+        self.answer_cache.put(
+            embedding,
+            CachedAnswer(answer=answer, links=links, chunk_ids=chunk_ids, chunk_paths=chunk_paths)
+        )
+
+    def _get_links(self, context: Sequence[Document]) -> set:
+        """Map retrieved documents to file links on the host machine"""
+        links = set()
+        for ctx in context:
+            doc: Document = ctx
+            path = doc.metadata["file_path"].replace(
+                self.localConfig.CONTAINER_PATH,
+                self.localConfig.LOCAL_FILES_PATH
+            )
+            links.add(f"file://{path}")
+        return links
@@ -0,0 +1,292 @@
+"""
+Websocket load test for the llm service.
+
+Usage:
+    python loadtest.py --ramp 1,4,16 --questions 3 --report report.json
+    python loadtest.py --ramp 8 --baseline report.json --tolerance 0.2
+    python loadtest.py --url ws://localhost:8003/llm/ --ramp 4
+
+Without --url the harness starts fake_backends.py (Ollama and the indexer's
+/embedding endpoint), seeds a local Qdrant collection with synthetic chunks
+and runs the llm service against them with uvicorn, so the numbers measure
+the service itself: scheduling, retrieval, reranking and streaming. The
+real reranker is loaded, RERANKER_MODEL must be set as for the service.
+
+Each stage opens its number of websockets at once. Every session follows
+the client protocol (CFC_CHAT_STARTED, questions, CFC_CHAT_STOPPED) and
+records the connect time, the time to the first answer token and the time
+to the full answer. The report keeps p50/p95/p99 per stage; with
+--baseline the run fails when a p95 grew by more than --tolerance.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import websockets
+import control_flow_commands as cfc
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+COLLECTION = "mnm_storage"
+METRICS = ("connect_ms", "ttfb_ms", "answer_ms")
+
+
+@dataclass
+class StageResult:
+    sessions: int
+    connect_ms: List[float] = field(default_factory=list)
+    ttfb_ms: List[float] = field(default_factory=list)
+    answer_ms: List[float] = field(default_factory=list)
+    answers: int = 0
+    errors: int = 0
+    duration_s: float = 0.0
+
+    def summary(self) -> dict:
+        return {
+            "sessions": self.sessions,
+            "answers": self.answers,
+            "errors": self.errors,
+            "duration_s": round(self.duration_s, 3),
+            "answers_per_second": round(self.answers / self.duration_s, 3) if self.duration_s else 0.0,
+            **{metric: percentiles(getattr(self, metric)) for metric in METRICS},
+        }
+
+
+def percentiles(values: List[float]) -> Optional[Dict[str, float]]:
+    if not values:
+        return None
+    ordered = sorted(values)
+
+    def rank(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, max(0, int(p * len(ordered) + 0.5) - 1))], 1)
+
+    return {"p50": rank(0.50), "p95": rank(0.95), "p99": rank(0.99), "max": round(ordered[-1], 1)}
+
+
+async def run_session(url: str, session: int, questions: int, think_ms: float, timeout: float, stage: StageResult) -> None:
+    started = time.perf_counter()
+    try:
+        websocket = await asyncio.wait_for(websockets.connect(url, max_size=None), timeout)
+    except Exception as e:
+        print(f"session {session}: connect failed: {e}", file=sys.stderr)
+        stage.errors += questions
+        return
+    stage.connect_ms.append((time.perf_counter() - started) * 1000)
+    try:
+        await websocket.send(cfc.CFC_CHAT_STARTED)
+        for i in range(questions):
+            # Distinct questions, so the answer cache does not short-cut them
+            question = f"What does document {(session * questions + i) % 97} say about topic {session}-{i}?"
+            sent = time.perf_counter()
+            await websocket.send(question)
+            first_token = None
+            while True:
+                frame = json.loads(await asyncio.wait_for(websocket.recv(), timeout))
+                if frame.get("reporter") != "output_message":
+                    continue
+                if frame["type"] in ("answer_chunk", "answer") and first_token is None:
+                    first_token = time.perf_counter()
+                if frame["type"] == "answer":
+                    stage.ttfb_ms.append((first_token - sent) * 1000)
+                    stage.answer_ms.append((time.perf_counter() - sent) * 1000)
+                    stage.answers += 1
+                    break
+                if frame["type"] == "error":
+                    print(f"session {session}: {frame.get('message')}", file=sys.stderr)
+                    stage.errors += 1
+                    break
+            if think_ms:
+                await asyncio.sleep(think_ms / 1000)
+        await websocket.send(cfc.CFC_CHAT_STOPPED)
+    except Exception as e:
+        print(f"session {session}: {type(e).__name__} {e}", file=sys.stderr)
+        stage.errors += 1
+    finally:
+        await websocket.close()
+
+
+async def run_stage(url: str, sessions: int, questions: int, think_ms: float, timeout: float) -> StageResult:
+    stage = StageResult(sessions)
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        run_session(url, session, questions, think_ms, timeout, stage)
+        for session in range(sessions)
+    ))
+    stage.duration_s = time.perf_counter() - started
+    return stage
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Return the p95 latencies that regressed against a baseline report"""
+    regressions = []
+    previous = {stage["sessions"]: stage for stage in baseline.get("stages", [])}
+    for stage in report["stages"]:
+        before = previous.get(stage["sessions"])
+        if before is None:
+            continue
+        for metric in METRICS:
+            if not stage[metric] or not before[metric]:
+                continue
+            now, then = stage[metric]["p95"], before[metric]["p95"]
+            if now > then * (1 + tolerance):
+                regressions.append(f"{stage['sessions']} sessions: {metric} p95 {then}ms -> {now}ms")
+        if stage["errors"] > before["errors"]:
+            regressions.append(f"{stage['sessions']} sessions: errors {before['errors']} -> {stage['errors']}")
+    return regressions
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port: int, process: subprocess.Popen, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{' '.join(process.args)} exited with {process.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise TimeoutError(f"Nothing listening on port {port} after {timeout:.0f}s")
+
+
+def seed_collection(path: str, documents: int, dim: int) -> None:
+    from qdrant_client import QdrantClient
+    from qdrant_client.models import Distance, PointStruct, VectorParams
+    from fake_backends import fake_embedding
+
+    client = QdrantClient(path=path)
+    client.create_collection(COLLECTION, vectors_config=VectorParams(size=dim, distance=Distance.COSINE))
+    points = []
+    for i in range(documents):
+        text = f"Document {i % 97} covers topic {i}. " * 20
+        points.append(PointStruct(
+            id=i,
+            vector=fake_embedding(text, dim),
+            payload={"page_content": text, "metadata": {"file_path": f"/docs/doc{i}.md"}},
+        ))
+    client.upsert(COLLECTION, points)
+    client.close()
+
+
+def start_services(args: argparse.Namespace, workdir: str, processes: List[subprocess.Popen]) -> str:
+    """Start the fake backends and the llm service, return the websocket url"""
+    fake_port, llm_port = free_port(), free_port()
+    qdrant_path = os.path.join(workdir, "qdrant")
+    seed_collection(qdrant_path, args.documents, args.embedding_dim)
+    log = open(os.path.join(workdir, "services.log"), "w")
+    fake = subprocess.Popen([
+        sys.executable, "fake_backends.py", "--port", str(fake_port),
+        "--first-token-ms", str(args.first_token_ms),
+        "--tokens-per-second", str(args.tokens_per_second),
+        "--answer-tokens", str(args.answer_tokens),
+        "--embedding-dim", str(args.embedding_dim),
+    ], cwd=HERE, stdout=log, stderr=subprocess.STDOUT)
+    processes.append(fake)
+    wait_for_port(fake_port, fake, 30)
+    fake_url = f"http://127.0.0.1:{fake_port}"
+    env = {
+        **os.environ,
+        "OLLAMA_URLS": fake_url,
+        "OLLAMA_MODEL": "fake",
+        "INDEXER_URL": fake_url,
+        "QDRANT_PATH": qdrant_path,
+        "ANSWER_CACHE_SIZE": "0",
+        "SESSION_STORE_PATH": "",
+        "TRACE_EXPORT": "",
+    }
+    llm = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(llm_port), "--log-level", "warning"],
+        cwd=HERE, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    processes.append(llm)
+    wait_for_port(llm_port, llm, 120)
+    return f"ws://127.0.0.1:{llm_port}/llm/"
+
+
+def print_report(report: dict) -> None:
+    print(f"{'sessions':>8} {'answers':>7} {'errors':>6} {'ans/s':>7}  "
+          + "  ".join(f"{metric + ' p50/p95/p99':>26}" for metric in METRICS))
+    for stage in report["stages"]:
+        cells = []
+        for metric in METRICS:
+            p = stage[metric]
+            cells.append(f"{p['p50']:>8.0f}/{p['p95']:>7.0f}/{p['p99']:>7.0f}" if p else f"{'-':>24}")
+        print(f"{stage['sessions']:>8} {stage['answers']:>7} {stage['errors']:>6} "
+              f"{stage['answers_per_second']:>7.2f}  " + "  ".join(f"{cell:>26}" for cell in cells))
+
+
+async def run(args: argparse.Namespace, url: str) -> dict:
+    # One answer first, so lazy model loading does not count against stage 1
+    await run_stage(url, 1, 1, 0, args.warmup_timeout)
+    stages = []
+    for sessions in args.ramp:
+        stage = await run_stage(url, sessions, args.questions, args.think_ms, args.timeout)
+        stages.append(stage.summary())
+    return {"url": url if args.url else "local", "settings": vars(args), "stages": stages}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Websocket load test for the llm service")
+    parser.add_argument("--url", help="Test a running service instead of starting one with fake backends")
+    parser.add_argument("--ramp", default="1,4,16",
+                        type=lambda value: [int(n) for n in value.split(",")],
+                        help="Comma-separated concurrent session counts, one stage each")
+    parser.add_argument("--questions", type=int, default=3, help="Questions per session")
+    parser.add_argument("--think-ms", type=float, default=0, help="Pause between questions of a session")
+    parser.add_argument("--timeout", type=float, default=120, help="Seconds to wait for a frame")
+    parser.add_argument("--warmup-timeout", type=float, default=600)
+    parser.add_argument("--first-token-ms", type=float, default=200)
+    parser.add_argument("--tokens-per-second", type=float, default=40)
+    parser.add_argument("--answer-tokens", type=int, default=60)
+    parser.add_argument("--embedding-dim", type=int, default=768)
+    parser.add_argument("--documents", type=int, default=500, help="Synthetic chunks in the seeded collection")
+    parser.add_argument("--report", help="Write the JSON report to this file")
+    parser.add_argument("--baseline", help="JSON report of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative p95 growth")
+    args = parser.parse_args()
+
+    processes: List[subprocess.Popen] = []
+    with tempfile.TemporaryDirectory(prefix="minima-loadtest-") as workdir:
+        try:
+            url = args.url
+            if not url:
+                url = start_services(args, workdir, processes)
+            report = asyncio.run(run(args, url))
+        except Exception:
+            log_path = os.path.join(workdir, "services.log")
+            if os.path.exists(log_path):
+                with open(log_path) as f:
+                    print(f.read()[-8000:], file=sys.stderr)
+            raise
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait(timeout=30)
+
+    print_report(report)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
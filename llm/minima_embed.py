@@ -1,19 +1,32 @@
-import requests
+import os
 import logging
+import threading
+from collections import OrderedDict
+from http_client import HttpClient
 from typing import Any, List
-from pydantic import BaseModel
+from pydantic import BaseModel, PrivateAttr
 from langchain_core.embeddings import Embeddings
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-REQUEST_DATA_URL = "http://indexer:8000/embedding"
-REQUEST_HEADERS = {
-    'Accept': 'application/json',
-    'Content-Type': 'application/json'
-}
+INDEXER_URL = os.environ.get("INDEXER_URL", "http://indexer:8000")
+REQUEST_DEADLINE_SECONDS = 10
+QUERY_MEMO_SIZE = 256
+
+indexer_client = HttpClient(INDEXER_URL)
 
 class MinimaEmbeddings(BaseModel, Embeddings):
+    """
+    Embeddings computed by the indexer's /embedding endpoint.
+
+    The most recent query embeddings are remembered, so a question that is
+    embedded for the answer cache lookup and then for retrieval costs one
+    round trip to the indexer.
+    """
+
+    _query_memo: OrderedDict = PrivateAttr(default_factory=OrderedDict)
+    _memo_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
 
     def __init__(self, **kwargs: Any):
         super().__init__(**kwargs)
@@ -30,7 +43,17 @@ class MinimaEmbeddings(BaseModel, Embeddings):
         return results
 
     def embed_query(self, text: str) -> list[float]:
-        return self.embed_documents([text])[0]
+        with self._memo_lock:
+            embedding = self._query_memo.get(text)
+            if embedding is not None:
+                self._query_memo.move_to_end(text)
+                return embedding
+        embedding = self.embed_documents([text])[0]
+        with self._memo_lock:
+            self._query_memo[text] = embedding
+            while len(self._query_memo) > QUERY_MEMO_SIZE:
+                self._query_memo.popitem(last=False)
+        return embedding
 
     def request_data(self, query):
         payload = {
@@ -38,12 +61,10 @@ class MinimaEmbeddings(BaseModel, Embeddings):
         }
         try:
             logger.info(f"Requesting data from indexer with query: {query}")
-            response = requests.post(REQUEST_DATA_URL, headers=REQUEST_HEADERS, json=payload)
-            response.raise_for_status()
-            data = response.json()
+            data = indexer_client.post("/embedding", json=payload, deadline=REQUEST_DEADLINE_SECONDS)
             logger.info(f"Received data: {data}")
             return data
 
-        except requests.exceptions.RequestException as e:
+        except Exception as e:
             logger.error(f"HTTP error: {e}")
             return {"error": str(e)}
\ No newline at end of file
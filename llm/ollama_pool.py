@@ -0,0 +1,162 @@
+import time
+import httpx
+import random
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Iterator, List, Optional
+from ollama import ResponseError
+from langchain_ollama import ChatOllama
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+
+def _is_backend_failure(error: BaseException) -> bool:
+    """Whether an error says the server is unreachable or broken, not that the request was bad"""
+    if isinstance(error, (httpx.TransportError, ConnectionError, TimeoutError)):
+        return True
+    if isinstance(error, ResponseError):
+        return error.status_code >= 500
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500
+    return False
+
+
+class OllamaBackend:
+    """A single Ollama server and the work currently routed to it"""
+
+    def __init__(self, url: str, temperature: float) -> None:
+        self.url = url
+        self.temperature = temperature
+        self.healthy = True
+        self.outstanding = 0
+        self._models: dict[str, ChatOllama] = {}
+
+    def chat(self, model: str) -> ChatOllama:
+        if model not in self._models:
+            self._models[model] = ChatOllama(
+                base_url=self.url,
+                model=model,
+                temperature=self.temperature
+            )
+        return self._models[model]
+
+
+class OllamaPool:
+    """
+    Routes chat requests over several Ollama servers.
+
+    Each request goes to the healthy backend with the fewest outstanding
+    requests. A background thread polls every backend and drains the ones
+    that stop answering until they recover; a request that fails to reach
+    its backend, times out or gets a 5xx drains the backend immediately.
+    """
+
+    def __init__(self, urls: List[str], temperature: float, health_interval: float = 10.0) -> None:
+        self.backends = [OllamaBackend(url.strip(), temperature) for url in urls if url.strip()]
+        self._health_interval = health_interval
+        self._lock = threading.Lock()
+        self._health_thread = threading.Thread(target=self._health_loop, name="ollama-health", daemon=True)
+        self._health_thread.start()
+
+    @contextmanager
+    def acquire(self) -> Iterator[OllamaBackend]:
+        with self._lock:
+            candidates = [backend for backend in self.backends if backend.healthy] or self.backends
+            least = min(backend.outstanding for backend in candidates)
+            backend = random.choice([b for b in candidates if b.outstanding == least])
+            backend.outstanding += 1
+        try:
+            yield backend
+        except Exception as e:
+            if _is_backend_failure(e):
+                self.mark_unhealthy(backend)
+            raise
+        finally:
+            with self._lock:
+                backend.outstanding -= 1
+
+    def mark_unhealthy(self, backend: OllamaBackend) -> None:
+        if backend.healthy:
+            logger.warning(f"Draining Ollama backend {backend.url}")
+        backend.healthy = False
+
+    def _health_loop(self) -> None:
+        with httpx.Client(timeout=self._health_interval / 2) as client:
+            while True:
+                for backend in self.backends:
+                    try:
+                        client.get(f"{backend.url}/api/tags").raise_for_status()
+                        if not backend.healthy:
+                            logger.info(f"Ollama backend {backend.url} is healthy again")
+                        backend.healthy = True
+                    except httpx.HTTPError as e:
+                        if backend.healthy:
+                            logger.warning(f"Health check failed for {backend.url}: {e}")
+                        backend.healthy = False
+                time.sleep(self._health_interval)
+
+
+class PooledChatOllama(BaseChatModel):
+    """Chat model that sends every call to a backend chosen by the pool"""
+
+    pool: OllamaPool
+    model: str
+    span_name: str = "ollama.chat"
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    @property
+    def _llm_type(self) -> str:
+        return "pooled-chat-ollama"
+
+    def _generate(
+            self,
+            messages: List[BaseMessage],
+            stop: Optional[List[str]] = None,
+            run_manager: Optional[CallbackManagerForLLMRun] = None,
+            **kwargs: Any,
+    ) -> ChatResult:
+        with self.pool.acquire() as backend, tracer.span(self.span_name, model=self.model, backend=backend.url):
+            return backend.chat(self.model)._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    async def _agenerate(
+            self,
+            messages: List[BaseMessage],
+            stop: Optional[List[str]] = None,
+            run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+            **kwargs: Any,
+    ) -> ChatResult:
+        with self.pool.acquire() as backend, tracer.span(self.span_name, model=self.model, backend=backend.url):
+            return await backend.chat(self.model)._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    def _stream(
+            self,
+            messages: List[BaseMessage],
+            stop: Optional[List[str]] = None,
+            run_manager: Optional[CallbackManagerForLLMRun] = None,
+            **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        with self.pool.acquire() as backend, \
+                tracer.span(self.span_name, activate=False, model=self.model, backend=backend.url):
+            yield from backend.chat(self.model)._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    async def _astream(
+            self,
+            messages: List[BaseMessage],
+            stop: Optional[List[str]] = None,
+            run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+            **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        with self.pool.acquire() as backend, \
+                tracer.span(self.span_name, activate=False, model=self.model, backend=backend.url):
+            async for chunk in backend.chat(self.model)._astream(
+                    messages, stop=stop, run_manager=run_manager, **kwargs
+            ):
+                yield chunk
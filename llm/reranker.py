@@ -0,0 +1,211 @@
+import time
+import queue
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Hashable, List, Optional, Sequence, Tuple
+
+from langchain.schema import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+from langchain_core.callbacks import Callbacks, CallbackManagerForRetrieverRun
+from langchain_core.documents import BaseDocumentCompressor
+from langchain_community.cross_encoders.base import BaseCrossEncoder
+from tracing import Span, tracer
+from scheduler import JobCancelled, cancel_token, raise_if_cancelled
+
+logger = logging.getLogger(__name__)
+
+DENSE_SCORE_KEY = "dense_score"
+RERANK_SCORE_KEY = "rerank_score"
+
+
+class ScoreCache:
+    """Thread safe LRU cache of cross-encoder scores"""
+
+    def __init__(self, max_size: int) -> None:
+        self._max_size = max_size
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[float]:
+        with self._lock:
+            score = self._data.get(key)
+            if score is not None:
+                self._data.move_to_end(key)
+            return score
+
+    def put(self, key: Hashable, score: float) -> None:
+        with self._lock:
+            self._data[key] = score
+            self._data.move_to_end(key)
+            while len(self._data) > self._max_size:
+                self._data.popitem(last=False)
+
+
+class RerankBatcher:
+    """
+    Scores (query, chunk) pairs on a single background thread.
+
+    Requests that arrive within `max_wait_ms` of each other are merged
+    into one forward pass of the cross-encoder, so concurrent chat
+    sessions share batches instead of queueing for the model one by one.
+    Requests whose job was cancelled while they waited are dropped before
+    the forward pass.
+    """
+
+    def __init__(self, model: BaseCrossEncoder, max_batch_size: int = 64, max_wait_ms: int = 10) -> None:
+        self._model = model
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait_ms / 1000
+        self._requests: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._worker, name="rerank-batcher", daemon=True)
+        self._thread.start()
+
+    def score(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        raise_if_cancelled()
+        future: Future = Future()
+        self._requests.put((pairs, future, cancel_token.get()))
+        return future.result()
+
+    def _worker(self) -> None:
+        while True:
+            batch = [self._requests.get()]
+            size = len(batch[0][0])
+            deadline = time.monotonic() + self._max_wait
+            while size < self._max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    request = self._requests.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                batch.append(request)
+                size += len(request[0])
+
+            batch = self._drop_cancelled(batch)
+            if not batch:
+                continue
+            pairs = [pair for request_pairs, _, _ in batch for pair in request_pairs]
+            try:
+                start = time.time()
+                scores = self._model.score(pairs)
+                logger.info(f"Reranked {len(pairs)} pairs from {len(batch)} requests in {time.time() - start} seconds")
+            except Exception as e:
+                logger.error(f"Reranking failed: {e}")
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            offset = 0
+            for request_pairs, future, _ in batch:
+                future.set_result([float(score) for score in scores[offset:offset + len(request_pairs)]])
+                offset += len(request_pairs)
+
+    @staticmethod
+    def _drop_cancelled(batch: list) -> list:
+        kept = []
+        for request in batch:
+            cancelled = request[2]
+            if cancelled is not None and cancelled.is_set():
+                request[1].set_exception(JobCancelled())
+            else:
+                kept.append(request)
+        if len(kept) < len(batch):
+            logger.info(f"Dropped {len(batch) - len(kept)} cancelled rerank requests")
+        return kept
+
+
+class ScoredRetriever(BaseRetriever):
+    """Similarity retriever that keeps the dense score in the document metadata"""
+
+    vectorstore: VectorStore
+    k: int = 4
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _get_relevant_documents(
+            self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        raise_if_cancelled()
+        with tracer.span("retrieval.search", k=self.k) as span:
+            found = self.vectorstore.similarity_search_with_score(query, k=self.k)
+            span.set(results=len(found))
+        documents = []
+        for doc, score in found:
+            doc.metadata[DENSE_SCORE_KEY] = score
+            documents.append(doc)
+        return documents
+
+
+class CascadeReranker(BaseDocumentCompressor):
+    """
+    Two stage reranker.
+
+    When the dense scores already separate the best candidate from the
+    runner-up by at least `skip_margin`, the dense order is kept and the
+    cross-encoder is skipped. Otherwise the candidates are scored through
+    the shared batcher, reusing cached scores for (query, chunk) pairs
+    seen before.
+    """
+
+    batcher: RerankBatcher
+    cache: ScoreCache
+    top_n: int = 3
+    skip_margin: float = 0.15
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def compress_documents(
+            self,
+            documents: Sequence[Document],
+            query: str,
+            callbacks: Optional[Callbacks] = None,
+    ) -> Sequence[Document]:
+        if not documents:
+            return []
+        raise_if_cancelled()
+        with tracer.span("rerank", candidates=len(documents)) as span:
+            return self._rerank(documents, query, span)
+
+    def _rerank(self, documents: Sequence[Document], query: str, span: Span) -> Sequence[Document]:
+        dense = sorted(documents, key=lambda doc: doc.metadata.get(DENSE_SCORE_KEY, 0.0), reverse=True)
+        if self._has_clear_winner(dense):
+            logger.info(f"Skipping cross-encoder, dense margin above {self.skip_margin}")
+            span.set(skipped=True)
+            return dense[:self.top_n]
+
+        query_hash = hashlib.sha1(query.encode("utf-8")).hexdigest()
+        keys = [(query_hash, self._chunk_id(doc)) for doc in documents]
+        scores = [self.cache.get(key) for key in keys]
+        missing = [i for i, score in enumerate(scores) if score is None]
+        if missing:
+            fresh = self.batcher.score([(query, documents[i].page_content) for i in missing])
+            for i, score in zip(missing, fresh):
+                scores[i] = score
+                self.cache.put(keys[i], score)
+        logger.info(f"Reranked {len(documents)} candidates, {len(documents) - len(missing)} from cache")
+        span.set(skipped=False, cached=len(documents) - len(missing))
+
+        ranked = sorted(zip(documents, scores), key=lambda item: item[1], reverse=True)
+        result = []
+        for doc, score in ranked[:self.top_n]:
+            doc.metadata[RERANK_SCORE_KEY] = score
+            result.append(doc)
+        return result
+
+    def _has_clear_winner(self, dense: List[Document]) -> bool:
+        if len(dense) < 2 or any(DENSE_SCORE_KEY not in doc.metadata for doc in dense[:2]):
+            return False
+        return dense[0].metadata[DENSE_SCORE_KEY] - dense[1].metadata[DENSE_SCORE_KEY] >= self.skip_margin
+
+    @staticmethod
+    def _chunk_id(doc: Document) -> str:
+        if "_id" in doc.metadata:
+            return str(doc.metadata["_id"])
+        return hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()
@@ -0,0 +1,165 @@
+import os
+import asyncio
+import logging
+import threading
+from contextvars import ContextVar
+from collections import deque, OrderedDict
+from typing import Awaitable, Callable, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("llm")
+
+MAX_CONCURRENT_GENERATIONS = int(os.environ.get("MAX_CONCURRENT_GENERATIONS", 2))
+
+# Set for the duration of a job; copied into the executor threads that run
+# retrieval and reranking, which task cancellation does not reach.
+cancel_token: ContextVar[Optional[threading.Event]] = ContextVar("cancel_token", default=None)
+
+
+class JobCancelled(Exception):
+    """Raised by blocking stages of a job whose connection cancelled it"""
+
+
+def raise_if_cancelled() -> None:
+    """Stop a blocking stage early if the job it belongs to was cancelled"""
+    token = cancel_token.get()
+    if token is not None and token.is_set():
+        raise JobCancelled()
+
+
+class Job:
+    """A unit of work submitted by a single websocket connection"""
+
+    def __init__(
+            self,
+            connection_id: str,
+            work: Callable[[], Awaitable[None]],
+            on_position: Optional[Callable[[int], None]] = None,
+    ) -> None:
+        self.connection_id = connection_id
+        self.work = work
+        self.on_position = on_position
+        self.position: Optional[int] = None
+        self.admitted = asyncio.Event()
+        self.cancelled = threading.Event()
+        self.task: Optional[asyncio.Task] = None
+
+
+class Scheduler:
+    """
+    Admission control for LLM requests.
+
+    At most `max_concurrent` jobs run at once across all connections.
+    Every connection runs at most one job at a time and waiting
+    connections are served round-robin, so a single chatty client
+    cannot starve the others. Waiting jobs are told their position
+    in the queue whenever it changes.
+
+    Cancelling a job cancels its task and sets its cancel token, which
+    the blocking stages running in executor threads check through
+    `raise_if_cancelled`.
+    """
+
+    def __init__(self, max_concurrent: int = MAX_CONCURRENT_GENERATIONS) -> None:
+        self._max_concurrent = max_concurrent
+        self._waiting: OrderedDict[str, deque[Job]] = OrderedDict()
+        self._active: dict[str, Job] = {}
+
+    def submit(
+            self,
+            connection_id: str,
+            work: Callable[[], Awaitable[None]],
+            on_position: Optional[Callable[[int], None]] = None,
+    ) -> asyncio.Task:
+        job = Job(connection_id, work, on_position)
+        self._waiting.setdefault(connection_id, deque()).append(job)
+        job.task = asyncio.create_task(self._run(job))
+        self._dispatch()
+        return job.task
+
+    def cancel(self, connection_id: str) -> None:
+        """Cancel the running and all waiting jobs of a connection"""
+        waiting = self._waiting.pop(connection_id, deque())
+        for job in waiting:
+            job.cancelled.set()
+            job.task.cancel()
+        active = self._active.get(connection_id)
+        if active is not None:
+            active.cancelled.set()
+            active.task.cancel()
+        if waiting or active is not None:
+            logger.info(f"Cancelled {len(waiting) + (active is not None)} jobs for connection {connection_id}")
+        self._notify_positions()
+
+    def running(self) -> int:
+        return len(self._active)
+
+    def waiting(self) -> int:
+        return sum(len(queue) for queue in self._waiting.values())
+
+    async def _run(self, job: Job) -> None:
+        cancel_token.set(job.cancelled)
+        try:
+            await job.admitted.wait()
+            await job.work()
+        except asyncio.CancelledError:
+            logger.info(f"Job for connection {job.connection_id} cancelled")
+        except Exception as e:
+            logger.error(f"Job for connection {job.connection_id} failed: {e}")
+        finally:
+            # stops executor threads still working for this job
+            job.cancelled.set()
+            self._release(job)
+
+    def _release(self, job: Job) -> None:
+        if self._active.get(job.connection_id) is job:
+            del self._active[job.connection_id]
+        else:
+            queue = self._waiting.get(job.connection_id)
+            if queue and job in queue:
+                queue.remove(job)
+                if not queue:
+                    del self._waiting[job.connection_id]
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        while len(self._active) < self._max_concurrent:
+            job = self._next_job()
+            if job is None:
+                break
+            self._active[job.connection_id] = job
+            job.admitted.set()
+        self._notify_positions()
+
+    def _next_job(self) -> Optional[Job]:
+        for connection_id in list(self._waiting):
+            if connection_id in self._active:
+                continue
+            queue = self._waiting.pop(connection_id)
+            job = queue.popleft()
+            if queue:
+                # re-inserting moves the connection to the back of the rotation
+                self._waiting[connection_id] = queue
+            return job
+        return None
+
+    def _pending_order(self) -> list[Job]:
+        queues = [list(queue) for queue in self._waiting.values()]
+        order = []
+        depth = 0
+        while any(depth < len(queue) for queue in queues):
+            for queue in queues:
+                if depth < len(queue):
+                    order.append(queue[depth])
+            depth += 1
+        return order
+
+    def _notify_positions(self) -> None:
+        for position, job in enumerate(self._pending_order(), start=1):
+            if job.position != position:
+                job.position = position
+                if job.on_position is not None:
+                    job.on_position(position)
+
+
+scheduler = Scheduler()
@@ -0,0 +1,153 @@
+import time
+import sqlite3
+import logging
+import threading
+from collections import deque, OrderedDict
+from typing import Optional, Protocol
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+
+logger = logging.getLogger(__name__)
+
+
+class SessionStore(Protocol):
+    """Conversation history of websocket sessions"""
+
+    def history(self, session_id: str) -> list[BaseMessage]:
+        ...
+
+    def append_turn(self, session_id: str, question: str, answer: str) -> None:
+        ...
+
+    def drop(self, session_id: str) -> None:
+        ...
+
+
+def _to_messages(turns) -> list[BaseMessage]:
+    messages: list[BaseMessage] = []
+    for question, answer in turns:
+        messages.append(HumanMessage(question))
+        messages.append(AIMessage(answer))
+    return messages
+
+
+class MemorySessionStore:
+    """
+    In-memory session store.
+
+    Every session keeps at most `max_turns` question/answer pairs. Sessions
+    idle for longer than `ttl_seconds` are evicted, and once more than
+    `max_sessions` are alive the least recently used ones go first.
+    """
+
+    def __init__(self, max_turns: int, ttl_seconds: int, max_sessions: int) -> None:
+        self._max_turns = max_turns
+        self._ttl_seconds = ttl_seconds
+        self._max_sessions = max_sessions
+        self._sessions: OrderedDict[str, tuple[float, deque]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def history(self, session_id: str) -> list[BaseMessage]:
+        with self._lock:
+            self._evict()
+            session = self._sessions.get(session_id)
+            if session is None:
+                return []
+            self._sessions[session_id] = (time.monotonic(), session[1])
+            self._sessions.move_to_end(session_id)
+            return _to_messages(session[1])
+
+    def append_turn(self, session_id: str, question: str, answer: str) -> None:
+        with self._lock:
+            _, turns = self._sessions.pop(session_id, (None, deque(maxlen=self._max_turns)))
+            turns.append((question, answer))
+            self._sessions[session_id] = (time.monotonic(), turns)
+            self._evict()
+
+    def drop(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def _evict(self) -> None:
+        expired_before = time.monotonic() - self._ttl_seconds
+        while self._sessions:
+            session_id, (last_access, _) = next(iter(self._sessions.items()))
+            if last_access >= expired_before and len(self._sessions) <= self._max_sessions:
+                break
+            logger.info(f"Evicting session {session_id}")
+            self._sessions.popitem(last=False)
+
+
+class SQLiteSessionStore:
+    """Session store that keeps the conversation history on disk"""
+
+    def __init__(self, path: str, max_turns: int, ttl_seconds: int, max_sessions: int) -> None:
+        self._max_turns = max_turns
+        self._ttl_seconds = ttl_seconds
+        self._max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS turns ("
+            "session_id TEXT NOT NULL, "
+            "created_at REAL NOT NULL, "
+            "question TEXT NOT NULL, "
+            "answer TEXT NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS turns_session ON turns (session_id, created_at)"
+        )
+        self._connection.commit()
+
+    def history(self, session_id: str) -> list[BaseMessage]:
+        with self._lock:
+            self._evict()
+            self._connection.commit()
+            rows = self._connection.execute(
+                "SELECT question, answer FROM turns WHERE session_id = ? ORDER BY created_at",
+                (session_id,)
+            ).fetchall()
+            return _to_messages(rows)
+
+    def append_turn(self, session_id: str, question: str, answer: str) -> None:
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO turns (session_id, created_at, question, answer) VALUES (?, ?, ?, ?)",
+                (session_id, time.time(), question, answer)
+            )
+            self._connection.execute(
+                "DELETE FROM turns WHERE session_id = ? AND rowid NOT IN ("
+                "SELECT rowid FROM turns WHERE session_id = ? ORDER BY created_at DESC LIMIT ?)",
+                (session_id, session_id, self._max_turns)
+            )
+            self._evict()
+            self._connection.commit()
+
+    def drop(self, session_id: str) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM turns WHERE session_id = ?", (session_id,))
+            self._connection.commit()
+
+    def _evict(self) -> None:
+        self._connection.execute(
+            "DELETE FROM turns WHERE session_id IN ("
+            "SELECT session_id FROM turns GROUP BY session_id HAVING MAX(created_at) < ?)",
+            (time.time() - self._ttl_seconds,)
+        )
+        self._connection.execute(
+            "DELETE FROM turns WHERE session_id IN ("
+            "SELECT session_id FROM turns GROUP BY session_id "
+            "ORDER BY MAX(created_at) DESC LIMIT -1 OFFSET ?)",
+            (self._max_sessions,)
+        )
+
+
+def create_session_store(
+        path: Optional[str],
+        max_turns: int,
+        ttl_seconds: int,
+        max_sessions: int
+) -> SessionStore:
+    if path:
+        logger.info(f"Using SQLite session store at {path}")
+        return SQLiteSessionStore(path, max_turns, ttl_seconds, max_sessions)
+    return MemorySessionStore(max_turns, ttl_seconds, max_sessions)
@@ -0,0 +1,153 @@
+import os
+import asyncio
+import logging
+import threading
+from pathlib import PurePosixPath
+from .tracing import tracer
+from .snapshot import load_snapshot, read_header
+
+logger = logging.getLogger(__name__)
+
+EMBEDDED = os.environ.get("MINIMA_EMBEDDED", "").lower() in ("1", "true", "yes")
+EMBEDDING_MODEL_ID = os.environ.get("EMBEDDING_MODEL_ID")
+SNAPSHOT_PATH = os.environ.get("MINIMA_SNAPSHOT_PATH")
+QDRANT_PATH = os.environ.get("MINIMA_QDRANT_PATH")
+QDRANT_URL = os.environ.get("MINIMA_QDRANT_URL", "http://localhost:6333")
+QDRANT_PREFER_GRPC = os.environ.get("MINIMA_QDRANT_PREFER_GRPC", "false").lower() == "true"
+QDRANT_COLLECTION = os.environ.get("MINIMA_QDRANT_COLLECTION", "mnm_storage")
+CONTAINER_PATH = os.environ.get("CONTAINER_PATH", "/usr/src/app/local_files/")
+LOCAL_FILES_PATH = os.environ.get("LOCAL_FILES_PATH", CONTAINER_PATH)
+
+
+class EmbeddedRetriever:
+    """
+    Answers queries inside the MCP process.
+
+    The embedding model and the Qdrant client are loaded on first use (or by
+    `warm_up` in the background), so the MCP handshake does not wait for
+    them. Qdrant is opened in one of three ways: a snapshot exported by the
+    indexer's GET /snapshot is loaded into a local-mode collection, kept in
+    MINIMA_QDRANT_PATH if set and in memory otherwise, so no network is
+    involved at all; a local-mode folder is opened as is; or the client
+    connects directly to the Qdrant container, which still skips the HTTP
+    hop through the indexer. The query model must be the indexer's: it is
+    taken from the snapshot header, otherwise EMBEDDING_MODEL_ID must be
+    set, and its vector size is checked against the collection.
+    `path_prefix` and `file_types` are turned into the same payload filter
+    the indexer's Qdrant backend builds. Responses have the same shape as
+    the indexer's /query endpoint.
+    """
+
+    def __init__(self) -> None:
+        self._model = None
+        self._client = None
+        self._lock = threading.Lock()
+
+    async def warm_up(self) -> None:
+        try:
+            await asyncio.to_thread(self._load)
+        except Exception as e:
+            logger.error(f"Embedded retrieval warm up failed: {e}")
+
+    async def request_data(
+            self,
+            query: str,
+            k: int = 4,
+            path_prefix: str | None = None,
+            file_types: list[str] | None = None,
+    ) -> dict:
+        try:
+            return {"result": await asyncio.to_thread(self._find, query, k, path_prefix, file_types)}
+        except Exception as e:
+            logger.error(f"Embedded search failed: {e}")
+            return {"error": str(e)}
+
+    def _load(self) -> None:
+        with self._lock:
+            if self._model is not None:
+                return
+            # heavy imports are deferred so that importing the package stays cheap
+            from qdrant_client import QdrantClient
+            from sentence_transformers import SentenceTransformer
+
+            model_id = EMBEDDING_MODEL_ID
+            if not model_id and not SNAPSHOT_PATH:
+                raise ValueError("Set EMBEDDING_MODEL_ID to the indexer's embedding model or use MINIMA_SNAPSHOT_PATH")
+            if SNAPSHOT_PATH:
+                header = read_header(SNAPSHOT_PATH)
+                if model_id and model_id != header["embedding_model"]:
+                    raise ValueError(
+                        f"EMBEDDING_MODEL_ID is {model_id} but the snapshot was made with {header['embedding_model']}"
+                    )
+                model_id = header["embedding_model"]
+                client = QdrantClient(path=QDRANT_PATH) if QDRANT_PATH else QdrantClient(location=":memory:")
+                load_snapshot(client, QDRANT_COLLECTION, SNAPSHOT_PATH, QDRANT_PATH)
+            elif QDRANT_PATH:
+                logger.info(f"Opening local Qdrant data at {QDRANT_PATH}")
+                client = QdrantClient(path=QDRANT_PATH)
+            else:
+                logger.info(f"Connecting directly to Qdrant at {QDRANT_URL}")
+                client = QdrantClient(url=QDRANT_URL, prefer_grpc=QDRANT_PREFER_GRPC)
+
+            logger.info(f"Loading embedding model {model_id}")
+            model = SentenceTransformer(model_id)
+            collection_size = client.get_collection(QDRANT_COLLECTION).config.params.vectors.size
+            if model.get_sentence_embedding_dimension() != collection_size:
+                raise ValueError(
+                    f"{model_id} embeds into {model.get_sentence_embedding_dimension()} dimensions, "
+                    f"the {QDRANT_COLLECTION} collection holds {collection_size}-d vectors"
+                )
+            self._client = client
+            self._model = model
+
+    @staticmethod
+    def _to_filter(path_prefix: str | None, file_types: list[str] | None):
+        from qdrant_client.models import FieldCondition, Filter, MatchAny, MatchValue
+
+        conditions = []
+        if path_prefix:
+            directory = path_prefix.rstrip("/")
+            local_root = LOCAL_FILES_PATH.rstrip("/")
+            if local_root and (directory == local_root or directory.startswith(local_root + "/")):
+                directory = CONTAINER_PATH.rstrip("/") + directory[len(local_root):]
+            conditions.append(FieldCondition(
+                key="metadata.dirs",
+                match=MatchValue(value=str(PurePosixPath(directory)))
+            ))
+        if file_types:
+            conditions.append(FieldCondition(
+                key="metadata.extension",
+                match=MatchAny(any=[
+                    ext.lower() if ext.startswith(".") else f".{ext.lower()}" for ext in file_types
+                ])
+            ))
+        return Filter(must=conditions) if conditions else None
+
+    def _find(self, query: str, k: int, path_prefix: str | None, file_types: list[str] | None) -> dict:
+        self._load()
+        with tracer.span("embed.query"):
+            vector = self._model.encode(query).tolist()
+        with tracer.span("qdrant.query_points", k=k):
+            points = self._client.query_points(
+                collection_name=QDRANT_COLLECTION,
+                query=vector,
+                query_filter=self._to_filter(path_prefix, file_types),
+                limit=k,
+                with_payload=True,
+            ).points
+
+        links = set()
+        results = []
+        chunks = []
+        for point in points:
+            content = point.payload.get("page_content", "")
+            path = point.payload.get("metadata", {}).get("file_path", "").replace(
+                CONTAINER_PATH, LOCAL_FILES_PATH
+            )
+            links.add(f"file://{path}")
+            results.append(content)
+            chunks.append({"content": content, "link": f"file://{path}", "score": point.score})
+        return {"links": list(links), "output": ". ".join(results), "results": chunks}
+
+
+embedded_retriever = EmbeddedRetriever() if EMBEDDED else None
@@ -0,0 +1,243 @@
+import time
+import httpx
+import random
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Any, Optional
+from .tracing import Span, tracer
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+RETRYABLE_STATUS_CODES = {429, 502, 503, 504}
+REQUEST_HEADERS = {
+    'Accept': 'application/json',
+    'Content-Type': 'application/json'
+}
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, message="Circuit breaker is open"):
+        self.message = message
+        super().__init__(self.message)
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing service for `reset_seconds` after
+    `failure_threshold` consecutive failures, then lets a single trial
+    request through before closing again.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float) -> None:
+        self._failure_threshold = failure_threshold
+        self._reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self._reset_seconds or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def release(self) -> None:
+        """End a trial request that neither succeeded nor failed, e.g. a cancelled one"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._failures >= self._failure_threshold:
+                if self._opened_at is None:
+                    logger.warning(f"Circuit opened after {self._failures} consecutive failures")
+                self._opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """Keeps recent request latencies and logs percentiles periodically"""
+
+    def __init__(self, name: str, window: int = 1000, report_every: int = 100) -> None:
+        self._name = name
+        self._samples: deque = deque(maxlen=window)
+        self._report_every = report_every
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+            self._count += 1
+            report = self._count % self._report_every == 0
+        if report:
+            stats = self.stats()
+            logger.info(
+                f"{self._name} latency over last {len(self._samples)} requests: "
+                f"p50={stats['p50_ms']:.1f}ms p95={stats['p95_ms']:.1f}ms p99={stats['p99_ms']:.1f}ms"
+            )
+
+    def stats(self) -> dict:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return {"count": 0, "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0}
+
+        def percentile(q: float) -> float:
+            return samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+
+        return {"count": len(samples), "p50_ms": percentile(0.5), "p95_ms": percentile(0.95), "p99_ms": percentile(0.99)}
+
+
+class HttpClient:
+    """
+    Long-lived pooled JSON client for one upstream service.
+
+    Connections are kept alive between calls (over HTTP/2 when the h2
+    package is installed). Every call has a deadline that bounds all of its
+    attempts; transport errors and 429/5xx responses are retried with
+    jittered exponential backoff while the deadline allows, and repeated
+    failures open a circuit breaker so callers fail fast instead of piling
+    up on a busy upstream.
+    """
+
+    def __init__(
+            self,
+            base_url: str,
+            timeout: float = 10.0,
+            retries: int = 2,
+            backoff_seconds: float = 0.1,
+            max_connections: int = 20,
+            failure_threshold: int = 5,
+            reset_seconds: float = 10.0,
+    ) -> None:
+        self.base_url = base_url
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_seconds = backoff_seconds
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.breaker = CircuitBreaker(failure_threshold, reset_seconds)
+        self.latency = LatencyTracker(base_url)
+        self._client: Optional[httpx.Client] = None
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._lock = threading.Lock()
+
+    def _sync_client(self) -> httpx.Client:
+        with self._lock:
+            if self._client is None:
+                self._client = httpx.Client(
+                    base_url=self.base_url, headers=REQUEST_HEADERS, limits=self.limits, http2=HTTP2_AVAILABLE
+                )
+            return self._client
+
+    def _async(self) -> httpx.AsyncClient:
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(
+                base_url=self.base_url, headers=REQUEST_HEADERS, limits=self.limits, http2=HTTP2_AVAILABLE
+            )
+        return self._async_client
+
+    def _delay(self, attempt: int) -> float:
+        return self.backoff_seconds * (2 ** attempt) * (0.5 + random.random())
+
+    def _finish(self, response: httpx.Response, started: float) -> Any:
+        self.latency.record(time.monotonic() - started)
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        response.raise_for_status()
+        return response.json()
+
+    def post(self, path: str, json: Any, deadline: Optional[float] = None, headers: Optional[dict] = None) -> Any:
+        """POST `json` to `path`, giving up after `deadline` seconds in total"""
+        with tracer.span(f"POST {path}", url=f"{self.base_url}{path}") as span:
+            return self._post(path, json, deadline, tracer.inject(headers), span)
+
+    def _post(self, path: str, json: Any, deadline: Optional[float], headers: dict, span: Span) -> Any:
+        deadline_at = time.monotonic() + (deadline or self.timeout)
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise CircuitOpenError(f"Circuit breaker is open for {self.base_url}")
+            started = time.monotonic()
+            try:
+                response = self._sync_client().post(
+                    path, json=json, headers=headers, timeout=max(deadline_at - started, 0.001)
+                )
+            except httpx.TransportError as e:
+                error: Exception = e
+            except BaseException:
+                # Cancelled or unexpected: do not leave a half-open trial pending forever
+                self.breaker.release()
+                raise
+            else:
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    return self._finish(response, started)
+                error = httpx.HTTPStatusError(
+                    f"Retryable status {response.status_code}", request=response.request, response=response
+                )
+            self.breaker.record_failure()
+            delay = self._delay(attempt)
+            if attempt >= self.retries or time.monotonic() + delay >= deadline_at:
+                raise error
+            attempt += 1
+            span.set(retries=attempt)
+            logger.warning(f"Request to {self.base_url}{path} failed with {error}, retry {attempt} in {delay:.2f}s")
+            time.sleep(delay)
+
+    async def apost(self, path: str, json: Any, deadline: Optional[float] = None, headers: Optional[dict] = None) -> Any:
+        """Async variant of `post` sharing the same pool settings and breaker"""
+        with tracer.span(f"POST {path}", url=f"{self.base_url}{path}") as span:
+            return await self._apost(path, json, deadline, tracer.inject(headers), span)
+
+    async def _apost(self, path: str, json: Any, deadline: Optional[float], headers: dict, span: Span) -> Any:
+        deadline_at = time.monotonic() + (deadline or self.timeout)
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise CircuitOpenError(f"Circuit breaker is open for {self.base_url}")
+            started = time.monotonic()
+            try:
+                response = await self._async().post(
+                    path, json=json, headers=headers, timeout=max(deadline_at - started, 0.001)
+                )
+            except httpx.TransportError as e:
+                error: Exception = e
+            except BaseException:
+                # Cancelled or unexpected: do not leave a half-open trial pending forever
+                self.breaker.release()
+                raise
+            else:
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    return self._finish(response, started)
+                error = httpx.HTTPStatusError(
+                    f"Retryable status {response.status_code}", request=response.request, response=response
+                )
+            self.breaker.record_failure()
+            delay = self._delay(attempt)
+            if attempt >= self.retries or time.monotonic() + delay >= deadline_at:
+                raise error
+            attempt += 1
+            span.set(retries=attempt)
+            logger.warning(f"Request to {self.base_url}{path} failed with {error}, retry {attempt} in {delay:.2f}s")
+            await asyncio.sleep(delay)
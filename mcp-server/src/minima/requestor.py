@@ -1,31 +1,29 @@
-import httpx
 import logging
-
+from .http_client import HttpClient
+from .embedded import embedded_retriever
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-REQUEST_DATA_URL = "http://localhost:8001/query"
-REQUEST_HEADERS = {
-    'Accept': 'application/json',
-    'Content-Type': 'application/json'
-}
+INDEXER_URL = "http://localhost:8001"
+REQUEST_DEADLINE_SECONDS = 30
+
+indexer_client = HttpClient(INDEXER_URL)
 
-async def request_data(query):
+async def request_data(query, **options):
     payload = {
-        "query": query
+        "query": query,
+        **options
     }
-    async with httpx.AsyncClient() as client:
-        try:
-            logger.info(f"Requesting data from indexer with query: {query}")
-            response = await client.post(REQUEST_DATA_URL, 
-                                         headers=REQUEST_HEADERS, 
-                                         json=payload)
-            response.raise_for_status()
-            data = response.json()
-            logger.info(f"Received data: {data}")
-            return data
+    if embedded_retriever is not None:
+        logger.info(f"Searching in process with query: {query}")
+        return await embedded_retriever.request_data(**payload)
+    try:
+        logger.info(f"Requesting data from indexer with query: {query}")
+        data = await indexer_client.apost("/query", json=payload, deadline=REQUEST_DEADLINE_SECONDS)
+        logger.info(f"Received data: {data}")
+        return data
 
-        except Exception as e:
-            logger.error(f"HTTP error: {e}")
-            return { "error": str(e) }
\ No newline at end of file
+    except Exception as e:
+        logger.error(f"HTTP error: {e}")
+        return { "error": str(e) }
\ No newline at end of file
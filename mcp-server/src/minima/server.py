@@ -1,8 +1,16 @@
+import os
+import json
+import base64
+import asyncio
 import logging
 import mcp.server.stdio
+from pathlib import PurePath
 from typing import Annotated
 from mcp.server import Server
+from .cache import TTLCache
+from .tracing import tracer
 from .requestor import request_data
+from .embedded import embedded_retriever
 from pydantic import BaseModel, Field
 from mcp.server.stdio import stdio_server
 from mcp.shared.exceptions import McpError
@@ -30,19 +38,45 @@ logging.basicConfig(
 )
 
 server = Server("minima")
+results_cache = TTLCache(max_size=128, ttl_seconds=300)
+MAX_RESULTS = 100
 
 class Query(BaseModel):
     text: Annotated[
         str, 
         Field(description="context to find")
     ]
+    top_k: Annotated[
+        int,
+        Field(ge=1, le=50, description="maximum number of results to return")
+    ] = 5
+    max_chars: Annotated[
+        int,
+        Field(ge=200, le=20000, description="maximum total characters of returned content")
+    ] = 4000
+    path_prefix: Annotated[
+        str | None,
+        Field(description="only return results from files under this folder")
+    ] = None
+    file_types: Annotated[
+        list[str] | None,
+        Field(description="only return results from files with these extensions, e.g. [\".pdf\", \".md\"]")
+    ] = None
+    cursor: Annotated[
+        str | None,
+        Field(description="continuation cursor returned by a previous call, to get the next page")
+    ] = None
 
 @server.list_tools()
 async def list_tools() -> list[Tool]:
     return [
         Tool(
             name="query",
-            description="Find a context in local files (PDF, CSV, DOCX, MD, TXT)",
+            description=(
+                "Find a context in local files (PDF, CSV, DOCX, MD, TXT). "
+                "Returns JSON with the matching passages, their file links and scores, "
+                "and a next_cursor to fetch more results"
+            ),
             inputSchema=Query.model_json_schema(),
         )
     ]
@@ -81,17 +115,105 @@ async def call_tool(name, arguments: dict) -> list[TextContent]:
         logging.error("Context is required")
         raise McpError(INVALID_PARAMS, "Context is required")
 
-    output = await request_data(context)
+    offset = decode_cursor(args.cursor)
+    file_types = normalize_file_types(args.file_types)
+    needed = min(offset + args.top_k, MAX_RESULTS)
+    results, complete = await search(context, needed, args.path_prefix, file_types)
+
+    page = []
+    used = 0
+    index = offset
+    while index < len(results) and len(page) < args.top_k:
+        item = results[index]
+        remaining = args.max_chars - used
+        if len(item["content"]) > remaining:
+            if page:
+                break
+            item = {**item, "content": item["content"][:remaining], "truncated": True}
+        page.append(item)
+        used += len(item["content"])
+        index += 1
+
+    # A cursor must move forward, or an agent following it would loop on empty pages
+    has_more = index > offset and (index < len(results) or not complete)
+    output = {
+        "results": page,
+        "next_cursor": encode_cursor(index) if has_more else None,
+    }
+    logging.info(f"Returning {len(page)} results, {used} characters")
+    return [TextContent(type="text", text=json.dumps(output, ensure_ascii=False))]
+
+
+async def search(
+        context: str,
+        needed: int,
+        path_prefix: str | None,
+        file_types: tuple[str, ...] | None
+) -> tuple[list[dict], bool]:
+    """
+    Return at least `needed` matching results, or all of them, together
+    with a flag telling whether the indexer has no more results to give.
+    Results are cached per query and filters for the session.
+    """
+    key = (context, path_prefix, file_types)
+    cached = results_cache.get(key)
+    if cached is not None and (len(cached[0]) >= needed or cached[1]):
+        logging.info(f"Results cache hit for: {context}")
+        return cached
+
+    with tracer.span("mcp.search", k=needed):
+        output = await request_data(
+            context,
+            k=needed,
+            path_prefix=path_prefix,
+            file_types=list(file_types) if file_types else None
+        )
     if "error" in output:
         logging.error(output["error"])
         raise McpError(INTERNAL_ERROR, output["error"])
-    
-    logging.info(f"Get prompt: {output}")    
-    output = output['result']['output']
-    #links = output['result']['links']
-    result = []
-    result.append(TextContent(type="text", text=output))
-    return result
+
+    found = output["result"].get("results", [])
+    results = [item for item in found if matches(item, path_prefix, file_types)]
+    entry = (results, len(found) < needed or needed >= MAX_RESULTS)
+    results_cache.put(key, entry)
+    return entry
+
+
+def matches(item: dict, path_prefix: str | None, file_types: tuple[str, ...] | None) -> bool:
+    path = item["link"].removeprefix("file://")
+    if path_prefix and not in_directory(path, path_prefix):
+        return False
+    if file_types and PurePath(path).suffix.lower() not in file_types:
+        return False
+    return True
+
+
+def in_directory(path: str, directory: str) -> bool:
+    """Folder match as the indexer does it: /docs/a contains /docs/a/x but not /docs/ab"""
+    directory = directory.rstrip("/")
+    return path == directory or path.startswith(directory + "/")
+
+
+def normalize_file_types(file_types: list[str] | None) -> tuple[str, ...] | None:
+    if not file_types:
+        return None
+    return tuple(sorted({
+        ext.lower() if ext.startswith(".") else f".{ext.lower()}" for ext in file_types
+    }))
+
+
+def encode_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"offset": offset}).encode()).decode()
+
+
+def decode_cursor(cursor: str | None) -> int:
+    if not cursor:
+        return 0
+    try:
+        return int(json.loads(base64.urlsafe_b64decode(cursor.encode()))["offset"])
+    except (ValueError, KeyError, TypeError) as e:
+        logging.error(f"Invalid cursor: {cursor}")
+        raise McpError(INVALID_PARAMS, f"Invalid cursor: {e}")
     
 @server.get_prompt()
 async def get_prompt(name: str, arguments: dict | None) -> GetPromptResult:
@@ -128,6 +250,10 @@ async def get_prompt(name: str, arguments: dict | None) -> GetPromptResult:
     )
 
 async def main():
+    tracer.service_name = os.environ.get("SERVICE_NAME", "mcp")
+    if embedded_retriever is not None:
+        # load the model in the background so the handshake is not delayed
+        asyncio.create_task(embedded_retriever.warm_up())
     async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
         await server.run(
             read_stream,
@@ -0,0 +1,102 @@
+"""
+Load an indexer snapshot (GET /snapshot) into a local-mode Qdrant collection.
+
+The snapshot stream is read line by line; only the header and the chunk
+records are used, the manifest belongs to the indexer. A marker file next
+to the local collection remembers which snapshot it was built from, so an
+unchanged snapshot is not loaded again on every start.
+"""
+import os
+import gzip
+import json
+import base64
+import logging
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = "minima-snapshot"
+SNAPSHOT_VERSION = 1
+LOAD_BATCH_SIZE = 256
+MARKER_FILE = "minima-snapshot.json"
+
+
+def read_header(snapshot_path: str) -> dict:
+    with gzip.open(snapshot_path, "rb") as lines:
+        header = json.loads(next(lines, b"{}"))
+    if header.get("type") != "header" or header.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"{snapshot_path} is not a Minima snapshot")
+    if header["version"] > SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version {header['version']}")
+    return header
+
+
+def _decode_vector(record: dict, quantize: str) -> list[float]:
+    import numpy as np
+
+    data = base64.b64decode(record["vector"])
+    if quantize == "int8":
+        return (np.frombuffer(data, dtype=np.int8).astype(np.float32) * record["scale"]).tolist()
+    dtype = np.float16 if quantize == "float16" else np.float32
+    return np.frombuffer(data, dtype=dtype).astype(np.float32).tolist()
+
+
+def _snapshot_marker(snapshot_path: str) -> dict:
+    stat = os.stat(snapshot_path)
+    return {"snapshot": os.path.abspath(snapshot_path), "size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def load_snapshot(client, collection: str, snapshot_path: str, storage_path: str | None) -> dict:
+    """
+    Fill `collection` of a local-mode `client` from a snapshot file.
+
+    With a `storage_path` the collection persists and is only rebuilt when
+    the snapshot file changed; without one it lives in memory and is
+    loaded on every start. Returns the snapshot header.
+    """
+    from qdrant_client.models import Distance, PointStruct, VectorParams
+
+    header = read_header(snapshot_path)
+    marker = _snapshot_marker(snapshot_path)
+    marker_path = os.path.join(storage_path, MARKER_FILE) if storage_path else None
+    if marker_path and os.path.exists(marker_path) and client.collection_exists(collection):
+        with open(marker_path) as f:
+            if json.load(f) == marker:
+                logger.info(f"Local collection is up to date with {snapshot_path}")
+                return header
+
+    logger.info(f"Loading snapshot {snapshot_path} into the local collection {collection}")
+    if client.collection_exists(collection):
+        client.delete_collection(collection)
+    client.create_collection(
+        collection_name=collection,
+        vectors_config=VectorParams(size=header["embedding_size"], distance=Distance.COSINE),
+    )
+    points = 0
+    complete = False
+    batch = []
+    with gzip.open(snapshot_path, "rb") as lines:
+        next(lines)
+        for line in lines:
+            record = json.loads(line)
+            if record.get("type") == "point":
+                batch.append(PointStruct(
+                    id=record["id"],
+                    vector=_decode_vector(record, header["quantize"]),
+                    payload={"page_content": record["page_content"], "metadata": record["metadata"]},
+                ))
+                if len(batch) >= LOAD_BATCH_SIZE:
+                    client.upsert(collection_name=collection, points=batch)
+                    points += len(batch)
+                    batch = []
+            elif record.get("type") == "end":
+                complete = True
+    if not complete:
+        raise ValueError(f"Snapshot {snapshot_path} is truncated")
+    if batch:
+        client.upsert(collection_name=collection, points=batch)
+        points += len(batch)
+    if marker_path:
+        with open(marker_path, "w") as f:
+            json.dump(marker, f)
+    logger.info(f"Loaded {points} chunks from {snapshot_path}")
+    return header
@@ -0,0 +1,205 @@
+import os
+import json
+import time
+import queue
+import random
+import logging
+import threading
+import urllib.request
+from contextvars import ContextVar
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TRACE_EXPORT = os.environ.get("TRACE_EXPORT", "")
+TRACE_FILE = os.environ.get("TRACE_FILE", "traces.jsonl")
+OTLP_ENDPOINT = os.environ.get("OTLP_ENDPOINT", "http://otel-collector:4318/v1/traces")
+EXPORT_BATCH_SIZE = 512
+EXPORT_INTERVAL_SECONDS = 2.0
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start_ns: int
+    end_ns: int = 0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "duration_ms": (self.end_ns - self.start_ns) / 1e6 if self.end_ns else None,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+_remote_parent: ContextVar[Optional[Tuple[str, str]]] = ContextVar("remote_parent", default=None)
+_collected: ContextVar[Optional[List[Span]]] = ContextVar("collected_spans", default=None)
+
+
+class Tracer:
+    """
+    Minimal tracer propagating W3C `traceparent` headers between services.
+
+    Spans nest through context variables, so they follow asyncio tasks and
+    threads started with a copied context. Finished spans are exported in
+    the background as JSON lines to TRACE_FILE (TRACE_EXPORT=file) or as
+    OTLP/HTTP JSON to OTLP_ENDPOINT (TRACE_EXPORT=otlp); with no exporter
+    they are only kept by an enclosing `collect`, which request handlers
+    use to return span timings in debug responses.
+    """
+
+    def __init__(self, service_name: str = "minima", export: str = TRACE_EXPORT) -> None:
+        self.service_name = service_name
+        self.export = export
+        self._queue: Optional[queue.Queue] = None
+        if export in ("file", "otlp"):
+            self._queue = queue.Queue(maxsize=10000)
+            threading.Thread(target=self._export_loop, name="trace-export", daemon=True).start()
+        elif export:
+            logger.warning(f"Unknown TRACE_EXPORT {export}, spans are not exported")
+
+    @contextmanager
+    def span(self, name: str, activate: bool = True, **attributes: Any) -> Iterator[Span]:
+        """
+        Time a block as a child of the current span. Use activate=False in
+        generators, whose body may resume in another context.
+        """
+        parent = _current_span.get()
+        if parent is not None:
+            trace_id, parent_id = parent.trace_id, parent.span_id
+        else:
+            trace_id, parent_id = _remote_parent.get() or (f"{random.getrandbits(128):032x}", None)
+        span = Span(name, trace_id, f"{random.getrandbits(64):016x}", parent_id, time.time_ns(), attributes=attributes)
+        token = _current_span.set(span) if activate else None
+        try:
+            yield span
+        except BaseException as e:
+            span.error = repr(e)
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            if token is not None:
+                _current_span.reset(token)
+            self._finish(span)
+
+    def inject(self, headers: Optional[dict] = None) -> dict:
+        """Add the `traceparent` of the current span to outgoing headers"""
+        headers = dict(headers or {})
+        span = _current_span.get()
+        if span is not None:
+            headers["traceparent"] = f"00-{span.trace_id}-{span.span_id}-01"
+        return headers
+
+    @contextmanager
+    def remote_context(self, headers: Mapping[str, str]) -> Iterator[None]:
+        """Continue the trace of an incoming request"""
+        parts = headers.get("traceparent", "").split("-")
+        remote = (parts[1], parts[2]) if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16 else None
+        token = _remote_parent.set(remote)
+        try:
+            yield
+        finally:
+            _remote_parent.reset(token)
+
+    @contextmanager
+    def collect(self) -> Iterator[List[Span]]:
+        """Keep the spans finished within the block, for debug responses"""
+        spans: List[Span] = []
+        token = _collected.set(spans)
+        try:
+            yield spans
+        finally:
+            _collected.reset(token)
+
+    def _finish(self, span: Span) -> None:
+        collected = _collected.get()
+        if collected is not None:
+            collected.append(span)
+        if self._queue is not None:
+            try:
+                self._queue.put_nowait(span)
+            except queue.Full:
+                pass
+
+    def _export_loop(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + EXPORT_INTERVAL_SECONDS
+            while len(batch) < EXPORT_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            try:
+                if self.export == "file":
+                    with open(TRACE_FILE, "a") as f:
+                        for span in batch:
+                            f.write(json.dumps({"service": self.service_name, **span.to_dict()}, default=str) + "\n")
+                else:
+                    self._post_otlp(batch)
+            except Exception as e:
+                logger.warning(f"Unable to export {len(batch)} spans: {e}")
+
+    def _post_otlp(self, batch: List[Span]) -> None:
+        body = {
+            "resourceSpans": [{
+                "resource": {"attributes": _otlp_attributes({"service.name": self.service_name})},
+                "scopeSpans": [{
+                    "scope": {"name": "minima"},
+                    "spans": [
+                        {
+                            "traceId": span.trace_id,
+                            "spanId": span.span_id,
+                            "parentSpanId": span.parent_id or "",
+                            "name": span.name,
+                            "kind": 1,
+                            "startTimeUnixNano": str(span.start_ns),
+                            "endTimeUnixNano": str(span.end_ns),
+                            "attributes": _otlp_attributes(span.attributes),
+                            "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+                        }
+                        for span in batch
+                    ],
+                }],
+            }]
+        }
+        request = urllib.request.Request(
+            OTLP_ENDPOINT,
+            data=json.dumps(body).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        urllib.request.urlopen(request, timeout=5).close()
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[dict]:
+    converted = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            converted.append({"key": key, "value": {"boolValue": value}})
+        elif isinstance(value, int):
+            converted.append({"key": key, "value": {"intValue": str(value)}})
+        elif isinstance(value, float):
+            converted.append({"key": key, "value": {"doubleValue": value}})
+        else:
+            converted.append({"key": key, "value": {"stringValue": str(value)}})
+    return converted
+
+
+tracer = Tracer()
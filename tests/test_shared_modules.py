@@ -0,0 +1,31 @@
+"""
+Every service image is built from its own folder, so the modules they share
+are copied into each service. This keeps the copies identical: edit one,
+then copy it over the others (the MCP package imports its siblings
+relatively, which is the only allowed difference).
+"""
+import re
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+SHARED_MODULES = {
+    "http_client.py": ["linker", "llm", "mcp-server/src/minima"],
+    "tracing.py": ["indexer", "linker", "llm", "mcp-server/src/minima"],
+    "autotune.py": ["indexer", "llm"],
+    "qdrant_pool.py": ["indexer", "llm"],
+}
+
+
+def normalized(path: Path) -> str:
+    return re.sub(r"^from \.(\w)", r"from \1", path.read_text(), flags=re.MULTILINE)
+
+
+@pytest.mark.parametrize("module", sorted(SHARED_MODULES))
+def test_copies_are_identical(module):
+    first, *others = [ROOT / folder / module for folder in SHARED_MODULES[module]]
+    for other in others:
+        assert normalized(other) == normalized(first), \
+            f"{other.relative_to(ROOT)} differs from {first.relative_to(ROOT)}"